@@ -0,0 +1 @@
+"""Benchmarks de la carga de turneros y estadillos."""
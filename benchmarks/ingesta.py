@@ -0,0 +1,325 @@
+"""Benchmark de la carga de turneros y estadillos.
+
+Mide por separado cada etapa de la carga (apertura del pdf, extracción de
+tablas, identificación de usuarios y escritura en la base de datos) con
+pdf sintéticos de distintos tamaños. Los tiempos se comparan con los de
+referencia guardados en baseline.json para detectar regresiones.
+
+Uso:
+
+    python -m benchmarks.ingesta
+    python -m benchmarks.ingesta --db-uri mysql+pymysql://u:p@localhost/bench
+    python -m benchmarks.ingesta --guardar-referencia
+    python -m benchmarks.ingesta -e turnero --extractor posiciones
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import click
+import pdfplumber
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from atcapp import get_timezone
+from atcapp.carga_estadillo import (
+    calcula_estado_estadillo,
+    extraer_datos_estadillo,
+    extraer_periodos,
+    fecha_del_estadillo,
+    incorporar_periodos,
+    inserta_estadillo,
+)
+from atcapp.carga_turnero import (
+    EXTRACTOR_TABLA,
+    EXTRACTORES,
+    ResultadoProcesadoTurnero,
+    extrae_pagina,
+    extraer_datos_turnero_de_primera_pagina,
+    insert_shift_data,
+    parse_and_insert_data,
+    plantilla_del_extractor,
+    resuelve_mes,
+    resuelve_usuarios,
+)
+from atcapp.models import Base
+from atcapp.user_utils import AtcIndex
+from tests.pdf_sintetico import genera_estadillo, genera_turnero
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    from sqlalchemy.engine import Engine
+
+REFERENCIA = Path(__file__).with_name("baseline.json")
+"""Tiempos de referencia por dialecto y escenario. Por ahora solo de SQLite."""
+
+RUIDO = 0.005
+"""Diferencia mínima en segundos para considerar una etapa más lenta."""
+
+Tiempos = dict[str, float]
+
+
+@dataclass(frozen=True)
+class Escenario:
+    """Tamaño de un caso de prueba.
+
+    Con n_sectores > 0 se genera un estadillo; si no, un turnero.
+    """
+
+    n_controladores: int
+    n_dias: int = 0
+    n_sectores: int = 0
+
+    @property
+    def nombre(self) -> str:
+        """Nombre del escenario en los informes y en la referencia."""
+        if self.n_sectores:
+            return f"estadillo-{self.n_controladores}x{self.n_sectores}"
+        return f"turnero-{self.n_controladores}x{self.n_dias}"
+
+    def genera_pdf(self) -> bytes:
+        """Pdf sintético del escenario."""
+        if self.n_sectores:
+            return genera_estadillo(self.n_controladores, self.n_sectores)
+        return genera_turnero(self.n_controladores, mes=7, n_dias=self.n_dias)
+
+
+ESCENARIOS = [
+    Escenario(20, n_dias=31),
+    Escenario(200, n_dias=7),
+    Escenario(200, n_dias=31),
+    Escenario(1000, n_dias=31),
+    Escenario(20, n_sectores=4),
+    Escenario(100, n_sectores=10),
+    Escenario(200, n_sectores=16),
+]
+
+
+class Cronometro:
+    """Acumula el tiempo de cada etapa de una ejecución."""
+
+    def __init__(self) -> None:
+        """Crea un cronómetro sin etapas medidas."""
+        self.tiempos: Tiempos = {}
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Mide el bloque y lo suma a la etapa nombre."""
+        inicio = perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[nombre] = (
+                self.tiempos.get(nombre, 0.0) + perf_counter() - inicio
+            )
+
+
+def mide_turnero(
+    contenido: bytes,
+    session: scoped_session,
+    crono: Cronometro,
+    extractor: str = EXTRACTOR_TABLA,
+) -> ResultadoProcesadoTurnero:
+    """Carga un turnero midiendo cada etapa por separado.
+
+    Después vuelve a cargar los mismos datos, que es el caso habitual al
+    subir un turnero corregido.
+    """
+    with crono.etapa("abrir_pdf"), pdfplumber.open(BytesIO(contenido)) as pdf:
+        paginas = list(pdf.pages)
+    with crono.etapa("extraccion"):
+        datos_turnero = extraer_datos_turnero_de_primera_pagina(paginas[0])
+        plantilla = plantilla_del_extractor(paginas[0], extractor)
+        entradas = [e for p in paginas for e in extrae_pagina(p, plantilla)]
+
+    res = ResultadoProcesadoTurnero()
+    with crono.etapa("usuarios"):
+        indice = AtcIndex.carga(session)
+        turnos_por_atc = resuelve_usuarios(
+            entradas,
+            datos_turnero,
+            session,
+            indice,
+            res,
+        )
+    with crono.etapa("escritura"):
+        year, month = resuelve_mes(datos_turnero.mes, datos_turnero.año)
+        insert_shift_data(turnos_por_atc, year, month, session)
+        session.commit()
+    with crono.etapa("recarga"):
+        parse_and_insert_data(entradas, datos_turnero, session)
+    return res
+
+
+def mide_estadillo(
+    contenido: bytes,
+    session: scoped_session,
+    crono: Cronometro,
+) -> None:
+    """Carga un estadillo midiendo cada etapa por separado."""
+    with crono.etapa("abrir_pdf"), pdfplumber.open(BytesIO(contenido)) as pdf:
+        pagina1, pagina2 = pdf.pages[0], pdf.pages[1]
+    with crono.etapa("extraccion"):
+        data = extraer_datos_estadillo(pagina1)
+        incorporar_periodos(data, extraer_periodos(pagina2))
+    with crono.etapa("usuarios"):
+        fecha = fecha_del_estadillo(data)
+        tz = get_timezone(data.dependencia)
+        estado = calcula_estado_estadillo(data, fecha, session, tz)
+    with crono.etapa("escritura"):
+        inserta_estadillo(data, fecha, estado, session)
+
+
+def ejecuta_escenario(
+    escenario: Escenario,
+    engine: Engine,
+    repeticiones: int,
+    extractor: str = EXTRACTOR_TABLA,
+) -> Tiempos:
+    """Mediana de cada etapa en varias ejecuciones sobre un esquema limpio."""
+    contenido = escenario.genera_pdf()
+    mide: Callable[[bytes, scoped_session, Cronometro], object] = (
+        mide_estadillo
+        if escenario.n_sectores
+        else partial(mide_turnero, extractor=extractor)
+    )
+    ejecuciones: list[Tiempos] = []
+    for _ in range(repeticiones):
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session = scoped_session(sessionmaker(bind=engine))
+        crono = Cronometro()
+        try:
+            mide(contenido, session, crono)
+        finally:
+            session.remove()
+        ejecuciones.append(crono.tiempos)
+    return {
+        etapa: statistics.median(t[etapa] for t in ejecuciones)
+        for etapa in ejecuciones[0]
+    }
+
+
+def regresiones(
+    actual: dict[str, Tiempos],
+    referencia: dict[str, Tiempos],
+    umbral: float,
+) -> list[str]:
+    """Etapas cuyo tiempo supera en más de umbral veces el de referencia."""
+    avisos = []
+    for clave, tiempos in actual.items():
+        for etapa, segundos in tiempos.items():
+            base = referencia.get(clave, {}).get(etapa)
+            if base is None:
+                continue
+            if segundos > base * umbral and segundos - base > RUIDO:
+                avisos.append(
+                    f"{clave} {etapa}: {segundos:.3f}s frente a {base:.3f}s "
+                    f"({segundos / base:.2f}x)",
+                )
+    return avisos
+
+
+def _informe(clave: str, tiempos: Tiempos) -> str:
+    etapas = "  ".join(f"{etapa}={s * 1000:8.1f}ms" for etapa, s in tiempos.items())
+    total = sum(tiempos.values()) * 1000
+    return f"{clave:<32} total={total:8.1f}ms  {etapas}"
+
+
+@click.command()
+@click.option(
+    "--db-uri",
+    "db_uris",
+    multiple=True,
+    default=["sqlite://"],
+    show_default=True,
+    help="URI de SQLAlchemy. Se puede repetir, p. ej. con un MariaDB local.",
+)
+@click.option("-n", "--repeticiones", default=3, show_default=True)
+@click.option(
+    "-e",
+    "--escenario",
+    "filtro",
+    default="",
+    help="Ejecutar solo los escenarios cuyo nombre contiene este texto.",
+)
+@click.option(
+    "--umbral",
+    default=1.25,
+    show_default=True,
+    help="Factor a partir del cual una etapa se considera una regresión.",
+)
+@click.option(
+    "-x",
+    "--extractor",
+    type=click.Choice(EXTRACTORES),
+    default=EXTRACTOR_TABLA,
+    show_default=True,
+    help="Extractor de las tablas de los turneros.",
+)
+@click.option(
+    "--guardar-referencia",
+    is_flag=True,
+    help="Guardar los tiempos medidos en baseline.json.",
+)
+def main(  # noqa: PLR0913
+    db_uris: tuple[str, ...],
+    repeticiones: int,
+    filtro: str,
+    umbral: float,
+    extractor: str,
+    *,
+    guardar_referencia: bool,
+) -> None:
+    """Mide la carga de pdf sintéticos y la compara con la referencia."""
+    actual: dict[str, Tiempos] = {}
+    for uri in db_uris:
+        engine = create_engine(uri)
+        try:
+            for escenario in ESCENARIOS:
+                if filtro not in escenario.nombre:
+                    continue
+                clave = f"{engine.dialect.name}:{escenario.nombre}"
+                if extractor != EXTRACTOR_TABLA and not escenario.n_sectores:
+                    clave += f"@{extractor}"
+                tiempos = ejecuta_escenario(
+                    escenario,
+                    engine,
+                    repeticiones,
+                    extractor,
+                )
+                actual[clave] = {etapa: round(s, 4) for etapa, s in tiempos.items()}
+                click.echo(_informe(clave, actual[clave]))
+        finally:
+            Base.metadata.drop_all(engine)
+            engine.dispose()
+
+    referencia = json.loads(REFERENCIA.read_text()) if REFERENCIA.exists() else {}
+    if guardar_referencia:
+        referencia.update(actual)
+        REFERENCIA.write_text(json.dumps(referencia, indent=2, sort_keys=True) + "\n")
+        click.echo(f"Referencia guardada en {REFERENCIA}")
+        return
+
+    for clave in sorted(actual.keys() - referencia.keys()):
+        click.echo(f"Sin referencia para {clave}", err=True)
+    avisos = regresiones(actual, referencia, umbral)
+    for aviso in avisos:
+        click.echo(f"REGRESIÓN {aviso}", err=True)
+    if avisos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,10 @@ fi
 
 # Ejecutar la aplicación Flask con Gunicorn
 echo "Starting Gunicorn..."
-gunicorn --bind 127.0.0.1:8000 --error-logfile - --workers=3 --capture-output  atcapp.wsgi:app &
+# Workers con hilos: cada conexión a /events/estadillo ocupa un hilo mientras está abierta.
+# Por defecto, FLASK_EVENTOS_CONEXIONES (64) hilos para los avisos y 16 para el resto de
+# peticiones, que son las que usan el pool de FLASK_SQLALCHEMY_POOL_SIZE conexiones.
+gunicorn --bind 127.0.0.1:8000 --error-logfile - --workers=3 --worker-class gthread --threads=${GUNICORN_THREADS:-80} --capture-output  atcapp.wsgi:app &
 GUNICORN_PID=$!
 
 # Función para verificar si Gunicorn está listo
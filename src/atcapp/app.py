@@ -14,14 +14,20 @@ from typing import TYPE_CHECKING, Any
 from flask import Flask, flash, redirect, render_template, session, url_for
 from flask_admin import Admin  # type: ignore[import-untyped]
 from flask_admin.contrib.sqla import ModelView  # type: ignore[import-untyped]
+from sqlalchemy import inspect
 from sqlalchemy.exc import SQLAlchemyError
 
 from . import commands
 from .app_sessions import ID_ATC, SqlAlchemySessionInterface
+from .core import calendarios, cuadrantes
 from .database import db
+from .estadillos import estadillos_fijos
+from .eventos import vigilante
 from .firebase import init_firebase
 from .models import ATC
 from .routes import register_routes
+from .trabajos import cola
+from .versiones import cambia_versiones, clave_atcs
 
 if TYPE_CHECKING:  # pragma: no cover
     from werkzeug import Response
@@ -39,12 +45,47 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = "sqlite:///shifts.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_POOL_SIZE = 20
+    """Conexiones a la base de datos que cada worker mantiene abiertas."""
+    SQLALCHEMY_MAX_OVERFLOW = 10
+    """Conexiones adicionales de cada worker en los picos. No se usa con SQLite."""
     SECRET_KEY = secrets.token_urlsafe(32)
     DEBUG = False
     HOST = "localhost"
     PORT = 80
     PERMANENT_SESSION_LIFETIME = timedelta(days=90)
     SESSION_COOKIE_SAMESITE = "Lax"
+    TURNERO_WORKERS = 1
+    """Procesos para extraer en paralelo las páginas de un turnero. 1 = secuencial."""
+    TURNERO_ARCHIVOS_WORKERS = 0
+    """Procesos para extraer varios turneros subidos juntos. 0 = uno por archivo."""
+    TURNERO_EXTRACTOR = "tabla"
+    """Extracción de las tablas del turnero: "tabla" o "posiciones"."""
+    UPLOAD_ASYNC = False
+    """Procesar los turneros subidos en segundo plano en lugar de en la petición."""
+    UPLOAD_SPOOL_DIR = "spool"
+    """Directorio donde se guardan los archivos pendientes de procesar."""
+    UPLOAD_JOB_THREADS = 1
+    """Hilos de cada worker que ejecutan los trabajos de carga."""
+    UPLOAD_JOB_TIMEOUT = 900
+    """Segundos sin progreso tras los que un trabajo en proceso pasa a error."""
+    UPLOAD_METRICAS = False
+    """Mostrar los tiempos y contadores de cada carga tras subir un archivo."""
+    CACHE_ANALISIS_DIR = ""
+    """Directorio de la caché de los datos extraídos de los pdf. Vacío la desactiva."""
+    CACHE_ANALISIS_MB = 256
+    """Tamaño máximo de la caché de análisis."""
+    CALENDARIO_CACHE = 2048
+    """Calendarios mensuales guardados en memoria de cada worker. 0 la desactiva."""
+    EQUIPO_CACHE = 256
+    """Cuadrantes de equipo guardados en memoria de cada worker. 0 la desactiva."""
+    ESTADILLO_CACHE = 64
+    """Estadillos preparados para mostrar guardados en memoria de cada worker."""
+    EVENTOS_INTERVALO = 2
+    """Segundos entre las comprobaciones de estadillos nuevos mientras hay páginas
+    suscritas a /events/estadillo."""
+    EVENTOS_CONEXIONES = 64
+    """Conexiones a /events/estadillo abiertas a la vez en cada worker."""
 
 
 def configure_logging(
@@ -119,6 +160,25 @@ class AdminModelView(ModelView):
         """Redirect to the login page if the user is not an admin."""
         return redirect(url_for("main.login"))
 
+    def on_model_change(
+        self,
+        _form: Any,  # noqa: ANN401
+        model: ATC,
+        _is_created: bool,  # noqa: FBT001
+    ) -> None:
+        """Invalida los datos de la dependencia en la misma transacción.
+
+        Si cambia la dependencia del controlador se invalidan la anterior y
+        la nueva.
+        """
+        historial = inspect(model).attrs.dependencia.history
+        dependencias = {model.dependencia, *historial.deleted}
+        cambia_versiones(self.session, [clave_atcs(dep) for dep in dependencias])
+
+    def on_model_delete(self, model: ATC) -> None:
+        """Invalida los datos de la dependencia en la misma transacción."""
+        cambia_versiones(self.session, [clave_atcs(model.dependencia)])
+
 
 def create_app() -> Flask:
     """Create the Flask app."""
@@ -135,6 +195,7 @@ def create_app() -> Flask:
     with app.app_context():
         app.cli.add_command(commands.export_atcs)
         app.cli.add_command(commands.import_atcs)
+        app.cli.add_command(commands.backfill)
 
     db.init_app(app)
     with app.app_context():
@@ -144,6 +205,12 @@ def create_app() -> Flask:
             app.logger.exception("Error al inicializar la base de datos.")
             sys.exit(1)
 
+    cola.init_app(app, db.session_factory)
+    vigilante.init_app(app, db.session_factory)
+    calendarios.max_entradas = int(app.config["CALENDARIO_CACHE"])
+    cuadrantes.max_entradas = int(app.config["EQUIPO_CACHE"])
+    estadillos_fijos.max_entradas = int(app.config["ESTADILLO_CACHE"])
+
     app.session_interface = SqlAlchemySessionInterface()
 
     init_firebase()
@@ -201,4 +268,6 @@ def create_app() -> Flask:
 
 if __name__ == "__main__":  # pragma: no cover
     app = create_app()
+    if app.config["UPLOAD_ASYNC"]:
+        cola.reanuda_pendientes()
     app.run(debug=True, port=app.config["PORT"], host=app.config["HOST"])
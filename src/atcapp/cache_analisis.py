@@ -0,0 +1,124 @@
+"""Caché en disco de los datos extraídos de los pdf.
+
+Extraer las tablas de un pdf con pdfplumber es la etapa más lenta de la
+carga. Cuando cambia la lógica de identificación de usuarios o de escritura
+hay que volver a cargar los archivos, pero su extracción no cambia. Los
+datos extraídos de cada archivo se guardan en JSON en un directorio, con
+el SHA-256 del contenido y la versión del extractor en el nombre. Si el
+archivo vuelve a cargarse se leen de la caché sin abrir el pdf.
+
+Cambiar la versión del extractor (VERSION_EXTRACCION en carga_turnero y
+carga_estadillo) hace que no se reutilicen los datos antiguos, que se
+acaban descartando al superar el tamaño máximo de la caché. Se descartan
+primero los archivos usados hace más tiempo.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Mapping
+
+logger = getLogger(__name__)
+
+MAX_MB = 256
+"""Tamaño máximo por defecto de la caché en MB."""
+
+
+@dataclass
+class CacheAnalisis:
+    """Directorio con los datos extraídos de los pdf, por hash y versión."""
+
+    directorio: Path
+    max_bytes: int = MAX_MB * 1024 * 1024
+
+    def ruta(self, tipo: str, version: int, sha256: str) -> Path:
+        """Archivo de la caché de unos datos."""
+        return self.directorio / f"{tipo}-v{version}-{sha256}.json"
+
+    def lee(self, tipo: str, version: int, sha256: str) -> Any:  # noqa: ANN401
+        """Devuelve los datos guardados, o None si no están en la caché.
+
+        Un archivo dañado se borra y se trata como si no estuviera.
+        """
+        ruta = self.ruta(tipo, version, sha256)
+        try:
+            datos = json.loads(ruta.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Archivo de caché no válido: %s", ruta)
+            ruta.unlink(missing_ok=True)
+            return None
+        # La fecha de modificación marca el último uso, para el descarte
+        try:
+            os.utime(ruta)
+        except OSError:
+            logger.debug("No se puede actualizar la fecha de %s", ruta)
+        return datos
+
+    def guarda(
+        self,
+        tipo: str,
+        version: int,
+        sha256: str,
+        datos: Any,  # noqa: ANN401
+    ) -> None:
+        """Guarda los datos y descarta los más antiguos si se supera el tamaño.
+
+        Un error al escribir se registra pero no interrumpe la carga.
+        """
+        ruta = self.ruta(tipo, version, sha256)
+        # Se escribe en un temporal y se renombra, para que otro proceso
+        # nunca lea un archivo a medias
+        temporal = ruta.with_suffix(f".{uuid4().hex}.tmp")
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            temporal.write_text(
+                json.dumps(datos, ensure_ascii=False, separators=(",", ":")),
+                encoding="utf-8",
+            )
+            temporal.replace(ruta)
+        except OSError:
+            logger.exception("No se pueden guardar los datos en la caché %s", ruta)
+            temporal.unlink(missing_ok=True)
+            return
+        self.recorta()
+
+    def recorta(self) -> None:
+        """Borra los archivos usados hace más tiempo hasta no superar max_bytes."""
+        archivos = []
+        for ruta in self.directorio.glob("*.json"):
+            try:
+                stat = ruta.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((stat.st_mtime, stat.st_size, ruta))
+        total = sum(tamaño for _, tamaño, _ in archivos)
+        for _, tamaño, ruta in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            ruta.unlink(missing_ok=True)
+            total -= tamaño
+
+    def tamaño(self) -> int:
+        """Bytes ocupados por la caché."""
+        return sum(ruta.stat().st_size for ruta in self.directorio.glob("*.json"))
+
+
+def cache_de_config(config: Mapping[str, Any]) -> CacheAnalisis | None:
+    """Caché configurada en CACHE_ANALISIS_DIR, o None si está desactivada."""
+    directorio = config.get("CACHE_ANALISIS_DIR")
+    if not directorio:
+        return None
+    return CacheAnalisis(
+        Path(directorio),
+        int(config.get("CACHE_ANALISIS_MB", MAX_MB)) * 1024 * 1024,
+    )
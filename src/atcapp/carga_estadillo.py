@@ -10,31 +10,46 @@ los datos en la base de datos.
 
 from __future__ import annotations
 
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import date, datetime, timezone
+from functools import partial
 from io import BytesIO
 from logging import getLogger
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, cast
 
 import pdfplumber
 from pdfminer.pdfparser import PDFSyntaxError
-from sqlalchemy.exc import IntegrityError
+from pdfplumber.utils import extract_text
+from sqlalchemy import insert
 from sqlalchemy.orm import scoped_session
 
 from . import get_timezone
-from .models import Estadillo, Periodo, Sector, Servicio
-from .user_utils import AtcTexto, create_user, find_user, update_user
+from .cargas import TIPO_ESTADILLO, hash_contenido
+from .estadillos import clave_estadillo, clave_estadillos_de_dependencia
+from .metricas import MetricasCarga, publica
+from .models import UTC, Estadillo, Periodo, Sector, Servicio
+from .user_utils import AtcIndex, AtcTexto, create_user, find_user, update_user
+from .versiones import cambia_versiones
 
 logger = getLogger(__name__)
 
 
 if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable
     from io import BufferedReader
 
     import pytz
+    from pdfplumber.page import Page
+    from pdfplumber.table import Table
     from sqlalchemy.orm import scoped_session
+    from sqlalchemy.sql import schema
     from werkzeug.datastructures import FileStorage
 
+    from .cache_analisis import CacheAnalisis
     from .models import ATC
 
 
@@ -89,14 +104,256 @@ class EstadilloTexto:
     sectores: set[str] = field(default_factory=set)
 
 
+VERSION_EXTRACCION = 1
+"""Versión de la extracción del estadillo.
+
+Se incrementa al cambiar EstadilloTexto o cómo se extrae, para no reutilizar
+los datos de la caché de análisis extraídos con la anterior.
+"""
+
+
+def estadillo_a_cache(data: EstadilloTexto) -> dict[str, Any]:
+    """Datos extraídos de un estadillo, para guardarlos en la caché de análisis.
+
+    Los conjuntos se guardan como listas ordenadas y los periodos de cada
+    controlador como listas [hora_inicio, funcion].
+    """
+    return {
+        "dependencia": data.dependencia,
+        "fecha": data.fecha,
+        "turno": data.turno,
+        "jefes_de_sala": data.jefes_de_sala,
+        "supervisores": data.supervisores,
+        "tcas": data.tcas,
+        "sectores": sorted(data.sectores),
+        "controladores": [
+            {
+                "nombre": c.nombre,
+                "categoria": c.categoria,
+                "sectores": sorted(c.sectores),
+                "comentarios": c.comentarios,
+                "periodos": [[p.hora_inicio, p.funcion] for p in c.periodos],
+            }
+            for c in data.controladores.values()
+        ],
+    }
+
+
+def estadillo_de_cache(datos: dict[str, Any]) -> EstadilloTexto:
+    """Reconstruye los datos guardados con estadillo_a_cache."""
+    controladores = [
+        Controller(
+            nombre=c["nombre"],
+            categoria=c["categoria"],
+            sectores=set(c["sectores"]),
+            comentarios=c["comentarios"],
+            periodos=[
+                PeriodosTexto(hora_inicio=hora_inicio, funcion=funcion)
+                for hora_inicio, funcion in c["periodos"]
+            ],
+        )
+        for c in datos["controladores"]
+    ]
+    return EstadilloTexto(
+        dependencia=datos["dependencia"],
+        fecha=datos["fecha"],
+        turno=datos["turno"],
+        jefes_de_sala=datos["jefes_de_sala"],
+        supervisores=datos["supervisores"],
+        tcas=datos["tcas"],
+        controladores={c.nombre: c for c in controladores},
+        sectores=set(datos["sectores"]),
+    )
+
+
+TablaTexto = list[list[str | None]]
+"""Texto de las celdas de una tabla, como lo devuelve Table.extract."""
+Celda = tuple[float, float, float, float]
+
+PAGINA_PERSONAL = "personal"
+"""Primera página: jefes de sala, supervisores, TCAs y controladores."""
+PAGINA_PERIODOS = "periodos"
+"""Segunda página: los periodos de cada controlador."""
+
+VERSION_PLANTILLA = 1
+"""Versión del formato de las plantillas. Las de otra versión no se reutilizan."""
+MAX_PLANTILLAS = 64
+"""Plantillas que se guardan en memoria. Se descartan las menos usadas."""
+
+FECHA_PATTERN = re.compile(r"\d{2}\.\d{2}\.\d{4}$")
+HORA_PATTERN = re.compile(r"\d{1,2}:\d{2}$")
+
+
+@dataclass(frozen=True)
+class PlantillaEstadillo:
+    """Rejilla de celdas de las tablas de una página del estadillo."""
+
+    tablas: tuple[tuple[tuple[Celda | None, ...], ...], ...]
+    """Filas de cada tabla, con None donde una celda combinada ocupa la
+    posición, como en Table.rows."""
+
+    @classmethod
+    def de_tablas(cls, tables: list[Table]) -> PlantillaEstadillo:
+        """Guarda la rejilla de las tablas encontradas por find_tables."""
+        return cls(
+            tuple(tuple(tuple(row.cells) for row in table.rows) for table in tables),
+        )
+
+
+_plantillas: OrderedDict[tuple[int, str, int], PlantillaEstadillo] = OrderedDict()
+_plantillas_lock = threading.Lock()
+
+
+def firma_de_lineas(page: Page) -> int:
+    """Identifica la geometría de las líneas de una página.
+
+    Con la estrategia por defecto find_tables calcula las celdas solo a
+    partir de las líneas de la página, así que dos páginas con la misma
+    firma tienen las mismas celdas. La firma distingue la dependencia y el
+    número de filas de cada tabla sin tener que leer el texto.
+    """
+    return hash(
+        tuple(
+            sorted(
+                (
+                    edge["orientation"] or "",
+                    round(edge["x0"], 1),
+                    round(edge["top"], 1),
+                    round(edge["x1"], 1),
+                    round(edge["bottom"], 1),
+                )
+                for edge in page.edges
+            ),
+        ),
+    )
+
+
+def _valida_personal(tablas: list[TablaTexto]) -> bool:
+    """Comprueba que la tabla empieza por "DEPENDENCIA DD.MM.AAAA TURNO"."""
+    if len(tablas) != 1 or not tablas[0] or not tablas[0][0][0]:
+        return False
+    cabecera = tablas[0][0][0].split()
+    if len(cabecera) != 3:  # noqa: PLR2004
+        return False
+    return FECHA_PATTERN.match(cabecera[1]) is not None
+
+
+def _valida_periodos(tablas: list[TablaTexto]) -> bool:
+    """Comprueba que cada controlador ocupa dos filas y la segunda son horas."""
+    for tabla in tablas:
+        if len(tabla) % 2:
+            return False
+        for row_horas in tabla[1::2]:
+            if any(hora and not HORA_PATTERN.match(hora) for hora in row_horas[1:]):
+                return False
+    return True
+
+
+_VALIDACIONES: dict[str, Callable[[list[TablaTexto]], bool]] = {
+    PAGINA_PERSONAL: _valida_personal,
+    PAGINA_PERIODOS: _valida_periodos,
+}
+
+
+def vacia_plantillas() -> None:
+    """Descarta todas las plantillas guardadas."""
+    with _plantillas_lock:
+        _plantillas.clear()
+
+
+def recorta_celdas(page: Page, plantilla: PlantillaEstadillo) -> list[TablaTexto]:
+    """Extrae el texto de cada celda de la plantilla.
+
+    Asigna los caracteres a las celdas por su centro y une su texto igual
+    que Table.extract, pero ordena los caracteres una sola vez por altura
+    en lugar de recorrer todos los de la página en cada fila.
+    """
+    chars = page.chars
+    centros = sorted(
+        ((char["top"] + char["bottom"]) / 2, i) for i, char in enumerate(chars)
+    )
+    alturas = [centro for centro, _ in centros]
+
+    tablas = []
+    for filas in plantilla.tablas:
+        tabla: TablaTexto = []
+        for fila in filas:
+            textos: list[str | None] = []
+            for celda in fila:
+                if celda is None:
+                    textos.append(None)
+                    continue
+                x0, top, x1, bottom = celda
+                # Los caracteres de la celda, en el orden de la página
+                indices = sorted(
+                    i
+                    for _, i in centros[
+                        bisect_left(alturas, top) : bisect_left(alturas, bottom)
+                    ]
+                    if x0 <= (chars[i]["x0"] + chars[i]["x1"]) / 2 < x1
+                )
+                textos.append(
+                    extract_text([chars[i] for i in indices]) if indices else "",
+                )
+            tabla.append(textos)
+        tablas.append(tabla)
+    return tablas
+
+
+def tablas_de_pagina(page: Page, pagina: str) -> list[TablaTexto]:
+    """Extrae el texto de las tablas de una página del estadillo.
+
+    La rejilla de celdas de cada geometría de página se guarda como
+    plantilla la primera vez que se encuentran sus tablas con find_tables.
+    Las siguientes páginas con las mismas líneas se extraen recortando el
+    texto de las celdas de la plantilla, sin volver a buscar las tablas.
+    Si el resultado no tiene el formato esperado de la página se vuelven a
+    buscar las tablas.
+
+    De la primera página solo se devuelve la tabla mayor, como en
+    extract_table.
+    """
+    valida = _VALIDACIONES[pagina]
+    clave = (VERSION_PLANTILLA, pagina, firma_de_lineas(page))
+    with _plantillas_lock:
+        plantilla = _plantillas.get(clave)
+        if plantilla is not None:
+            _plantillas.move_to_end(clave)
+
+    if plantilla is not None:
+        tablas = recorta_celdas(page, plantilla)
+        if valida(tablas):
+            return tablas
+        logger.warning("La plantilla de la página de %s no es válida", pagina)
+
+    encontradas = page.find_tables()
+    if pagina == PAGINA_PERSONAL:
+        # La mayor por número de celdas, como Page.find_table
+        encontradas = sorted(
+            encontradas,
+            key=lambda t: (-len(t.cells), t.bbox[1], t.bbox[0]),
+        )[:1]
+    tablas = [table.extract() for table in encontradas]
+    with _plantillas_lock:
+        if valida(tablas):
+            _plantillas[clave] = PlantillaEstadillo.de_tablas(encontradas)
+            _plantillas.move_to_end(clave)
+            while len(_plantillas) > MAX_PLANTILLAS:
+                _plantillas.popitem(last=False)
+        else:
+            _plantillas.pop(clave, None)
+    return tablas
+
+
 def extraer_datos_estadillo(page: pdfplumber.page.Page) -> EstadilloTexto:
     """Extraer los datos del la primera página del estadillo.
 
     Principalmente las personas que trabajan y los sectores en los que trabajan.
     """
-    table = page.extract_table()
-    if table is None:
+    tablas = tablas_de_pagina(page, PAGINA_PERSONAL)
+    if not tablas:
         return EstadilloTexto()
+    table = tablas[0]
 
     data = EstadilloTexto()
 
@@ -191,10 +448,13 @@ def extraer_periodos(page: pdfplumber.page.Page) -> dict[str, list[PeriodosTexto
 
     La clave es el nombre del controlador.
     """
-    tables = page.extract_tables()
-    if tables is None:
-        return {}
+    return extraer_periodos_de_tablas(tablas_de_pagina(page, PAGINA_PERIODOS))
+
 
+def extraer_periodos_de_tablas(
+    tables: list[list[list[str | None]]],
+) -> dict[str, list[PeriodosTexto]]:
+    """Extraer los periodos de todas las tablas de la segunda página."""
     periodos = {}
     for table in tables:
         data = extraer_periodos_de_tabla(table)
@@ -203,18 +463,14 @@ def extraer_periodos(page: pdfplumber.page.Page) -> dict[str, list[PeriodosTexto
     return periodos
 
 
-def guardar_atc_en_estadillo(
+def resuelve_atc(
     atc_texto: AtcTexto,
-    estadillo: Estadillo,
-    rol_servicio: str,
     db_session: scoped_session,
+    indice: AtcIndex | None = None,
 ) -> ATC:
-    """Incluye a un atc en un estadillo.
+    """Busca un atc por su nombre y lo crea si no existe en la base de datos.
 
-    El atc se almacena con su categoría profesional y rol
-    en función de la relación que se pase como argumento.
-
-    Si el atc no existe en la base de datos, se crea.
+    Con indice la búsqueda se hace en memoria.
     """
     apellidos_nombre = atc_texto.apellidos_nombre
 
@@ -222,27 +478,18 @@ def guardar_atc_en_estadillo(
         _msg = "El nombre del controlador no puede estar vacío"
         raise ValueError(_msg)
 
-    user = find_user(apellidos_nombre, db_session)
+    user = (
+        indice.busca(apellidos_nombre)
+        if indice is not None
+        else find_user(apellidos_nombre, db_session)
+    )
     if not user:
         logger.debug(
             "Controlador %s no encontrado en la base de datos",
             apellidos_nombre,
         )
-        user = create_user(atc_texto, db_session)
-
-    servicio = (
-        db_session.query(Servicio)
-        .filter_by(id_atc=user.id, id_estadillo=estadillo.id)
-        .first()
-    )
-    if not servicio:
-        servicio = Servicio(
-            id_atc=user.id,
-            id_estadillo=estadillo.id,
-            categoria=atc_texto.categoria,
-            rol=rol_servicio,
-        )
-        db_session.add(servicio)
+        user = create_user(atc_texto, db_session, indice)
+        db_session.flush()
     return user
 
 
@@ -302,169 +549,408 @@ def calcula_horas_inicio_y_fin(
     return horas
 
 
-def guardar_periodos(
-    user: ATC,
+@dataclass(frozen=True)
+class DatosPeriodo:
+    """Periodo de un controlador listo para guardar en la base de datos."""
+
+    hora_inicio: datetime
+    """Hora de inicio en UTC naif, tal y como se guarda."""
+    hora_fin: datetime
+    """Hora de fin en UTC naif, tal y como se guarda."""
+    actividad: str
+    """E, P, CAS o D."""
+    sector: str | None
+    """Nombre del sector, o None en los descansos."""
+
+
+def calcula_periodos(
     periodos: list[PeriodosTexto],
-    estadillo: Estadillo,
-    db_session: scoped_session,
+    fecha: date,
     tz: pytz.BaseTzInfo,
-) -> None:
-    """Guardar los periodos de los controladores en la base de datos."""
-    fin_mañana = string_to_utc_datetime("15:00", estadillo.fecha, tz)
-    fin_tarde = string_to_utc_datetime("22:30", estadillo.fecha, tz)
+) -> list[DatosPeriodo]:
+    """Convierte los periodos en texto de un controlador en DatosPeriodo."""
+    fin_mañana = string_to_utc_datetime("15:00", fecha, tz)
+    fin_tarde = string_to_utc_datetime("22:30", fecha, tz)
 
     horas = calcula_horas_inicio_y_fin(
         periodos,
-        estadillo.fecha,
+        fecha,
         fin_mañana,
         fin_tarde,
         tz=tz,
     )
 
-    for i, periodo_texto in enumerate(periodos):
-        sector = None
+    res = []
+    for (hora_inicio, hora_fin), periodo_texto in zip(horas, periodos, strict=True):
         if periodo_texto.funcion == "DESCANSO":
             actividad, sector_name = "D", None
         else:
             actividad, sector_name = extrae_actividad_y_sector(periodo_texto.funcion)
 
-            sector = db_session.query(Sector).filter_by(nombre=sector_name).first()
-            if not sector:
-                logger.warning(
-                    "Sector %s no encontrado en la base de datos",
-                    sector_name,
-                )
-                continue
-
         # Convertir a naive datetime en UTC
-        hora_inicio = horas[i][0].replace(tzinfo=None)
-        hora_fin = horas[i][1].replace(tzinfo=None)
-
-        periodo = Periodo(
-            id_controlador=user.id,
-            id_estadillo=estadillo.id,
-            hora_inicio=hora_inicio,
-            hora_fin=hora_fin,
-            actividad=actividad,
+        res.append(
+            DatosPeriodo(
+                hora_inicio=hora_inicio.replace(tzinfo=None),
+                hora_fin=hora_fin.replace(tzinfo=None),
+                actividad=actividad,
+                sector=sector_name,
+            ),
         )
-        if sector:
-            periodo.id_sector = sector.id
+    return res
 
-        db_session.add(periodo)
-    db_session.commit()
 
+ROLES_ESTADILLO = {
+    "jefes_de_sala": ("Jefe de Sala", "JDS"),
+    "supervisores": ("Supervisor", "SUP"),
+    "tcas": ("TCA", "TCA"),
+}
+"""Atributo de EstadilloTexto: (rol del servicio, categoría)."""
 
-def procesar_controladores_y_sectores(
-    controladores: dict[str, Controller],
-    estadillo: Estadillo,
+
+def resuelve_sectores(
+    nombres: set[str],
+    crear: set[str],
     db_session: scoped_session,
+) -> dict[str, Sector]:
+    """Busca todos los sectores por nombre en una única consulta.
+
+    Los sectores de crear que no existan se crean en un solo lote. El resto
+    de nombres desconocidos no aparecen en el resultado.
+    """
+    sectores: dict[str, Sector] = {}
+    if nombres:
+        for sector in db_session.query(Sector).filter(Sector.nombre.in_(nombres)):
+            sectores.setdefault(sector.nombre, sector)
+
+    nuevos = [Sector(nombre=nombre) for nombre in sorted(crear - sectores.keys())]
+    if nuevos:
+        db_session.add_all(nuevos)
+        db_session.flush()
+        sectores.update({sector.nombre: sector for sector in nuevos})
+    return sectores
+
+
+@dataclass
+class EstadoEstadillo:
+    """Servicios, sectores y periodos que debe tener un estadillo en la base de datos.
+
+    Se calcula a partir de un EstadilloTexto para compararlo con lo ya guardado.
+    """
+
+    servicios: dict[int, tuple[str, str]] = field(default_factory=dict)
+    """id_atc: (categoría, rol)."""
+    sectores: dict[str, Sector] = field(default_factory=dict)
+    """Sectores por nombre, incluidos los que solo aparecen en los periodos."""
+    sectores_estadillo: set[str] = field(default_factory=set)
+    """Nombres de los sectores asociados al estadillo."""
+    periodos: dict[tuple[int, datetime], DatosPeriodo] = field(default_factory=dict)
+    """Periodos por (id_controlador, hora de inicio UTC)."""
+
+    def id_sector(self, datos: DatosPeriodo) -> int | None:
+        """Id del sector de un periodo, o None si es un descanso."""
+        return self.sectores[datos.sector].id if datos.sector else None
+
+    def lista_sectores_estadillo(self) -> list[Sector]:
+        """Sectores que se asocian al estadillo."""
+        return [
+            sector
+            for nombre, sector in self.sectores.items()
+            if nombre in self.sectores_estadillo
+        ]
+
+
+def _calcula_personal(
+    data: EstadilloTexto,
+    estado: EstadoEstadillo,
+    resuelve: Callable[[AtcTexto], ATC],
+) -> None:
+    """Añade al estado los servicios de jefes de sala, supervisores y TCAs."""
+    for nombre_atributo, (rol_servicio, categoria) in ROLES_ESTADILLO.items():
+        for nombre in (nombre for nombre in getattr(data, nombre_atributo) if nombre):
+            atc_texto = AtcTexto(
+                apellidos_nombre=nombre,
+                dependencia=data.dependencia,
+                categoria=categoria,
+            )
+            try:
+                user = resuelve(atc_texto)
+            except ValueError:
+                logger.exception("Error al guardar %s %s", rol_servicio, nombre)
+                continue
+            estado.servicios.setdefault(user.id, (categoria, rol_servicio))
+
+
+def _calcula_controladores(
+    data: EstadilloTexto,
+    fecha: date,
+    estado: EstadoEstadillo,
+    resuelve: Callable[[AtcTexto], ATC],
     tz: pytz.BaseTzInfo,
 ) -> None:
-    """Procesar los controladores y sus sectores.
+    """Añade al estado los servicios, sectores y periodos de los controladores.
 
-    Añade a la base de datos a los controladores y sectores que no existan.
+    Los sectores solo se anotan por nombre; se resuelven después en bloque.
     """
-    for nombre_controlador, controller in controladores.items():
+    for nombre_controlador, controller in data.controladores.items():
         atc_texto = AtcTexto(
             apellidos_nombre=nombre_controlador,
-            dependencia=estadillo.dependencia,
+            dependencia=data.dependencia,
             categoria=controller.categoria,
         )
         try:
-            user = guardar_atc_en_estadillo(
-                atc_texto,
-                estadillo,
-                "Controlador",
-                db_session,
-            )
+            user = resuelve(atc_texto)
             update_user(user, controller.categoria, None)
         except ValueError:
             logger.exception("Error al guardar controlador %s", nombre_controlador)
             continue
+        estado.servicios.setdefault(user.id, (controller.categoria, "Controlador"))
+        estado.sectores_estadillo.update(controller.sectores)
+
+        for datos in calcula_periodos(controller.periodos, fecha, tz):
+            estado.periodos[(user.id, UTC.localize(datos.hora_inicio))] = datos
+
+
+def calcula_estado_estadillo(
+    data: EstadilloTexto,
+    fecha: date,
+    db_session: scoped_session,
+    tz: pytz.BaseTzInfo,
+) -> EstadoEstadillo:
+    """Calcula el estado que debe tener en la base de datos un estadillo.
+
+    Crea los ATCs y los sectores del estadillo que no existan. Los periodos
+    en sectores desconocidos se descartan.
+    """
+    estado = EstadoEstadillo()
+    resuelve = partial(
+        resuelve_atc,
+        db_session=db_session,
+        indice=AtcIndex.carga(db_session),
+    )
+    _calcula_personal(data, estado, resuelve)
+    _calcula_controladores(data, fecha, estado, resuelve, tz)
+
+    nombres = estado.sectores_estadillo | {
+        datos.sector for datos in estado.periodos.values() if datos.sector
+    }
+    estado.sectores = resuelve_sectores(nombres, estado.sectores_estadillo, db_session)
+
+    for clave, datos in list(estado.periodos.items()):
+        if datos.sector and datos.sector not in estado.sectores:
+            logger.warning("Sector %s no encontrado en la base de datos", datos.sector)
+            del estado.periodos[clave]
+    return estado
+
+
+def _reconcilia_servicios(estadillo: Estadillo, estado: EstadoEstadillo) -> None:
+    """Inserta, modifica o borra los servicios que difieren del estado deseado."""
+    deseados = dict(estado.servicios)
+    for servicio in list(estadillo.servicios):
+        deseado = deseados.pop(servicio.id_atc, None)
+        if deseado is None:
+            estadillo.servicios.remove(servicio)
+        elif (servicio.categoria, servicio.rol) != deseado:
+            servicio.categoria, servicio.rol = deseado
+    for id_atc, (categoria, rol) in deseados.items():
+        estadillo.servicios.append(
+            Servicio(id_atc=id_atc, categoria=categoria, rol=rol),
+        )
+
+
+def _reconcilia_periodos(
+    estadillo: Estadillo,
+    estado: EstadoEstadillo,
+) -> tuple[int, int, int]:
+    """Inserta, modifica o borra los periodos que difieren del estado deseado.
+
+    Devuelve el número de periodos insertados, modificados y borrados.
+    """
+    deseados = dict(estado.periodos)
+    n_modificados, n_borrados = 0, 0
+    for periodo in list(estadillo.periodos):
+        datos = deseados.pop((periodo.id_controlador, periodo.hora_inicio_utc), None)
+        if datos is None:
+            estadillo.periodos.remove(periodo)
+            n_borrados += 1
+            continue
+        id_sector = estado.id_sector(datos)
+        if (
+            periodo.hora_fin_utc != UTC.localize(datos.hora_fin)
+            or periodo.actividad != datos.actividad
+            or periodo.id_sector != id_sector
+        ):
+            periodo.hora_fin = datos.hora_fin
+            periodo.actividad = datos.actividad
+            periodo.id_sector = id_sector  # type: ignore[assignment]
+            n_modificados += 1
+    for (id_atc, _), datos in deseados.items():
+        estadillo.periodos.append(
+            Periodo(
+                id_controlador=id_atc,
+                hora_inicio=datos.hora_inicio,
+                hora_fin=datos.hora_fin,
+                actividad=datos.actividad,
+                id_sector=estado.id_sector(datos),
+            ),
+        )
+    return len(deseados), n_modificados, n_borrados
 
-        for sector_name in controller.sectores:
-            sector = db_session.query(Sector).filter_by(nombre=sector_name).first()
-            if not sector:
-                sector = Sector(nombre=sector_name)
-                db_session.add(sector)
-            if sector not in estadillo.sectores:
-                estadillo.sectores.append(sector)
 
-        guardar_periodos(user, controller.periodos, estadillo, db_session, tz)
+def reconcilia_estadillo(
+    estadillo: Estadillo,
+    data: EstadilloTexto,
+    db_session: scoped_session,
+    tz: pytz.BaseTzInfo,
+    *,
+    metricas: MetricasCarga | None = None,
+) -> Estadillo:
+    """Actualiza en el sitio un estadillo ya guardado con una nueva versión.
+
+    Compara los servicios, sectores y periodos deseados con los guardados
+    y solo inserta, modifica o borra las filas que cambian. Todo se
+    confirma en una única transacción.
+    """
+    metricas = metricas or MetricasCarga(tipo=TIPO_ESTADILLO)
+    with metricas.etapa("usuarios"):
+        estado = calcula_estado_estadillo(data, estadillo.fecha, db_session, tz)
+
+    with metricas.etapa("escritura"):
+        _reconcilia_servicios(estadillo, estado)
+        estadillo.sectores = estado.lista_sectores_estadillo()
+        n_nuevos, n_modificados, n_borrados = _reconcilia_periodos(estadillo, estado)
+
+        logger.info(
+            "Estadillo %s reconciliado: %d periodos nuevos, %d modificados, "
+            "%d borrados",
+            estadillo.id,
+            n_nuevos,
+            n_modificados,
+            n_borrados,
+        )
+        # Lo que se muestra del estadillo sale de sus periodos
+        if n_nuevos or n_modificados or n_borrados:
+            cambia_versiones(
+                db_session,
+                [
+                    clave_estadillo(estadillo.id),
+                    clave_estadillos_de_dependencia(estadillo.dependencia),
+                ],
+            )
+        db_session.commit()
+    return estadillo
+
+
+def fecha_del_estadillo(data: EstadilloTexto) -> date:
+    """Convierte la fecha "27.05.2024" del estadillo en un date."""
+    return datetime.strptime(data.fecha, "%d.%m.%Y").date()  # noqa: DTZ007
 
 
 def guardar_datos_estadillo(
     data: EstadilloTexto,
     db_session: scoped_session,
     tz: pytz.BaseTzInfo,
+    *,
+    reconciliar: bool = True,
+    metricas: MetricasCarga | None = None,
 ) -> Estadillo:
-    """Guardar los datos generales del estadillo en la base de datos."""
-    logger.info("Guardando datos del estadillo en la base de datos")
-    # Convertir la fecha "27.05.2024" a un objeto date de Python
-    fecha = datetime.strptime(data.fecha, "%d.%m.%Y").astimezone(tz).date()
+    """Guardar los datos generales del estadillo en la base de datos.
 
-    # Iniciar transacción
-    transaction = db_session.begin_nested()
-
-    # Crear el objeto Estadillo
-    estadillo = Estadillo(
-        fecha=fecha,
-        dependencia=data.dependencia,
-        turno=data.turno,
-    )
+    Si ya existe un estadillo para la misma fecha, dependencia y turno,
+    con reconciliar se actualiza en el sitio con reconcilia_estadillo.
+    Sin reconciliar se borra en cascada y se vuelve a insertar.
 
-    try:
-        # Añadir y confirmar la sesión para asegurar que estadillo.id esté disponible
-        db_session.add(estadillo)
-        db_session.commit()
-    except IntegrityError:
-        transaction.rollback()  # Deshacer la transacción en caso de error
-        # Manejar la excepción específicamente
-        # Ya existía un estadillo así. Hay que borrar los datos anteriores
-        logger.warning("Estadillo para la fecha %s ya existe. Se sustituye.", fecha)
+    Los sectores se resuelven en una consulta, los periodos se insertan
+    con un único executemany y todo se confirma en una sola transacción.
+    Si se indica, en metricas se anotan las etapas de usuarios y escritura.
+    """
+    logger.info("Guardando datos del estadillo en la base de datos")
+    metricas = metricas or MetricasCarga(tipo=TIPO_ESTADILLO)
+    fecha = fecha_del_estadillo(data)
 
-        # Obtener y eliminar el estadillo existente y sus dependencias en cascada
+    with metricas.etapa("escritura"):
         estadillo_existente = (
             db_session.query(Estadillo)
             .filter_by(fecha=fecha, dependencia=data.dependencia, turno=data.turno)
-            .one()
+            .first()
+        )
+    if estadillo_existente and reconciliar:
+        logger.info("Estadillo para la fecha %s ya existe. Se reconcilia.", fecha)
+        return reconcilia_estadillo(
+            estadillo_existente,
+            data,
+            db_session,
+            tz,
+            metricas=metricas,
         )
 
-        db_session.delete(estadillo_existente)
-        db_session.commit()  # Asegurarse de que se elimine antes de añadir el nuevo
-
-        # Reintentar la inserción del nuevo estadillo
-        db_session.add(estadillo)
-        db_session.commit()
+    if estadillo_existente:
+        # Ya existía un estadillo así. Hay que borrar los datos anteriores
+        logger.warning("Estadillo para la fecha %s ya existe. Se sustituye.", fecha)
+        with metricas.etapa("escritura"):
+            db_session.delete(estadillo_existente)
+            db_session.flush()  # Se elimina antes de añadir el nuevo
 
-    roles = {
-        "jefes_de_sala": ("Jefe de Sala", "JDS"),
-        "supervisores": ("Supervisor", "SUP"),
-        "tcas": ("TCA", "TCA"),
-    }
+    with metricas.etapa("usuarios"):
+        estado = calcula_estado_estadillo(data, fecha, db_session, tz)
+    with metricas.etapa("escritura"):
+        return inserta_estadillo(data, fecha, estado, db_session)
 
-    for nombre_atributo, (rol_servicio, categoria) in roles.items():
-        for nombre in (nombre for nombre in getattr(data, nombre_atributo) if nombre):
-            atc_texto = AtcTexto(
-                apellidos_nombre=nombre,
-                dependencia=data.dependencia,
-                categoria=categoria,
-            )
-            try:
-                guardar_atc_en_estadillo(
-                    atc_texto,
-                    estadillo,
-                    rol_servicio,
-                    db_session,
-                )
-            except ValueError:
-                logger.exception("Error al guardar %s %s", rol_servicio, nombre)
-                continue
 
-    # Procesar controladores y sus sectores
-    procesar_controladores_y_sectores(data.controladores, estadillo, db_session, tz)
+def inserta_estadillo(
+    data: EstadilloTexto,
+    fecha: date,
+    estado: EstadoEstadillo,
+    db_session: scoped_session,
+) -> Estadillo:
+    """Inserta un estadillo nuevo con sus servicios y periodos.
 
-    logger.info("Datos del estadillo guardados en la base de datos")
+    Los periodos se insertan con un único executemany y todo se confirma
+    en una sola transacción.
+    """
+    estadillo = Estadillo(
+        fecha=fecha,
+        dependencia=data.dependencia,
+        turno=data.turno,
+        sectores=estado.lista_sectores_estadillo(),
+        servicios=[
+            Servicio(id_atc=id_atc, categoria=categoria, rol=rol)
+            for id_atc, (categoria, rol) in estado.servicios.items()
+        ],
+    )
+    db_session.add(estadillo)
+    db_session.flush()  # estadillo.id para los periodos
+
+    # Un único executemany para todos los periodos del estadillo
+    filas_periodos = [
+        {
+            "id_controlador": id_atc,
+            "id_estadillo": estadillo.id,
+            "hora_inicio": datos.hora_inicio,
+            "hora_fin": datos.hora_fin,
+            "actividad": datos.actividad,
+            "id_sector": estado.id_sector(datos),
+        }
+        for (id_atc, _), datos in estado.periodos.items()
+    ]
+    if filas_periodos:
+        # Con la tabla y no con el modelo: el insert del ORM parte el executemany
+        # cada vez que cambia qué columnas son nulas, como id_sector
+        tabla = cast("schema.Table", Periodo.__table__)
+        db_session.execute(insert(tabla), filas_periodos)
+
+    logger.info(
+        "Datos del estadillo guardados en la base de datos: %d periodos",
+        len(filas_periodos),
+    )
+    # El id puede ser el de un estadillo sustituido que esté en caché.
+    # La clave de la dependencia avisa a las páginas abiertas.
+    cambia_versiones(
+        db_session,
+        [
+            clave_estadillo(estadillo.id),
+            clave_estadillos_de_dependencia(estadillo.dependencia),
+        ],
+    )
     db_session.commit()
     return estadillo
 
@@ -506,32 +992,111 @@ def incorporar_periodos(
         )
 
 
-def procesa_estadillo(
-    file: FileStorage | BufferedReader,
-    db_session: scoped_session,
-) -> Estadillo:
-    """Procesa el archivo de estadillo diario.
+def resumen_estadillo(estadillo: Estadillo) -> dict[str, int]:
+    """Contadores de un estadillo guardado, para informar de la carga."""
+    return {
+        "n_controladores": len(estadillo.servicios),
+        "n_periodos": sum(len(atc.periodos) for atc in estadillo.atcs),
+    }
 
-    Extrae los datos del estadillo del archivo, analiza los datos e inserta los datos
-    en la base de datos.
+
+def extrae_estadillo(
+    contenido: bytes,
+    metricas: MetricasCarga,
+) -> EstadilloTexto:
+    """Extrae del pdf los datos del estadillo con los periodos incorporados.
+
+    Anota en metricas la etapa de extracción y las páginas, tablas y filas.
+    Un pdf no válido lanza ValueError.
     """
-    logger.info("Procesando archivo de estadillo diario")
     try:
-        with pdfplumber.open(BytesIO(file.read())) as pdf:
+        with metricas.etapa("extraccion"), pdfplumber.open(BytesIO(contenido)) as pdf:
             page1 = pdf.pages[0]
             page2 = pdf.pages[1]
+            metricas.paginas += len(pdf.pages)
     except PDFSyntaxError:
         logger.exception("Error al procesar el archivo PDF de estadillo")
         _msg = "Error al procesar el archivo PDF de estadillo"
         raise ValueError(_msg) from None
 
-    estadillo_texto = extraer_datos_estadillo(page1)
-    periodos_por_atc = extraer_periodos(page2)
-    incorporar_periodos(estadillo_texto, periodos_por_atc)
+    with metricas.etapa("extraccion"):
+        estadillo_texto = extraer_datos_estadillo(page1)
+        tablas_periodos = tablas_de_pagina(page2, PAGINA_PERIODOS)
+        periodos_por_atc = extraer_periodos_de_tablas(tablas_periodos)
+        incorporar_periodos(estadillo_texto, periodos_por_atc)
+    metricas.tablas += 1 + len(tablas_periodos)
+    metricas.filas += len(estadillo_texto.controladores) + len(periodos_por_atc)
+    return estadillo_texto
+
+
+def extrae_estadillo_con_cache(
+    contenido: bytes,
+    metricas: MetricasCarga,
+    cache: CacheAnalisis | None,
+) -> EstadilloTexto:
+    """Como extrae_estadillo, pero reutiliza los datos de la caché de análisis.
+
+    Un pdf que no está en la caché se extrae y se guarda en ella.
+    """
+    if cache is None:
+        return extrae_estadillo(contenido, metricas)
+
+    sha256 = hash_contenido(contenido)
+    with metricas.etapa("extraccion"):
+        guardados = cache.lee(TIPO_ESTADILLO, VERSION_EXTRACCION, sha256)
+        estadillo_texto = (
+            estadillo_de_cache(guardados) if guardados is not None else None
+        )
+    if estadillo_texto is not None:
+        metricas.filas += len(estadillo_texto.controladores)
+        logger.info("Datos del estadillo leídos de la caché")
+        return estadillo_texto
+
+    estadillo_texto = extrae_estadillo(contenido, metricas)
+    cache.guarda(
+        TIPO_ESTADILLO,
+        VERSION_EXTRACCION,
+        sha256,
+        estadillo_a_cache(estadillo_texto),
+    )
+    return estadillo_texto
+
+
+def procesa_estadillo(
+    file: FileStorage | BufferedReader | BytesIO,
+    db_session: scoped_session,
+    *,
+    reconciliar: bool = True,
+    metricas: MetricasCarga | None = None,
+    cache: CacheAnalisis | None = None,
+) -> Estadillo:
+    """Procesa el archivo de estadillo diario.
+
+    Extrae los datos del estadillo del archivo, analiza los datos e inserta los datos
+    en la base de datos. Un estadillo que ya existía se reconcilia en el sitio,
+    salvo que reconciliar sea False.
+
+    Los tiempos y contadores de cada etapa se publican con metricas.publica
+    y, si se indica, se anotan en metricas. Con cache, los datos de un pdf
+    ya extraído se leen de la caché de análisis sin abrir el pdf.
+    """
+    logger.info("Procesando archivo de estadillo diario")
+    metricas = metricas or MetricasCarga(tipo=TIPO_ESTADILLO)
+    with metricas.etapa("lectura"):
+        contenido = file.read()
+    metricas.bytes_leidos += len(contenido)
+    estadillo_texto = extrae_estadillo_con_cache(contenido, metricas, cache)
 
     tz = get_timezone(estadillo_texto.dependencia)
-    estadillo_db = guardar_datos_estadillo(estadillo_texto, db_session, tz)
+    with metricas.cuenta_consultas(db_session):
+        estadillo_db = guardar_datos_estadillo(
+            estadillo_texto,
+            db_session,
+            tz,
+            reconciliar=reconciliar,
+            metricas=metricas,
+        )
 
     logger.info("Archivo de estadillo diario procesado")
-    db_session.commit()
+    publica(metricas)
     return estadillo_db
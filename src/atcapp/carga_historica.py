@@ -0,0 +1,377 @@
+"""Carga masiva de turneros y estadillos archivados.
+
+Recorre un directorio buscando pdf, descarta los que ya están en el registro
+de cargas y analiza el resto en un pool de procesos. Cada archivo se
+clasifica como turnero o estadillo a partir de su primera página.
+
+Los datos se escriben después en orden cronológico, para que los usuarios
+creados por un turnero estén disponibles en los estadillos de ese mes.
+Cada lote de archivos se escribe en una única transacción. Dentro del lote
+cada archivo va en su propio savepoint, de forma que un archivo con errores
+no deshace los demás. Como las cargas se registran en la misma transacción,
+si el proceso se interrumpe basta con volver a lanzarlo para continuar.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from io import BytesIO
+from itertools import repeat
+from logging import getLogger
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import pdfplumber
+from sqlalchemy.orm import Session
+
+from . import get_timezone
+from .carga_estadillo import VERSION_EXTRACCION as VERSION_ESTADILLO
+from .carga_estadillo import (
+    EstadilloTexto,
+    estadillo_de_cache,
+    extrae_estadillo_con_cache,
+    fecha_del_estadillo,
+    guardar_datos_estadillo,
+    resumen_estadillo,
+)
+from .carga_turnero import (
+    EXTRACTOR_TABLA,
+    DatosTurnero,
+    ScheduleEntry,
+    extrae_turnero,
+    parse_and_insert_data,
+    resuelve_mes,
+    turnero_de_cache,
+)
+from .carga_turnero import VERSION_EXTRACCION as VERSION_TURNERO
+from .cargas import TIPO_ESTADILLO, TIPO_TURNERO, hash_contenido, registra_carga
+from .metricas import MetricasCarga
+from .models import Carga
+from .user_utils import AtcIndex
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+
+    from sqlalchemy.engine import Connection, Engine
+
+    from .cache_analisis import CacheAnalisis
+
+logger = getLogger(__name__)
+
+LOTE = 50
+"""Archivos por transacción."""
+
+DatosArchivo = tuple[DatosTurnero, list[ScheduleEntry]] | EstadilloTexto
+
+
+@dataclass
+class ArchivoAnalizado:
+    """Resultado del análisis de un pdf en el pool de procesos."""
+
+    ruta: Path
+    sha256: str
+    tipo: str = ""
+    """TIPO_TURNERO o TIPO_ESTADILLO. Vacío si no se reconoce."""
+    fecha: date = date.min
+    """Fecha del estadillo o primer día del mes del turnero."""
+    datos: DatosArchivo | None = None
+    error: str = ""
+
+    @property
+    def orden(self) -> tuple[date, int, str]:
+        """Clave de ordenación: por fecha y, el mismo día, turneros primero."""
+        return self.fecha, self.tipo != TIPO_TURNERO, self.ruta.name
+
+
+@dataclass
+class ResumenCargaHistorica:
+    """Contadores y tiempos de una carga masiva."""
+
+    n_encontrados: int = 0
+    n_ya_cargados: int = 0
+    n_cargados: int = 0
+    n_errores: int = 0
+    n_filas: int = 0
+    """Turnos, usuarios, servicios y periodos escritos."""
+    segundos_analisis: float = 0.0
+    segundos_escritura: float = 0.0
+    errores: list[str] = field(default_factory=list)
+
+    @property
+    def segundos(self) -> float:
+        """Duración total."""
+        return self.segundos_analisis + self.segundos_escritura
+
+    @property
+    def archivos_por_segundo(self) -> float:
+        """Archivos cargados por segundo."""
+        return self.n_cargados / self.segundos if self.segundos else 0.0
+
+    @property
+    def filas_por_segundo(self) -> float:
+        """Filas escritas por segundo de escritura."""
+        if not self.segundos_escritura:
+            return 0.0
+        return self.n_filas / self.segundos_escritura
+
+
+def busca_pdfs(directorio: Path) -> list[Path]:
+    """Lista los pdf del directorio y sus subdirectorios."""
+    return sorted(
+        ruta
+        for ruta in directorio.rglob("*")
+        if ruta.is_file() and ruta.suffix.lower() == ".pdf"
+    )
+
+
+def _tipo_del_pdf(contenido: bytes) -> str:
+    """TIPO_TURNERO o TIPO_ESTADILLO según la primera página, o vacío."""
+    with pdfplumber.open(BytesIO(contenido)) as pdf:
+        texto = pdf.pages[0].extract_text() or ""
+        if "- CONTROLADORES" in texto:
+            return TIPO_TURNERO
+        if len(pdf.pages) > 1:
+            return TIPO_ESTADILLO
+    return ""
+
+
+def _extrae_datos(
+    contenido: bytes,
+    cache: CacheAnalisis | None,
+    extractor: str,
+    workers_paginas: int,
+) -> tuple[str, DatosArchivo] | None:
+    """Clasifica un pdf y extrae sus datos, o None si no se reconoce.
+
+    Los datos se extraen igual que al subirlos desde la web, con
+    extrae_turnero y extrae_estadillo_con_cache, que los guardan en la
+    caché si se indica.
+    """
+    tipo = _tipo_del_pdf(contenido)
+    if tipo == TIPO_TURNERO:
+        return tipo, extrae_turnero(
+            contenido,
+            workers_paginas,
+            extractor=extractor,
+            cache=cache,
+        )
+    if tipo == TIPO_ESTADILLO:
+        metricas = MetricasCarga(tipo=TIPO_ESTADILLO)
+        return tipo, extrae_estadillo_con_cache(contenido, metricas, cache)
+    return None
+
+
+def _lee_cache(cache: CacheAnalisis, sha256: str) -> tuple[str, DatosArchivo] | None:
+    """Busca los datos del archivo en la caché como turnero y como estadillo."""
+    guardados = cache.lee(TIPO_TURNERO, VERSION_TURNERO, sha256)
+    if guardados is not None:
+        return TIPO_TURNERO, turnero_de_cache(guardados)
+    guardados = cache.lee(TIPO_ESTADILLO, VERSION_ESTADILLO, sha256)
+    if guardados is not None:
+        return TIPO_ESTADILLO, estadillo_de_cache(guardados)
+    return None
+
+
+def analiza_archivo(
+    ruta: Path,
+    sha256: str,
+    cache: CacheAnalisis | None = None,
+    extractor: str = EXTRACTOR_TABLA,
+    workers_paginas: int = 1,
+) -> ArchivoAnalizado:
+    """Clasifica un pdf y extrae sus datos.
+
+    Se ejecuta en los procesos del pool. Los errores se devuelven en el
+    resultado en lugar de propagarse, para no detener el resto de la carga.
+    Con cache, los datos de un archivo ya analizado se leen de la caché de
+    análisis sin abrir el pdf, y los de uno nuevo se guardan en ella.
+    extractor y workers_paginas son los de extrae_turnero.
+    """
+    archivo = ArchivoAnalizado(ruta=ruta, sha256=sha256)
+    try:
+        guardados = _lee_cache(cache, sha256) if cache else None
+        extraidos = guardados or _extrae_datos(
+            ruta.read_bytes(),
+            cache,
+            extractor,
+            workers_paginas,
+        )
+        if extraidos is None:
+            archivo.error = "No es un turnero ni un estadillo"
+            return archivo
+        archivo.tipo, archivo.datos = extraidos
+        if isinstance(archivo.datos, EstadilloTexto):
+            archivo.fecha = fecha_del_estadillo(archivo.datos)
+        else:
+            datos_turnero, _ = archivo.datos
+            year, month = resuelve_mes(datos_turnero.mes, datos_turnero.año)
+            archivo.fecha = date(year, month, 1)
+    except Exception as e:  # noqa: BLE001
+        archivo.error = f"{type(e).__name__}: {e}"
+    return archivo
+
+
+def analiza_en_paralelo(
+    pendientes: list[tuple[Path, str]],
+    workers: int,
+    cache: CacheAnalisis | None = None,
+    extractor: str = EXTRACTOR_TABLA,
+    workers_paginas: int = 1,
+) -> Iterable[ArchivoAnalizado]:
+    """Analiza los archivos en un pool de procesos, o en este si workers es 1.
+
+    Como en extrae_turneros, las páginas de un turnero solo se reparten
+    entre workers_paginas procesos cuando los archivos se analizan en este.
+    """
+    if workers <= 1:
+        return [
+            analiza_archivo(ruta, sha256, cache, extractor, workers_paginas)
+            for ruta, sha256 in pendientes
+        ]
+    rutas = [ruta for ruta, _ in pendientes]
+    hashes = [sha256 for _, sha256 in pendientes]
+    # spawn evita heredar conexiones del proceso principal
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+        return list(
+            executor.map(
+                analiza_archivo,
+                rutas,
+                hashes,
+                repeat(cache),
+                repeat(extractor),
+            ),
+        )
+
+
+def escribe_archivo(
+    archivo: ArchivoAnalizado,
+    session: Session,
+    indice: AtcIndex,
+) -> int:
+    """Escribe los datos de un archivo analizado y registra la carga.
+
+    Devuelve el número de filas escritas.
+    """
+    if isinstance(archivo.datos, EstadilloTexto):
+        tz = get_timezone(archivo.datos.dependencia)
+        estadillo = guardar_datos_estadillo(archivo.datos, session, tz)  # type: ignore[arg-type]
+        resumen = resumen_estadillo(estadillo)
+        n_filas = resumen["n_controladores"] + resumen["n_periodos"]
+    else:
+        datos_turnero, entradas = archivo.datos  # type: ignore[misc]
+        res = parse_and_insert_data(entradas, datos_turnero, session, indice)  # type: ignore[arg-type]
+        resumen = res.resumen()
+        n_filas = res.n_created_users + res.n_created_shifts + res.n_updated_shifts
+    registra_carga(
+        archivo.sha256,
+        archivo.tipo,
+        archivo.ruta.name,
+        resumen,
+        session,
+    )
+    return n_filas
+
+
+def escribe_lote(
+    lote: list[ArchivoAnalizado],
+    connection: Connection,
+    resumen: ResumenCargaHistorica,
+) -> None:
+    """Escribe un lote de archivos en una única transacción.
+
+    La sesión trabaja en savepoints dentro de la transacción de la
+    conexión, así que los commit y rollback de cada carga solo afectan a
+    su propio archivo.
+    """
+    with connection.begin():
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        indice = AtcIndex.carga(session)
+        try:
+            for archivo in lote:
+                try:
+                    resumen.n_filas += escribe_archivo(archivo, session, indice)
+                except Exception as e:
+                    logger.exception("Error al cargar %s", archivo.ruta)
+                    session.rollback()
+                    resumen.n_errores += 1
+                    resumen.errores.append(f"{archivo.ruta}: {e}")
+                    # El índice puede contener usuarios del savepoint deshecho
+                    indice = AtcIndex.carga(session)
+                else:
+                    resumen.n_cargados += 1
+        finally:
+            session.close()
+
+
+def carga_directorio(  # noqa: PLR0913
+    directorio: Path,
+    engine: Engine,
+    *,
+    workers: int = 1,
+    lote: int = LOTE,
+    progreso: Callable[[ResumenCargaHistorica], None] | None = None,
+    cache: CacheAnalisis | None = None,
+    extractor: str = EXTRACTOR_TABLA,
+    workers_paginas: int = 1,
+) -> ResumenCargaHistorica:
+    """Carga todos los turneros y estadillos de un directorio.
+
+    Los archivos cuyo contenido ya está en el registro de cargas se omiten.
+    Si se indica, progreso se llama después de escribir cada lote. Con
+    cache, los datos extraídos se reutilizan de la caché de análisis.
+    extractor y workers_paginas se usan como al subir un turnero, ver
+    analiza_en_paralelo.
+    """
+    resumen = ResumenCargaHistorica()
+    inicio = perf_counter()
+
+    por_hash: dict[str, Path] = {}
+    for ruta in busca_pdfs(directorio):
+        por_hash.setdefault(hash_contenido(ruta.read_bytes()), ruta)
+        resumen.n_encontrados += 1
+    with Session(engine) as session:
+        ya_cargados = {
+            sha256
+            for (sha256,) in session.query(Carga.sha256).filter(
+                Carga.sha256.in_(por_hash),
+            )
+        }
+    resumen.n_ya_cargados = resumen.n_encontrados - len(por_hash) + len(ya_cargados)
+    pendientes = [(r, h) for h, r in por_hash.items() if h not in ya_cargados]
+    logger.info(
+        "%d archivos encontrados, %d pendientes de cargar",
+        resumen.n_encontrados,
+        len(pendientes),
+    )
+
+    analizados = []
+    for archivo in analiza_en_paralelo(
+        pendientes,
+        workers,
+        cache,
+        extractor,
+        workers_paginas,
+    ):
+        if archivo.error:
+            logger.warning("Archivo %s descartado: %s", archivo.ruta, archivo.error)
+            resumen.n_errores += 1
+            resumen.errores.append(f"{archivo.ruta}: {archivo.error}")
+        else:
+            analizados.append(archivo)
+    analizados.sort(key=lambda archivo: archivo.orden)
+    resumen.segundos_analisis = perf_counter() - inicio
+
+    inicio = perf_counter()
+    with engine.connect() as connection:
+        for i in range(0, len(analizados), lote):
+            escribe_lote(analizados[i : i + lote], connection, resumen)
+            resumen.segundos_escritura = perf_counter() - inicio
+            if progreso:
+                progreso(resumen)
+    resumen.segundos_escritura = perf_counter() - inicio
+    return resumen
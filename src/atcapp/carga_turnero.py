@@ -10,29 +10,52 @@ the data into the database.
 
 from __future__ import annotations
 
+import json
+import multiprocessing
+import os
 import re
-from dataclasses import dataclass, field
-from datetime import datetime
+import statistics
+from bisect import bisect_right
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from datetime import date
 from io import BufferedReader, BytesIO
+from itertools import pairwise, repeat
 from logging import getLogger
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 import pdfplumber
 from pdfminer.pdfparser import PDFSyntaxError
-
-from . import get_timezone
-from .core import CODIGOS_DE_TURNO, PUESTOS_CARRERA, TURNOS_BASICOS
+from pdfplumber.utils import extract_text
+from sqlalchemy import select
+
+from .cargas import TIPO_TURNERO, hash_contenido, registra_carga
+from .core import (
+    CODIGOS_DE_TURNO,
+    PUESTOS_CARRERA,
+    TURNOS_BASICOS,
+    clave_turnos_del_mes,
+    claves_de_turnos_modificados,
+)
+from .database import bulk_upsert
+from .metricas import MetricasCarga, publica
 from .models import ATC, Turno
-from .user_utils import AtcTexto, UpdateResult, create_user, find_user, update_user
+from .user_utils import AtcIndex, AtcTexto, UpdateResult, create_user, update_user
+from .versiones import cambia_versiones, clave_atcs, lee_version
 
 logger = getLogger(__name__)
 
 if TYPE_CHECKING:  # pragma: no cover
-    import pytz
+    from collections.abc import Callable
+
     from pdfplumber.page import Page
+    from sqlalchemy.orm import Session
     from sqlalchemy.orm.scoping import scoped_session
     from werkzeug.datastructures import FileStorage
 
+    from .cache_analisis import CacheAnalisis
+
 
 @dataclass
 class DatosTurnero:
@@ -53,13 +76,53 @@ class ScheduleEntry:
     shifts: list[str] = field(default_factory=list)
 
 
+VERSION_EXTRACCION = 1
+"""Versión de la extracción del turnero.
+
+Se incrementa al cambiar DatosTurnero, ScheduleEntry o cómo se extraen, para
+no reutilizar los datos de la caché de análisis extraídos con la anterior.
+"""
+
+
+def turnero_a_cache(
+    datos_turnero: DatosTurnero,
+    entradas: list[ScheduleEntry],
+) -> dict[str, Any]:
+    """Datos extraídos de un turnero, para guardarlos en la caché de análisis.
+
+    Cada entrada se guarda como una lista [name, role, equipo, shifts].
+    """
+    return {
+        "datos_turnero": asdict(datos_turnero),
+        "entradas": [[e.name, e.role, e.equipo, e.shifts] for e in entradas],
+    }
+
+
+def turnero_de_cache(
+    datos: dict[str, Any],
+) -> tuple[DatosTurnero, list[ScheduleEntry]]:
+    """Reconstruye los datos guardados con turnero_a_cache."""
+    return DatosTurnero(**datos["datos_turnero"]), [
+        ScheduleEntry(name=name, role=role, equipo=equipo, shifts=shifts)
+        for name, role, equipo, shifts in datos["entradas"]
+    ]
+
+
+ClaveTurno = tuple[int, date]
+"""(id_atc, fecha), la clave única de un turno."""
+
+
 @dataclass
 class ResultadoProcesadoTurnos:
-    """Resultado del procesamiento de los turnos."""
+    """Resultado del procesamiento de los turnos.
 
-    existing_shifts: set[Turno] = field(default_factory=set)
-    updated_shifts: set[Turno] = field(default_factory=set)
-    created_shifts: set[Turno] = field(default_factory=set)
+    Solo guarda las claves de los turnos, no los objetos del ORM, para que
+    el resultado de una carga no mantenga vivas miles de instancias.
+    """
+
+    existing_shifts: set[ClaveTurno] = field(default_factory=set)
+    updated_shifts: set[ClaveTurno] = field(default_factory=set)
+    created_shifts: set[ClaveTurno] = field(default_factory=set)
 
     @property
     def n_existing_shifts(self) -> int:
@@ -84,11 +147,16 @@ class ResultadoProcesadoTurnos:
 
 @dataclass
 class ResultadoProcesadoTurnero(ResultadoProcesadoTurnos):
-    """Resultado del procesamiento del turnero."""
+    """Resultado del procesamiento del turnero.
+
+    Los usuarios se guardan por su id.
+    """
 
-    existing_users: set[ATC] = field(default_factory=set)
-    updated_users: set[ATC] = field(default_factory=set)
-    created_users: set[ATC] = field(default_factory=set)
+    existing_users: set[int] = field(default_factory=set)
+    updated_users: set[int] = field(default_factory=set)
+    created_users: set[int] = field(default_factory=set)
+    metricas: MetricasCarga | None = None
+    """Tiempos y contadores de la carga, si se ha medido."""
 
     @property
     def n_existing_users(self) -> int:
@@ -110,26 +178,40 @@ class ResultadoProcesadoTurnero(ResultadoProcesadoTurnos):
         """Total number of users."""
         return self.n_existing_users + self.n_updated_users + self.n_created_users
 
+    def resumen(self) -> dict[str, int]:
+        """Contadores del resultado, para guardarlos en el registro de cargas."""
+        return {
+            "n_existing_users": self.n_existing_users,
+            "n_updated_users": self.n_updated_users,
+            "n_created_users": self.n_created_users,
+            "n_total_users": self.n_total_users,
+            "n_existing_shifts": self.n_existing_shifts,
+            "n_updated_shifts": self.n_updated_shifts,
+            "n_created_shifts": self.n_created_shifts,
+            "n_total_shifts": self.n_total_shifts,
+        }
+
     def incluye(self, other: ResultadoProcesadoTurnero) -> ResultadoProcesadoTurnero:
         """Incluye los resultados de otro procesamiento.
 
         Se suman los creados.
         Se suman los actualizados.
         De los identificados se restan los creados y los actualizados.
-        Devuelve un nuevo objeto con los resultados combinados.
+        Los conjuntos se actualizan en el sitio y se devuelve el propio objeto.
         """
-        return ResultadoProcesadoTurnero(
-            created_users=self.created_users.union(other.created_users),
-            updated_users=self.updated_users.union(other.updated_users),
-            existing_users=self.existing_users.union(other.existing_users)
-            - self.created_users
-            - self.updated_users,
-            created_shifts=self.created_shifts.union(other.created_shifts),
-            updated_shifts=self.updated_shifts.union(other.updated_shifts),
-            existing_shifts=self.existing_shifts.union(other.existing_shifts)
-            - self.created_shifts
-            - self.updated_shifts,
-        )
+        self.created_users |= other.created_users
+        self.updated_users |= other.updated_users
+        self.existing_users |= other.existing_users
+        self.existing_users -= self.created_users | self.updated_users
+        self.created_shifts |= other.created_shifts
+        self.updated_shifts |= other.updated_shifts
+        self.existing_shifts |= other.existing_shifts
+        self.existing_shifts -= self.created_shifts | self.updated_shifts
+        if other.metricas:
+            if self.metricas is None:
+                self.metricas = MetricasCarga(tipo=other.metricas.tipo)
+            self.metricas.incluye(other.metricas)
+        return self
 
 
 def is_valid_shift_code(shift_code: str) -> bool:
@@ -149,6 +231,40 @@ def is_valid_shift_code(shift_code: str) -> bool:
 MAX_DAYS_IN_MONTH = 31
 
 
+EQUIPO_PATTERN = re.compile(r"EQUIPO: (\w+)")
+"""Regular expression to find the equipo."""
+
+
+def entrada_de_fila(parts: list[str], equipo: str | None) -> ScheduleEntry | None:
+    """Build the entry of a table row, or None if it is not a controller row."""
+    # Identify role by finding the first occurrence of a known role
+    role_index = next(
+        (i for i, part in enumerate(parts) if part in PUESTOS_CARRERA),
+        None,
+    )
+    if role_index is None:
+        return None  # Skip rows without a valid role
+
+    name = " ".join(parts[:role_index])
+    role = parts[role_index]
+    shifts = parts[role_index + 1 :]
+
+    # Make sure at least one shift code is valid
+    if not any(is_valid_shift_code(shift) for shift in shifts):
+        return None
+
+    # Handle incomplete shift rows by padding with empty strings
+    if len(shifts) < MAX_DAYS_IN_MONTH:
+        shifts.extend([""] * (MAX_DAYS_IN_MONTH - len(shifts)))
+
+    return ScheduleEntry(
+        name=name.strip(),
+        role=role.strip(),
+        equipo=equipo.strip() if equipo else None,
+        shifts=shifts,
+    )
+
+
 def extract_schedule_data(page: Page) -> list[ScheduleEntry]:
     """Extract the schedule data from the page."""
     table = page.extract_table()
@@ -158,50 +274,193 @@ def extract_schedule_data(page: Page) -> list[ScheduleEntry]:
     data = []
     equipo: str | None = None
 
-    # Regular expression to find the equipo
-    equipo_pattern = re.compile(r"EQUIPO: (\w+)")
-
     for row in table:
         if row and any(row):
             parts = [cell.strip() if cell else "" for cell in row]
 
             if not equipo:
-                equipo_match = equipo_pattern.search(parts[0])
+                equipo_match = EQUIPO_PATTERN.search(parts[0])
                 equipo = equipo_match.group(1) if equipo_match else None
                 equipo = equipo if equipo != "NA" else None
 
-            # Identify role by finding the first occurrence of a known role
-            role_index = next(
-                (i for i, part in enumerate(parts) if part in PUESTOS_CARRERA),
-                None,
-            )
-            if role_index is None:
-                continue  # Skip rows without a valid role
-
-            name = " ".join(parts[:role_index])
-            role = parts[role_index]
-            shifts = parts[role_index + 1 :]
-
-            # Make sure at least one shift code is valid
-            if not any(is_valid_shift_code(shift) for shift in shifts):
-                continue
-
-            # Handle incomplete shift rows by padding with empty strings
-            if len(shifts) < MAX_DAYS_IN_MONTH:
-                shifts.extend([""] * (MAX_DAYS_IN_MONTH - len(shifts)))
-
-            data.append(
-                ScheduleEntry(
-                    name=name.strip(),
-                    role=role.strip(),
-                    equipo=equipo.strip() if equipo else None,
-                    shifts=shifts,
-                ),
-            )
+            entry = entrada_de_fila(parts, equipo)
+            if entry:
+                data.append(entry)
 
     return data
 
 
+TOLERANCIA = 3.0
+"""Distancia en puntos por debajo de la cual dos posiciones se consideran la misma."""
+
+
+@dataclass(frozen=True)
+class PlantillaTurnero:
+    """Geometría de la tabla de un turnero, aprendida de su primera página.
+
+    limites son las x de las separaciones entre columnas: el borde izquierdo
+    de la tabla, el de la categoría, el de cada día, el de las horas y el
+    borde derecho. La primera celda de cada fila agrupa todo lo que queda a
+    la izquierda de la categoría.
+    """
+
+    limites: tuple[float, ...]
+    alto_fila: float
+
+
+def _centro(char: dict[str, Any]) -> tuple[float, float]:
+    """Centro de un carácter, con el mismo criterio que pdfplumber."""
+    return (char["x0"] + char["x1"]) / 2, (char["top"] + char["bottom"]) / 2
+
+
+def _agrupa(posiciones: list[float]) -> list[float]:
+    """Agrupa las posiciones próximas y devuelve la media de cada grupo."""
+    grupos: list[list[float]] = []
+    for posicion in sorted(posiciones):
+        if grupos and posicion - grupos[-1][0] <= TOLERANCIA:
+            grupos[-1].append(posicion)
+        else:
+            grupos.append([posicion])
+    return [sum(grupo) / len(grupo) for grupo in grupos]
+
+
+def _lineas_de_categoria(
+    chars: list[dict[str, Any]],
+    limites: tuple[float, ...],
+) -> list[float]:
+    """Altura de cada línea de texto de la columna de categoría."""
+    return _agrupa(
+        [_centro(c)[1] for c in chars if limites[1] <= _centro(c)[0] < limites[2]],
+    )
+
+
+def aprende_plantilla(page: Page) -> PlantillaTurnero | None:
+    """Aprende la geometría de la tabla de la primera página de un turnero.
+
+    Las columnas se toman de las líneas verticales que cruzan la fila de
+    cabecera "Categ.", y el alto de fila de la separación entre las líneas
+    de texto de la columna de categoría. Devuelve None si la página no
+    tiene la disposición esperada.
+    """
+    categ = next((w for w in page.extract_words() if w["text"] == "Categ."), None)
+    if categ is None:
+        return None
+    x_categ, y_categ = _centro(categ)
+    limites = _agrupa(
+        [
+            edge["x0"]
+            for edge in page.edges
+            if edge["orientation"] == "v" and edge["top"] <= y_categ <= edge["bottom"]
+        ],
+    )
+    i_categ = bisect_right(limites, x_categ) - 1
+    if i_categ < 1 or i_categ + 1 >= len(limites):
+        return None
+
+    plantilla = PlantillaTurnero(
+        limites=(limites[0], *limites[i_categ:]),
+        alto_fila=0.0,
+    )
+    lineas = _lineas_de_categoria(page.chars, plantilla.limites)
+    if len(lineas) < 2:  # noqa: PLR2004
+        return None
+    alto_fila = statistics.median(b - a for a, b in pairwise(lineas))
+    return replace(plantilla, alto_fila=alto_fila)
+
+
+def extrae_por_posiciones(
+    page: Page,
+    plantilla: PlantillaTurnero,
+) -> list[ScheduleEntry]:
+    """Extract the schedule data from the page using a learned geometry.
+
+    Alternative to extract_schedule_data that skips pdfplumber's table
+    detection: each character is assigned to the column of the template that
+    contains it, and to the row of the nearest text line in the role column.
+    Each cell is then joined with the same text extraction as extract_table.
+    """
+    limites = plantilla.limites
+    chars = [c for c in page.chars if limites[0] <= _centro(c)[0] < limites[-1]]
+    lineas = _lineas_de_categoria(chars, limites)
+    if not lineas:
+        return []
+
+    n_columnas = len(limites) - 1
+    celdas: list[list[list[dict[str, Any]]]] = [
+        [[] for _ in range(n_columnas)] for _ in lineas
+    ]
+    cabecera = []
+    for char in chars:
+        x, y = _centro(char)
+        i = bisect_right(lineas, y)
+        i_linea = min(
+            (j for j in (i - 1, i) if 0 <= j < len(lineas)),
+            key=lambda j: abs(lineas[j] - y),
+        )
+        if abs(lineas[i_linea] - y) < plantilla.alto_fila / 2:
+            celdas[i_linea][bisect_right(limites, x) - 1].append(char)
+        elif y < lineas[0]:
+            cabecera.append(char)
+
+    data = []
+    equipo: str | None = None
+    for fila in [[cabecera], *celdas]:
+        parts = [extract_text(celda).strip() if celda else "" for celda in fila]
+        if not any(parts):
+            continue
+
+        if not equipo:
+            equipo_match = EQUIPO_PATTERN.search(parts[0])
+            equipo = equipo_match.group(1) if equipo_match else None
+            equipo = equipo if equipo != "NA" else None
+
+        entry = entrada_de_fila(parts, equipo)
+        if entry:
+            data.append(entry)
+    return data
+
+
+EXTRACTOR_TABLA = "tabla"
+"""Extrae cada página con la detección de tablas de pdfplumber."""
+EXTRACTOR_POSICIONES = "posiciones"
+"""Extrae cada página por la posición de los caracteres."""
+EXTRACTORES = (EXTRACTOR_TABLA, EXTRACTOR_POSICIONES)
+
+
+def plantilla_del_extractor(
+    primera_pagina: Page,
+    extractor: str = EXTRACTOR_TABLA,
+) -> PlantillaTurnero | None:
+    """Plantilla con la que extraer las páginas de un turnero.
+
+    Con EXTRACTOR_POSICIONES la plantilla se aprende de la primera página.
+    None indica que se use la detección de tablas, también cuando la
+    plantilla no se puede aprender.
+    """
+    if extractor not in EXTRACTORES:
+        msg = f"Extractor de turnero desconocido: {extractor}"
+        raise ValueError(msg)
+    if extractor == EXTRACTOR_TABLA:
+        return None
+    plantilla = aprende_plantilla(primera_pagina)
+    if plantilla is None:
+        logger.warning(
+            "No se reconoce la tabla del turnero. Se usa %s",
+            EXTRACTOR_TABLA,
+        )
+    return plantilla
+
+
+def extrae_pagina(
+    page: Page,
+    plantilla: PlantillaTurnero | None = None,
+) -> list[ScheduleEntry]:
+    """Extrae las entradas de una página con la plantilla, si la hay."""
+    if plantilla is None:
+        return extract_schedule_data(page)
+    return extrae_por_posiciones(page, plantilla)
+
+
 def is_valid_user_entry(entry: ScheduleEntry) -> bool:
     """Check if the user entry is valid."""
     days_of_week = {"S", "D", "L", "M", "X", "J", "V"}
@@ -238,170 +497,975 @@ def extraer_datos_turnero_de_primera_pagina(page: Page) -> DatosTurnero:
     return DatosTurnero(mes=mes, año=año, dependencia=dependencia)
 
 
-def insert_shift_data(
+MESES = {
+    "ENERO": 1,
+    "FEBRERO": 2,
+    "MARZO": 3,
+    "ABRIL": 4,
+    "MAYO": 5,
+    "JUNIO": 6,
+    "JULIO": 7,
+    "AGOSTO": 8,
+    "SEPTIEMBRE": 9,
+    "SETIEMBRE": 9,
+    "OCTUBRE": 10,
+    "NOVIEMBRE": 11,
+    "DICIEMBRE": 12,
+}
+"""Meses en castellano, para no depender del locale del proceso."""
+
+
+def resuelve_mes(mes: str, año: str) -> tuple[int, int]:
+    """Convierte el mes y año del turnero ("Julio", "2024") en (2024, 7)."""
+    try:
+        return int(año), MESES[mes.strip().upper()]
+    except (KeyError, ValueError):
+        _msg = f"Mes o año no válido en el turnero: {mes} {año}"
+        raise ValueError(_msg) from None
+
+
+def fechas_de_turnos(
     shifts: list[str],
-    month: str,
-    year: str,
-    user: ATC,
-    db_session: scoped_session,
-    tz: pytz.BaseTzInfo,
+    year: int,
+    month: int,
+) -> list[tuple[date, str]]:
+    """Asocia cada código de turno no vacío con su fecha.
+
+    Los días que no existen en el mes (p.ej. 31 de junio) se descartan.
+    """
+    n_dias = monthrange(year, month)[1]
+    return [
+        (date(year, month, day), shift_code)
+        for day, shift_code in enumerate(shifts[:n_dias], start=1)
+        if shift_code  # Skip empty shift codes
+    ]
+
+
+def carga_turnos_existentes(
+    ids_atc: set[int],
+    desde: date,
+    hasta: date,
+    db_session: Session | scoped_session,
+) -> dict[ClaveTurno, str]:
+    """Carga en una sola consulta los turnos guardados de un conjunto de ATCs.
+
+    Devuelve el código de turno indexado por (id_atc, fecha). Se leen solo
+    las columnas, sin crear objetos del ORM.
+    """
+    filas = db_session.execute(
+        select(Turno.id_atc, Turno.fecha, Turno.turno).where(
+            Turno.id_atc.in_(ids_atc),
+            Turno.fecha.between(desde, hasta),
+        ),
+    )
+    return {(id_atc, fecha): turno for id_atc, fecha, turno in filas}
+
+
+def pendientes_de_turnos(
+    turnos_por_atc: list[tuple[ATC, list[str]]],
+    year: int,
+    month: int,
+) -> dict[ClaveTurno, str]:
+    """Código de turno de cada (id_atc, fecha) del mes de un turnero."""
+    pendientes: dict[ClaveTurno, str] = {}
+    for user, shifts in turnos_por_atc:
+        for shift_date, shift_code in fechas_de_turnos(shifts, year, month):
+            pendientes[(user.id, shift_date)] = shift_code
+    return pendientes
+
+
+def escribe_turnos(
+    pendientes: dict[ClaveTurno, str],
+    db_session: Session | scoped_session,
 ) -> ResultadoProcesadoTurnos:
-    """Insert shift data into the database.
+    """Escribe los turnos nuevos o modificados con upserts en bloque.
 
-    The shifts list contains the shift codes for each day of the month.
-    Returns the number of shifts inserted.
+    Existing shifts are preloaded with a single query, and the created,
+    updated and unchanged shifts are computed in memory.
     """
-    logger.info("Inserting shifts for %s %s", user.nombre, user.apellidos)
     res = ResultadoProcesadoTurnos()
-    for day, shift_code in enumerate(shifts, start=1):
-        if shift_code:  # Skip empty shift codes
-            date_str = f"{day:02d} {month} {year}"
-            try:
-                shift_date = (
-                    datetime.strptime(date_str, "%d %B %Y").astimezone(tz).date()
-                )
-            except ValueError:
-                continue
-
-            # Check if shift already exists for the user on this date
-            servicio = (
-                db_session.query(Turno)
-                .filter_by(id_atc=user.id, fecha=shift_date)
-                .first()
-            )
-            if servicio:
-                if servicio.turno == shift_code:
-                    res.existing_shifts.add(servicio)
-                else:
-                    servicio.turno = shift_code
-                    res.updated_shifts.add(servicio)
-                continue
-
-            new_shift = Turno(
-                fecha=shift_date,
-                turno=shift_code,
-                id_atc=user.id,
-            )
-            db_session.add(new_shift)
-            res.created_shifts.add(new_shift)
+    if not pendientes:
+        return res
+
+    fechas = [fecha for _, fecha in pendientes]
+    existentes = carga_turnos_existentes(
+        {id_atc for id_atc, _ in pendientes},
+        min(fechas),
+        max(fechas),
+        db_session,
+    )
+
+    filas = []
+    for clave, shift_code in pendientes.items():
+        anterior = existentes.get(clave)
+        if anterior is None:
+            res.created_shifts.add(clave)
+        elif anterior == shift_code:
+            res.existing_shifts.add(clave)
+            continue
+        else:
+            res.updated_shifts.add(clave)
+        id_atc, fecha = clave
+        filas.append({"id_atc": id_atc, "fecha": fecha, "turno": shift_code})
 
+    logger.info(
+        "Escribiendo %d turnos nuevos o modificados de %d ATCs",
+        len(filas),
+        len({id_atc for id_atc, _ in pendientes}),
+    )
+    bulk_upsert(
+        db_session,
+        Turno.__table__,  # type: ignore[arg-type]
+        filas,
+        index_elements=("fecha", "id_atc"),
+        update_columns=("turno",),
+    )
+    # Los calendarios y cuadrantes guardados en memoria dejan de valer
+    cambia_versiones(
+        db_session,
+        claves_de_turnos_modificados(res.created_shifts | res.updated_shifts),
+    )
     return res
 
 
+def insert_shift_data(
+    turnos_por_atc: list[tuple[ATC, list[str]]],
+    year: int,
+    month: int,
+    db_session: Session | scoped_session,
+) -> ResultadoProcesadoTurnos:
+    """Insert shift data into the database.
+
+    Each element of turnos_por_atc holds a user and the shift codes for each day
+    of the month given by year and month (see resuelve_mes). The changes are
+    written with escribe_turnos.
+    """
+    return escribe_turnos(
+        pendientes_de_turnos(turnos_por_atc, year, month),
+        db_session,
+    )
+
+
+def resuelve_usuario(
+    atc_texto: AtcTexto,
+    db_session: Session | scoped_session,
+    indice: AtcIndex,
+    res: ResultadoProcesadoTurnero,
+) -> ATC:
+    """Find and update the user, or create it if it is not in the index.
+
+    Existing users are classified in res as existing or updated. Created
+    users have no id until the session is flushed; resuelve_usuarios_creados
+    records them in res afterwards.
+    """
+    user = indice.busca(atc_texto.apellidos_nombre)
+    if not user:
+        return create_user(atc_texto, db_session, indice)
+    if user.id is None:
+        return user  # Creado por una entrada anterior del mismo turnero
+
+    update_res = update_user(user, atc_texto.categoria, atc_texto.equipo)
+    if update_res == UpdateResult.UPDATED:
+        res.updated_users.add(user.id)
+    else:
+        res.existing_users.add(user.id)
+    return user
+
+
+def registra_usuarios_creados(
+    usuarios: list[ATC],
+    db_session: Session | scoped_session,
+    res: ResultadoProcesadoTurnero,
+) -> None:
+    """Flush the new users in a single batch and record their ids in res.
+
+    Se cambia la versión de clave_atcs de las dependencias de los usuarios
+    creados o modificados, de la que dependen sus calendarios, cuadrantes
+    de equipo y estadillos.
+    """
+    nuevos = [user for user in usuarios if user.id is None]
+    db_session.flush()
+    res.created_users.update(user.id for user in nuevos)
+    modificados = res.created_users | res.updated_users
+    dependencias = {user.dependencia for user in usuarios if user.id in modificados}
+    if dependencias:
+        cambia_versiones(db_session, [clave_atcs(dep) for dep in dependencias])
+
+
+def resuelve_usuarios(
+    all_data: list[ScheduleEntry],
+    datos_turnero: DatosTurnero,
+    db_session: Session | scoped_session,
+    indice: AtcIndex,
+    res: ResultadoProcesadoTurnero,
+) -> list[tuple[ATC, list[str]]]:
+    """Find, update or create the user of each valid entry.
+
+    The users are classified in res. Returns each user with its shift codes.
+    Newly created users are flushed in a single batch at the end.
+    """
+    turnos_por_atc: list[tuple[ATC, list[str]]] = []
+    for entry in all_data:
+        if not is_valid_user_entry(entry):
+            continue
+
+        atc_texto = AtcTexto(
+            apellidos_nombre=entry.name,
+            dependencia=datos_turnero.dependencia,
+            categoria=entry.role,
+            equipo=entry.equipo,
+        )
+        user = resuelve_usuario(atc_texto, db_session, indice, res)
+        turnos_por_atc.append((user, entry.shifts))
+    registra_usuarios_creados([u for u, _ in turnos_por_atc], db_session, res)
+    return turnos_por_atc
+
+
 def parse_and_insert_data(
     all_data: list[ScheduleEntry],
     datos_turnero: DatosTurnero,
-    db_session: scoped_session,
-    tz: pytz.BaseTzInfo,
+    db_session: Session | scoped_session,
+    indice: AtcIndex | None = None,
+    *,
+    metricas: MetricasCarga | None = None,
 ) -> ResultadoProcesadoTurnero:
     """Parse extracted data and insert it into the database.
 
     The data is a list of ScheduleEntry instances, each containing the name, role,
     equipo, and shifts for a user. The function parses the data, finds or creates the
-    user in the database, and inserts the shift data for each user.
+    user in the database, and then inserts the shift data for all users at once.
+    Users are resolved with an AtcIndex, loaded with a single query if not given.
+    If metricas is given, the usuarios and escritura stages and the queries
+    issued are recorded in it.
 
     Returns the number of identified users and shifts inserted, along with sets of
     identified users, updated users, created users, identified shifts,
     and created shifts.
     """
     res = ResultadoProcesadoTurnero()
+    year, month = resuelve_mes(datos_turnero.mes, datos_turnero.año)
+    metricas = metricas or MetricasCarga(tipo=TIPO_TURNERO)
 
     try:
-        for entry in all_data:
-            if not is_valid_user_entry(entry):
-                continue
+        with metricas.cuenta_consultas(db_session):
+            with metricas.etapa("usuarios"):
+                if indice is None:
+                    indice = AtcIndex.carga(db_session)
+                turnos_por_atc = resuelve_usuarios(
+                    all_data,
+                    datos_turnero,
+                    db_session,
+                    indice,
+                    res,
+                )
+            with metricas.etapa("escritura"):
+                res_turnos = insert_shift_data(turnos_por_atc, year, month, db_session)
+                res.created_shifts.update(res_turnos.created_shifts)
+                res.updated_shifts.update(res_turnos.updated_shifts)
+                res.existing_shifts.update(res_turnos.existing_shifts)
+                db_session.commit()
+    except Exception:
+        logger.exception("Error processing schedule data")
+        db_session.rollback()
+        raise
 
-            user = find_user(
-                entry.name,
-                db_session,
-            )
+    logger.info(
+        "Inserted %d users and %d shifts",
+        len(res.created_users),
+        len(res.created_shifts),
+    )
+    return res
 
-            if user:
-                update_res = update_user(user, entry.role, entry.equipo)
-                if update_res == UpdateResult.UPDATED:
-                    res.updated_users.add(user)
-                else:
-                    res.existing_users.add(user)
-            else:
-                atc_texto = AtcTexto(
-                    apellidos_nombre=entry.name,
-                    dependencia=datos_turnero.dependencia,
-                    categoria=entry.role,
-                    equipo=entry.equipo,
+
+@dataclass
+class CambiosControlador:
+    """Cambios en los turnos de un controlador al cargar un turnero."""
+
+    nombre: str
+    categoria: str
+    equipo: str | None = None
+    id_atc: int | None = None
+    """None si el controlador no existe todavía y se creará al aplicar."""
+    creados: dict[date, str] = field(default_factory=dict)
+    modificados: dict[date, tuple[str, str]] = field(default_factory=dict)
+    """Código anterior y nuevo de cada turno modificado."""
+    sin_cambios: list[date] = field(default_factory=list)
+    """Días con un turno guardado igual al del turnero."""
+
+    @property
+    def hay_cambios(self) -> bool:
+        """Indica si algún turno cambia."""
+        return bool(self.creados or self.modificados)
+
+
+@dataclass
+class CambiosTurnero:
+    """Cambios que produciría la carga de un turnero, sin aplicar."""
+
+    datos_turnero: DatosTurnero
+    controladores: list[CambiosControlador] = field(default_factory=list)
+    version_turnos: int = 0
+    """Versión de los turnos del mes con la que se calcularon los cambios."""
+
+    @property
+    def n_sin_cambios(self) -> int:
+        """Number of shifts that stay the same."""
+        return sum(len(c.sin_cambios) for c in self.controladores)
+
+    @property
+    def n_creados(self) -> int:
+        """Number of shifts to create."""
+        return sum(len(c.creados) for c in self.controladores)
+
+    @property
+    def n_modificados(self) -> int:
+        """Number of shifts to update."""
+        return sum(len(c.modificados) for c in self.controladores)
+
+    @property
+    def n_usuarios_nuevos(self) -> int:
+        """Number of users to create."""
+        return sum(1 for c in self.controladores if c.id_atc is None)
+
+    def a_json(self) -> str:
+        """Serializa los cambios para guardarlos hasta la confirmación."""
+        return json.dumps(
+            {
+                "datos_turnero": asdict(self.datos_turnero),
+                "version_turnos": self.version_turnos,
+                "controladores": [
+                    {
+                        "nombre": c.nombre,
+                        "categoria": c.categoria,
+                        "equipo": c.equipo,
+                        "id_atc": c.id_atc,
+                        "creados": {f.isoformat(): t for f, t in c.creados.items()},
+                        "modificados": {
+                            f.isoformat(): t for f, t in c.modificados.items()
+                        },
+                        "sin_cambios": [f.isoformat() for f in c.sin_cambios],
+                    }
+                    for c in self.controladores
+                ],
+            },
+        )
+
+    @classmethod
+    def de_json(cls, texto: str) -> CambiosTurnero:
+        """Reconstruye los cambios guardados con a_json."""
+        datos = json.loads(texto)
+        return cls(
+            datos_turnero=DatosTurnero(**datos["datos_turnero"]),
+            version_turnos=datos["version_turnos"],
+            controladores=[
+                CambiosControlador(
+                    nombre=c["nombre"],
+                    categoria=c["categoria"],
+                    equipo=c["equipo"],
+                    id_atc=c["id_atc"],
+                    creados={date.fromisoformat(f): t for f, t in c["creados"].items()},
+                    modificados={
+                        date.fromisoformat(f): (anterior, nuevo)
+                        for f, (anterior, nuevo) in c["modificados"].items()
+                    },
+                    sin_cambios=[date.fromisoformat(f) for f in c["sin_cambios"]],
                 )
-                user = create_user(atc_texto, db_session)
-                db_session.flush()
-                res.created_users.add(user)
-
-            res_turnos = insert_shift_data(
-                entry.shifts,
-                datos_turnero.mes,
-                datos_turnero.año,
-                user,
+                for c in datos["controladores"]
+            ],
+        )
+
+
+def _compara_turnos(
+    controlador: CambiosControlador,
+    nuevos: dict[date, str],
+    anteriores: dict[date, str],
+) -> None:
+    """Clasifica en controlador los turnos nuevos, modificados y sin cambios.
+
+    Como escribe_turnos, los turnos guardados en días que el turnero deja
+    libres no se tocan.
+    """
+    for fecha, codigo in nuevos.items():
+        anterior = anteriores.get(fecha)
+        if anterior is None:
+            controlador.creados[fecha] = codigo
+        elif anterior != codigo:
+            controlador.modificados[fecha] = (anterior, codigo)
+        else:
+            controlador.sin_cambios.append(fecha)
+
+
+def calcula_cambios_turnero(
+    all_data: list[ScheduleEntry],
+    datos_turnero: DatosTurnero,
+    db_session: Session | scoped_session,
+) -> CambiosTurnero:
+    """Calcula los cambios que produciría la carga, sin escribir nada.
+
+    Los usuarios se buscan en un AtcIndex y los turnos guardados del mes se
+    leen con una única consulta. Los cambios son los mismos que haría
+    procesa_turnero: solo se crean o modifican turnos, nunca se borran.
+    Se anota la versión de los turnos del mes, leída antes que los turnos,
+    para rechazar la confirmación si cambian entretanto.
+    """
+    year, month = resuelve_mes(datos_turnero.mes, datos_turnero.año)
+    indice = AtcIndex.carga(db_session)
+    cambios = CambiosTurnero(
+        datos_turnero=datos_turnero,
+        version_turnos=lee_version(db_session, clave_turnos_del_mes(year, month)),
+    )
+
+    nuevos_por_controlador: list[dict[date, str]] = []
+    for entry in all_data:
+        if not is_valid_user_entry(entry):
+            continue
+        user = indice.busca(entry.name)
+        cambios.controladores.append(
+            CambiosControlador(
+                nombre=entry.name,
+                categoria=entry.role,
+                equipo=entry.equipo,
+                id_atc=user.id if user else None,
+            ),
+        )
+        nuevos_por_controlador.append(
+            dict(fechas_de_turnos(entry.shifts, year, month)),
+        )
+
+    ids_atc = {c.id_atc for c in cambios.controladores if c.id_atc is not None}
+    guardados: dict[int, dict[date, str]] = {}
+    if ids_atc:
+        existentes = carga_turnos_existentes(
+            ids_atc,
+            date(year, month, 1),
+            date(year, month, monthrange(year, month)[1]),
+            db_session,
+        )
+        for (id_atc, fecha), turno in existentes.items():
+            guardados.setdefault(id_atc, {})[fecha] = turno
+
+    for controlador, nuevos in zip(
+        cambios.controladores,
+        nuevos_por_controlador,
+        strict=True,
+    ):
+        anteriores = guardados.get(controlador.id_atc, {})  # type: ignore[arg-type]
+        _compara_turnos(controlador, nuevos, anteriores)
+
+    return cambios
+
+
+def cambios_vigentes(
+    cambios: CambiosTurnero,
+    db_session: Session | scoped_session,
+) -> bool:
+    """Indica si los turnos del mes no han cambiado desde la previsualización."""
+    year, month = resuelve_mes(cambios.datos_turnero.mes, cambios.datos_turnero.año)
+    version = lee_version(db_session, clave_turnos_del_mes(year, month))
+    return version == cambios.version_turnos
+
+
+def aplica_cambios_turnero(
+    cambios: CambiosTurnero,
+    db_session: Session | scoped_session,
+) -> ResultadoProcesadoTurnero:
+    """Aplica en una transacción los cambios calculados en la previsualización.
+
+    Los usuarios se resuelven igual que en parse_and_insert_data y los
+    turnos creados y modificados se escriben con upserts en bloque. El
+    resultado es el mismo que el de procesa_turnero con el mismo archivo,
+    siempre que los cambios sigan vigentes (ver cambios_vigentes).
+    """
+    res = ResultadoProcesadoTurnero()
+    try:
+        indice = AtcIndex.carga(db_session)
+        usuarios = [
+            resuelve_usuario(
+                AtcTexto(
+                    apellidos_nombre=controlador.nombre,
+                    dependencia=cambios.datos_turnero.dependencia,
+                    categoria=controlador.categoria,
+                    equipo=controlador.equipo,
+                ),
                 db_session,
-                tz,
+                indice,
+                res,
+            )
+            for controlador in cambios.controladores
+        ]
+        registra_usuarios_creados(usuarios, db_session, res)
+
+        filas = []
+        for user, controlador in zip(usuarios, cambios.controladores, strict=True):
+            for fecha, codigo in controlador.creados.items():
+                res.created_shifts.add((user.id, fecha))
+                filas.append({"id_atc": user.id, "fecha": fecha, "turno": codigo})
+            for fecha, (_, codigo) in controlador.modificados.items():
+                res.updated_shifts.add((user.id, fecha))
+                filas.append({"id_atc": user.id, "fecha": fecha, "turno": codigo})
+            res.existing_shifts.update(
+                (user.id, fecha) for fecha in controlador.sin_cambios
             )
-            res.created_shifts.update(res_turnos.created_shifts)
-            res.existing_shifts.update(res_turnos.existing_shifts)
-
-            db_session.flush()
 
+        bulk_upsert(
+            db_session,
+            Turno.__table__,  # type: ignore[arg-type]
+            filas,
+            index_elements=("fecha", "id_atc"),
+            update_columns=("turno",),
+        )
+        cambia_versiones(
+            db_session,
+            claves_de_turnos_modificados(res.created_shifts | res.updated_shifts),
+        )
         db_session.commit()
     except Exception:
-        logger.exception("Error processing schedule data")
+        logger.exception("Error applying schedule changes")
         db_session.rollback()
         raise
 
     logger.info(
-        "Inserted %d users and %d shifts",
-        len(res.created_users),
-        len(res.created_shifts),
+        "Applied schedule changes: %d created, %d updated shifts",
+        cambios.n_creados,
+        cambios.n_modificados,
     )
     return res
 
 
-def procesa_turnero(
-    file: FileStorage | BufferedReader,
-    db_session: scoped_session,
+def _extrae_paginas(
+    pdf_bytes: bytes,
+    paginas: list[int],
+    plantilla: PlantillaTurnero | None = None,
+) -> list[ScheduleEntry]:
+    """Extrae las entradas de un tramo de páginas de un pdf en memoria.
+
+    Se ejecuta en los procesos del pool, por lo que cada llamada abre
+    su propia copia del pdf.
+    """
+    data = []
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        for i in paginas:
+            data.extend(extrae_pagina(pdf.pages[i], plantilla))
+    return data
+
+
+def reparte_paginas(n_paginas: int, workers: int) -> list[list[int]]:
+    """Reparte las páginas en tramos consecutivos, uno por proceso."""
+    n_tramos = max(1, min(workers, n_paginas))
+    tamaño, resto = divmod(n_paginas, n_tramos)
+    tramos = []
+    inicio = 0
+    for i in range(n_tramos):
+        fin = inicio + tamaño + (1 if i < resto else 0)
+        tramos.append(list(range(inicio, fin)))
+        inicio = fin
+    return tramos
+
+
+def extraer_en_paralelo(
+    pdf_bytes: bytes,
+    n_paginas: int,
+    workers: int,
+    progreso: Callable[[int, int], None] | None = None,
+    plantilla: PlantillaTurnero | None = None,
+) -> list[ScheduleEntry]:
+    """Extrae las entradas del turnero repartiendo las páginas entre procesos.
+
+    Las entradas se devuelven en el orden de las páginas, igual que
+    en la extracción secuencial. progreso se llama con (páginas extraídas,
+    total de páginas) cada vez que termina un tramo. La plantilla, si se
+    indica, se aprende una sola vez y se envía a todos los procesos.
+    """
+    tramos = reparte_paginas(n_paginas, workers)
+    data: list[ScheduleEntry] = []
+    n_extraidas = 0
+    # spawn evita heredar conexiones e hilos del proceso del servidor
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(tramos), mp_context=contexto) as pool:
+        resultados = pool.map(
+            _extrae_paginas,
+            repeat(pdf_bytes),
+            tramos,
+            repeat(plantilla),
+        )
+        for tramo, entradas in zip(tramos, resultados, strict=True):
+            data.extend(entradas)
+            n_extraidas += len(tramo)
+            if progreso:
+                progreso(n_extraidas, n_paginas)
+    return data
+
+
+def _extrae_turnero_del_pdf(
+    pdf_bytes: bytes,
+    workers: int,
+    progreso: Callable[[int, int], None] | None,
+    metricas: MetricasCarga,
+    extractor: str,
+) -> tuple[DatosTurnero, list[ScheduleEntry]]:
+    """Extrae el turnero abriendo el pdf con pdfplumber.
+
+    La etapa de extracción la mide extrae_turnero, que es quien la llama.
+    """
+    try:
+        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+            datos_turnero = extraer_datos_turnero_de_primera_pagina(pdf.pages[0])
+            n_paginas = len(pdf.pages)
+            plantilla = plantilla_del_extractor(pdf.pages[0], extractor)
+
+            if workers > 1 and n_paginas > 1:
+                all_data = extraer_en_paralelo(
+                    pdf_bytes,
+                    n_paginas,
+                    workers,
+                    progreso,
+                    plantilla,
+                )
+            else:
+                all_data = []
+                for i, page in enumerate(pdf.pages, start=1):
+                    page_data = extrae_pagina(page, plantilla)
+                    all_data.extend(page_data)
+                    if progreso:
+                        progreso(i, n_paginas)
+    except PDFSyntaxError as e:
+        logger.exception("Error parsing PDF file")
+        _msg = "Error parsing PDF file"
+        raise ValueError(_msg) from e
+
+    # Cada página tiene una única tabla
+    metricas.paginas += n_paginas
+    metricas.tablas += n_paginas
+    metricas.filas += len(all_data)
+    logger.info("Processed %d pages", n_paginas)
+    return datos_turnero, all_data
+
+
+def extrae_turnero(  # noqa: PLR0913
+    pdf_bytes: bytes,
+    workers: int = 1,
+    progreso: Callable[[int, int], None] | None = None,
+    *,
+    metricas: MetricasCarga | None = None,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
+) -> tuple[DatosTurnero, list[ScheduleEntry]]:
+    """Extrae los datos generales y las entradas de todas las páginas.
+
+    Con workers > 1 las páginas se extraen en paralelo en un pool de procesos.
+    Si se indica, progreso se llama con (páginas extraídas, total de páginas).
+    Si se indica, en metricas se anotan la etapa de extracción y las páginas,
+    tablas y filas extraídas. extractor es EXTRACTOR_TABLA o
+    EXTRACTOR_POSICIONES. Un pdf no válido lanza ValueError.
+
+    Con cache, los datos de un pdf ya extraído se leen de la caché sin
+    abrir el pdf, y los de uno nuevo se guardan en ella.
+    """
+    metricas = metricas or MetricasCarga(tipo=TIPO_TURNERO)
+    sha256 = hash_contenido(pdf_bytes) if cache is not None else ""
+    with metricas.etapa("extraccion"):
+        guardados = None
+        if cache is not None:
+            guardados = cache.lee(TIPO_TURNERO, VERSION_EXTRACCION, sha256)
+        extraidos = turnero_de_cache(guardados) if guardados is not None else None
+        if extraidos is None:
+            datos_turnero, all_data = _extrae_turnero_del_pdf(
+                pdf_bytes,
+                workers,
+                progreso,
+                metricas,
+                extractor,
+            )
+    if extraidos is not None:
+        metricas.filas += len(extraidos[1])
+        logger.info("Datos del turnero leídos de la caché")
+        return extraidos
+
+    if cache is None:
+        return datos_turnero, all_data
+    cache.guarda(
+        TIPO_TURNERO,
+        VERSION_EXTRACCION,
+        sha256,
+        turnero_a_cache(datos_turnero, all_data),
+    )
+    return datos_turnero, all_data
+
+
+def procesa_turnero(  # noqa: PLR0913
+    file: FileStorage | BufferedReader | BytesIO,
+    db_session: Session | scoped_session,
+    workers: int = 1,
+    progreso: Callable[[int, int], None] | None = None,
+    *,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
 ) -> ResultadoProcesadoTurnero:
     """Process the uploaded file and insert data into the database.
 
     The function extracts the schedule data from the uploaded file, parses the data,
     and inserts it into the database.
     Usuarios desconocidos se añaden a la base de datos.
-    The app_logger parameter can be used to
-    pass a logger instance to the function.
+    Con workers > 1 las páginas se extraen en paralelo en un pool de procesos.
+    Si se indica, progreso se llama con (páginas extraídas, total de páginas).
+    extractor selecciona cómo se extraen las tablas, y cache la caché de
+    análisis que se usa, ver extrae_turnero.
 
     Returns the number of users and shifts inserted, along with sets of
     identified users, updated users, created users, identified shifts,
-    and created shifts.
+    and created shifts. The timings and counters of each stage are in
+    res.metricas, and are also published with metricas.publica.
     """
-    try:
-        with pdfplumber.open(BytesIO(file.read())) as pdf:
-            all_data = []
-            datos_turnero = extraer_datos_turnero_de_primera_pagina(pdf.pages[0])
+    metricas = MetricasCarga(tipo=TIPO_TURNERO)
+    with metricas.etapa("lectura"):
+        contenido = file.read()
+    metricas.bytes_leidos = len(contenido)
+    datos_turnero, all_data = extrae_turnero(
+        contenido,
+        workers,
+        progreso,
+        metricas=metricas,
+        extractor=extractor,
+        cache=cache,
+    )
+    res = parse_and_insert_data(all_data, datos_turnero, db_session, metricas=metricas)
+    res.metricas = metricas
+
+    logger.info(
+        "Inserted %d users and %d shifts",
+        len(res.created_users),
+        len(res.created_shifts),
+    )
+    publica(metricas)
 
-            for page in pdf.pages:
-                page_data = extract_schedule_data(page)
-                all_data.extend(page_data)
+    return res
 
-            res = parse_and_insert_data(
-                all_data,
-                datos_turnero,
-                db_session,
-                get_timezone(datos_turnero.dependencia),
+
+def previsualiza_turnero(
+    file: FileStorage | BufferedReader | BytesIO,
+    db_session: Session | scoped_session,
+    workers: int = 1,
+    *,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
+) -> CambiosTurnero:
+    """Modo de previsualización de procesa_turnero.
+
+    Extrae el turnero igual que procesa_turnero pero no escribe nada:
+    devuelve los cambios que produciría su carga, para aplicarlos después
+    con aplica_cambios_turnero.
+    """
+    datos_turnero, all_data = extrae_turnero(
+        file.read(),
+        workers,
+        extractor=extractor,
+        cache=cache,
+    )
+    return calcula_cambios_turnero(all_data, datos_turnero, db_session)
+
+
+@dataclass
+class ArchivoTurnero:
+    """Un archivo de una carga de varios turneros."""
+
+    nombre: str
+    contenido: bytes = field(repr=False)
+    sha256: str = ""
+    """SHA-256 del contenido. Se calcula si no se indica."""
+    datos_turnero: DatosTurnero | None = None
+    entradas: list[ScheduleEntry] = field(default_factory=list, repr=False)
+    metricas: MetricasCarga | None = None
+    """Tiempos y contadores de la extracción del archivo."""
+    error: str = ""
+    """Motivo por el que no se pudo extraer el archivo."""
+    resultado: ResultadoProcesadoTurnero | None = None
+    """Usuarios y turnos del archivo, una vez escrito."""
+
+    def __post_init__(self) -> None:
+        """Calcula el hash del contenido si no se ha indicado."""
+        if not self.sha256:
+            self.sha256 = hash_contenido(self.contenido)
+
+    @property
+    def segundos_extraccion(self) -> float:
+        """Duración de la extracción del archivo."""
+        return self.metricas.segundos_total if self.metricas else 0.0
+
+
+def _extrae_archivo(
+    contenido: bytes,
+    workers: int,
+    extractor: str,
+    cache: CacheAnalisis | None,
+) -> tuple[DatosTurnero | None, list[ScheduleEntry], MetricasCarga, str]:
+    """Extrae un turnero de una carga múltiple.
+
+    Se ejecuta en los procesos del pool. Los errores se devuelven en lugar
+    de propagarse, para informar de todos los archivos que fallan.
+    """
+    metricas = MetricasCarga(tipo=TIPO_TURNERO, bytes_leidos=len(contenido))
+    try:
+        datos_turnero, entradas = extrae_turnero(
+            contenido,
+            workers,
+            metricas=metricas,
+            extractor=extractor,
+            cache=cache,
+        )
+        # Un mes que no se reconoce fallaría después, al escribir
+        resuelve_mes(datos_turnero.mes, datos_turnero.año)
+    except Exception as e:  # noqa: BLE001
+        return None, [], metricas, f"{type(e).__name__}: {e}"
+    return datos_turnero, entradas, metricas, ""
+
+
+def extrae_turneros(
+    archivos: list[ArchivoTurnero],
+    workers: int = 1,
+    *,
+    procesos_archivos: int = 0,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
+) -> None:
+    """Extrae los turneros en paralelo, un archivo por proceso.
+
+    Los datos, las métricas y el error de cada archivo se anotan en el
+    propio archivo. Con procesos_archivos = 0 se usa un proceso por archivo,
+    hasta el número de CPUs. Con un solo archivo, o procesos_archivos = 1,
+    los archivos se extraen en este proceso y sus páginas se reparten entre
+    los workers.
+    """
+    procesos = procesos_archivos or min(len(archivos), os.cpu_count() or 1)
+    if procesos > 1 and len(archivos) > 1:
+        # spawn evita heredar conexiones e hilos del proceso del servidor
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=min(procesos, len(archivos)),
+            mp_context=contexto,
+        ) as pool:
+            resultados = list(
+                pool.map(
+                    _extrae_archivo,
+                    [archivo.contenido for archivo in archivos],
+                    repeat(1),
+                    repeat(extractor),
+                    repeat(cache),
+                ),
             )
+    else:
+        resultados = [
+            _extrae_archivo(archivo.contenido, workers, extractor, cache)
+            for archivo in archivos
+        ]
+    for archivo, resultado in zip(archivos, resultados, strict=True):
+        archivo.datos_turnero, archivo.entradas, archivo.metricas, archivo.error = (
+            resultado
+        )
 
-    except PDFSyntaxError as e:
-        logger.exception("Error parsing PDF file")
-        _msg = "Error parsing PDF file"
-        raise ValueError(_msg) from e
 
-    logger.info("Processed %d pages", len(pdf.pages))
+def escribe_turneros(
+    archivos: list[ArchivoTurnero],
+    db_session: Session | scoped_session,
+    metricas: MetricasCarga,
+) -> ResultadoProcesadoTurnero:
+    """Escribe varios turneros extraídos con una sola escritura y un commit.
+
+    Los turnos de todos los archivos se juntan y se escriben en un único
+    upsert en bloque; si dos archivos tienen el mismo turno prevalece el
+    último. Cada archivo se registra en el registro de cargas con su propio
+    resumen, dentro de la misma transacción. Si algo falla no se escribe
+    ningún archivo.
+    """
+    total = ResultadoProcesadoTurnero()
+    try:
+        with metricas.cuenta_consultas(db_session):
+            with metricas.etapa("usuarios"):
+                indice = AtcIndex.carga(db_session)
+                pendientes: dict[ClaveTurno, str] = {}
+                claves_por_archivo: list[set[ClaveTurno]] = []
+                for archivo in archivos:
+                    datos_turnero: DatosTurnero = archivo.datos_turnero  # type: ignore[assignment]
+                    archivo.resultado = ResultadoProcesadoTurnero()
+                    turnos_por_atc = resuelve_usuarios(
+                        archivo.entradas,
+                        datos_turnero,
+                        db_session,
+                        indice,
+                        archivo.resultado,
+                    )
+                    year, month = resuelve_mes(datos_turnero.mes, datos_turnero.año)
+                    turnos = pendientes_de_turnos(turnos_por_atc, year, month)
+                    claves_por_archivo.append(set(turnos))
+                    pendientes.update(turnos)
+                # Cada turno se cuenta solo en el último archivo que lo trae,
+                # que es el que prevalece al escribir
+                vistas: set[ClaveTurno] = set()
+                for claves in reversed(claves_por_archivo):
+                    claves.difference_update(vistas)
+                    vistas.update(claves)
+            with metricas.etapa("escritura"):
+                res_turnos = escribe_turnos(pendientes, db_session)
+                for archivo, claves in zip(archivos, claves_por_archivo, strict=True):
+                    res: ResultadoProcesadoTurnero = archivo.resultado  # type: ignore[assignment]
+                    res.created_shifts = claves & res_turnos.created_shifts
+                    res.updated_shifts = claves & res_turnos.updated_shifts
+                    res.existing_shifts = claves & res_turnos.existing_shifts
+                    registra_carga(
+                        archivo.sha256,
+                        TIPO_TURNERO,
+                        archivo.nombre,
+                        res.resumen(),
+                        db_session,
+                        commit=False,
+                    )
+                    total.incluye(res)
+                db_session.commit()
+    except Exception:
+        logger.exception("Error writing the schedules")
+        db_session.rollback()
+        raise
+    return total
+
+
+def procesa_turneros(  # noqa: PLR0913
+    archivos: list[ArchivoTurnero],
+    db_session: Session | scoped_session,
+    workers: int = 1,
+    *,
+    procesos_archivos: int = 0,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
+) -> ResultadoProcesadoTurnero:
+    """Carga varios turneros de una vez, todos o ninguno.
+
+    Los archivos se extraen en paralelo con extrae_turneros. Si alguno no
+    se puede extraer no se escribe nada: el error queda anotado en el
+    archivo y se devuelve un resultado vacío. Si todos se extraen, se
+    escriben y registran en una única transacción con escribe_turneros.
+    Las métricas de la extracción de todos los archivos y de la escritura
+    se suman en el resultado y se publican con metricas.publica.
+    """
+    metricas = MetricasCarga(tipo=TIPO_TURNERO)
+    extrae_turneros(
+        archivos,
+        workers,
+        procesos_archivos=procesos_archivos,
+        extractor=extractor,
+        cache=cache,
+    )
+    for archivo in archivos:
+        if archivo.metricas:
+            metricas.incluye(archivo.metricas)
+    if any(archivo.error for archivo in archivos):
+        return ResultadoProcesadoTurnero(metricas=metricas)
+
+    res = escribe_turneros(archivos, db_session, metricas)
+    res.metricas = metricas
     logger.info(
-        "Inserted %d users and %d shifts",
+        "Inserted %d users and %d shifts from %d files",
         len(res.created_users),
         len(res.created_shifts),
+        len(archivos),
     )
-
+    publica(metricas)
     return res
@@ -0,0 +1,101 @@
+"""Registro de archivos cargados.
+
+Los administradores vuelven a subir a menudo el mismo turnero o estadillo.
+Antes de abrir el pdf se calcula el SHA-256 de su contenido y se busca en
+el registro. Si ya se había procesado se devuelve el resumen guardado.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+from .models import Carga, PrevisualizacionTurnero
+
+if TYPE_CHECKING:  # pragma: no cover
+    from sqlalchemy.orm import Session, scoped_session
+
+    from .carga_turnero import CambiosTurnero
+
+logger = getLogger(__name__)
+
+TIPO_TURNERO = "turnero"
+TIPO_ESTADILLO = "estadillo"
+
+CADUCIDAD_PREVISUALIZACION = timedelta(days=1)
+"""Tiempo tras el que se descartan las previsualizaciones no confirmadas."""
+
+
+def hash_contenido(data: bytes) -> str:
+    """Devuelve el SHA-256 en hexadecimal del contenido de un archivo."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def busca_carga(
+    sha256: str,
+    tipo: str,
+    db_session: Session | scoped_session,
+) -> Carga | None:
+    """Busca en el registro un archivo ya procesado del tipo indicado."""
+    return db_session.query(Carga).filter_by(sha256=sha256, tipo=tipo).first()
+
+
+def resumen_carga(carga: Carga) -> dict[str, int]:
+    """Devuelve el resumen guardado de una carga."""
+    return json.loads(carga.resumen)
+
+
+def registra_carga(  # noqa: PLR0913
+    sha256: str,
+    tipo: str,
+    nombre_archivo: str,
+    resumen: dict[str, int],
+    db_session: Session | scoped_session,
+    *,
+    commit: bool = True,
+) -> Carga:
+    """Guarda o actualiza el registro de un archivo procesado.
+
+    Con commit=False el registro queda en la transacción en curso, para
+    confirmarlo junto con los datos del archivo.
+    """
+    carga = db_session.query(Carga).filter_by(sha256=sha256).first()
+    if not carga:
+        carga = Carga(sha256=sha256)
+        db_session.add(carga)
+    carga.tipo = tipo
+    carga.nombre_archivo = nombre_archivo
+    carga.fecha = datetime.now(timezone.utc).replace(tzinfo=None)
+    carga.resumen = json.dumps(resumen)
+    if commit:
+        db_session.commit()
+    logger.debug("Carga registrada: %s %s", tipo, sha256)
+    return carga
+
+
+def guarda_previsualizacion(
+    sha256: str,
+    nombre_archivo: str,
+    cambios: CambiosTurnero,
+    db_session: Session | scoped_session,
+) -> PrevisualizacionTurnero:
+    """Guarda los cambios previsualizados de un turnero hasta su confirmación.
+
+    De paso se borran las previsualizaciones caducadas que nadie confirmó.
+    """
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    db_session.query(PrevisualizacionTurnero).filter(
+        PrevisualizacionTurnero.creado < ahora - CADUCIDAD_PREVISUALIZACION,
+    ).delete()
+    previsualizacion = PrevisualizacionTurnero(
+        sha256=sha256,
+        nombre_archivo=nombre_archivo,
+        cambios=cambios.a_json(),
+        creado=ahora,
+    )
+    db_session.add(previsualizacion)
+    db_session.commit()
+    return previsualizacion
@@ -4,13 +4,20 @@ from __future__ import annotations
 
 import json
 import logging
+import os
+from pathlib import Path
 from typing import TYPE_CHECKING
 
 import click
+from flask import current_app, has_app_context
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from .cache_analisis import CacheAnalisis, cache_de_config
+from .carga_historica import LOTE, ResumenCargaHistorica, carga_directorio
+from .carga_turnero import EXTRACTOR_TABLA
 from .models import ATC  # Asegúrate de que models tiene estas importaciones
+from .user_utils import AtcIndex
 
 if TYPE_CHECKING:
     from sqlalchemy.orm.session import Session
@@ -100,15 +107,10 @@ def import_atcs(verbose: int, input_file: click.File, db_uri: str) -> None:
     session = get_session(db_uri)
 
     n_added, n_reviewed, n_edited = 0, 0, 0
+    indice = AtcIndex.carga(session)
 
     for item in data:
-        atc = (
-            session.query(ATC)
-            .filter_by(
-                apellidos_nombre=item[ATTR_APELLIDOS_NOMBRE],
-            )
-            .first()
-        )
+        atc = indice.busca(item[ATTR_APELLIDOS_NOMBRE])
         if not atc:
             logger.info("Creando ATC %s", item[ATTR_APELLIDOS_NOMBRE])
             atc = ATC(
@@ -120,6 +122,7 @@ def import_atcs(verbose: int, input_file: click.File, db_uri: str) -> None:
                 politica_aceptada=item[ATTR_POLITICA_ACEPTADA],
             )
             session.add(atc)
+            indice.añade(atc)
             logger.debug("ATC %s añadido", item[ATTR_APELLIDOS_NOMBRE])
             n_added += 1
             continue
@@ -141,8 +144,104 @@ def import_atcs(verbose: int, input_file: click.File, db_uri: str) -> None:
     click.echo(f"Añadidos: {n_added}, Revisados: {n_reviewed}, Editados: {n_edited}")
 
 
+def informe_carga_historica(resumen: ResumenCargaHistorica) -> str:
+    """Texto con el progreso y el rendimiento de una carga masiva."""
+    return (
+        f"Cargados: {resumen.n_cargados}, Ya cargados: {resumen.n_ya_cargados}, "
+        f"Errores: {resumen.n_errores}, Filas: {resumen.n_filas} "
+        f"({resumen.archivos_por_segundo:.2f} archivos/s, "
+        f"{resumen.filas_por_segundo:.0f} filas/s)"
+    )
+
+
+@click.command("backfill")
+@click.argument(
+    "directorio",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.argument("db_uri", type=str, required=False)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Procesos para analizar los pdf.",
+)
+@click.option(
+    "-l",
+    "--lote",
+    type=int,
+    default=LOTE,
+    show_default=True,
+    help="Archivos por transacción.",
+)
+@click.option(
+    "-c",
+    "--cache",
+    "cache_dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Directorio de la caché de análisis. Por defecto CACHE_ANALISIS_DIR.",
+)
+@verbose_option
+def backfill(  # noqa: PLR0913, PLR0917
+    verbose: int,
+    directorio: Path,
+    db_uri: str | None,
+    workers: int,
+    lote: int,
+    cache_dir: Path | None,
+) -> None:
+    """Cargar los turneros y estadillos archivados en un directorio.
+
+    Sin DB_URI se usa la base de datos de la aplicación. Los archivos ya
+    cargados se omiten, así que se puede relanzar tras una interrupción.
+    Con una caché de análisis, los pdf ya analizados no se vuelven a abrir.
+    """
+    set_verbose_level(verbose)
+    if db_uri is None:
+        if not has_app_context():
+            msg = "Falta DB_URI"
+            raise click.UsageError(msg)
+        db_uri = current_app.config["SQLALCHEMY_DATABASE_URI"]
+    engine = create_engine(db_uri)
+    cache: CacheAnalisis | None = None
+    if cache_dir is not None:
+        cache = CacheAnalisis(cache_dir)
+    elif has_app_context():
+        cache = cache_de_config(current_app.config)
+    # Los turneros se extraen como al subirlos desde la web
+    extractor = EXTRACTOR_TABLA
+    workers_paginas = 1
+    if has_app_context():
+        extractor = current_app.config["TURNERO_EXTRACTOR"]
+        workers_paginas = current_app.config["TURNERO_WORKERS"]
+
+    resumen = carga_directorio(
+        directorio,
+        engine,
+        workers=workers,
+        lote=lote,
+        progreso=lambda r: click.echo(informe_carga_historica(r)),
+        cache=cache,
+        extractor=extractor,
+        workers_paginas=workers_paginas,
+    )
+
+    for error in resumen.errores:
+        click.echo(f"Error: {error}", err=True)
+    click.echo(
+        f"Encontrados {resumen.n_encontrados} archivos en {resumen.segundos:.1f} s "
+        f"(análisis {resumen.segundos_analisis:.1f} s, "
+        f"escritura {resumen.segundos_escritura:.1f} s)",
+    )
+    click.echo(informe_carga_historica(resumen))
+
+
 cli.add_command(export_atcs)
 cli.add_command(import_atcs)
+cli.add_command(backfill)
 
 if __name__ == "__main__":
     cli()
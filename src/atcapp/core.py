@@ -2,16 +2,23 @@
 
 from __future__ import annotations
 
+from calendar import monthrange
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
 from enum import Enum
 from typing import TYPE_CHECKING
 
+from sqlalchemy import and_, select
+
 if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterable
+
     from sqlalchemy.orm import Session
 
+from .festivos import es_festivo, region_de_dependencia
 from .models import ATC
 from .models import Turno as DBShift
+from .versiones import CacheVersionada, clave_atcs, lee_versiones
 
 
 class TipoTurno(Enum):
@@ -144,7 +151,8 @@ class Dia:
 
     fecha: date
     dia_de_la_semana: str
-    es_festivo_nacional: bool
+    es_festivo: bool
+    """Festivo nacional o de la comunidad autónoma de la dependencia."""
     turno: Turno | None = None
 
 
@@ -198,28 +206,24 @@ class GenCalMensual:
         atc: ATC | None = None,
         session: Session | None = None,
     ) -> CalendarioMensual:
-        """Generate a calendar for a month and year."""
-        dias: list[Dia] = []
-        first_day = date(año, mes, 1)
-        last_day = GenCalMensual._ultimo_dia_del_mes(año, mes)
+        """Generate a calendar for a month and year.
 
-        # Determine the start of the calendar
-        # (possibly including days from the previous month)
-        start_date = first_day - timedelta(days=first_day.weekday())
+        Los festivos son los nacionales y, si se indica el ATC, los de la
+        comunidad autónoma de su dependencia.
+        """
+        dias: list[Dia] = []
+        start_date, end_date = GenCalMensual.ventana(año, mes)
 
-        # Determine the end of the calendar
-        # (possibly including days from the next month)
-        end_date = last_day + timedelta(days=(6 - last_day.weekday()))
+        region = region_de_dependencia(atc.dependencia if atc else None)
 
         current_date = start_date
         while current_date <= end_date:
             day_of_week = current_date.strftime("%A")
-            is_national_holiday = GenCalMensual._verifica_fiesta_nacional(current_date)
             dias.append(
                 Dia(
                     fecha=current_date,
                     dia_de_la_semana=day_of_week,
-                    es_festivo_nacional=is_national_holiday,
+                    es_festivo=es_festivo(current_date, region),
                 ),
             )
             current_date += timedelta(days=1)
@@ -252,24 +256,229 @@ class GenCalMensual:
 
         return CalendarioMensual(año=año, mes=mes, _dias=dias)
 
+    @staticmethod
+    def ventana(año: int, mes: int) -> tuple[date, date]:
+        """Primer y último día que muestra el calendario de un mes.
+
+        El calendario empieza el lunes de la semana del día 1 y termina el
+        domingo de la semana del último día, así que puede incluir días del
+        mes anterior y del siguiente.
+        """
+        first_day = date(año, mes, 1)
+        last_day = GenCalMensual._ultimo_dia_del_mes(año, mes)
+        return (
+            first_day - timedelta(days=first_day.weekday()),
+            last_day + timedelta(days=(6 - last_day.weekday())),
+        )
+
     @staticmethod
     def _ultimo_dia_del_mes(año: int, mes: int) -> date:
         if mes == MESES_EN_UN_AÑO:
             return date(año, 12, 31)
         return date(año, mes + 1, 1) - timedelta(days=1)
 
-    @staticmethod
-    def _verifica_fiesta_nacional(date_to_check: date) -> bool:
-        # Placeholder for actual holiday checking logic
-        # TODO #2 Implement a real holiday checking mechanism
-        national_holidays = [
-            date(date_to_check.year, 1, 1),  # New Year's Day
-            date(date_to_check.year, 12, 25),  # Christmas Day
-            date(date_to_check.year, 12, 6),  # Constitution Day
-            date(date_to_check.year, 10, 12),  # Hispanic Day
-            date(date_to_check.year, 5, 1),  # Labour Day
-            date(date_to_check.year, 8, 15),  # Assumption of Mary
-            date(date_to_check.year, 11, 1),  # All Saints' Day
-            date(date_to_check.year, 12, 8),  # Immaculate Conception
-        ]
-        return date_to_check in national_holidays
+
+def clave_calendario(id_atc: int, año: int, mes: int) -> str:
+    """Clave de versión del calendario de un mes de un ATC."""
+    return f"calendario:{id_atc}:{año}-{mes:02d}"
+
+
+def claves_calendario_de_turnos(turnos: Iterable[tuple[int, date]]) -> set[str]:
+    """Claves de los calendarios que muestran alguno de los turnos.
+
+    Cada turno se indica por su clave (id_atc, fecha). Un día aparece en el
+    calendario de su mes y, si cae en la primera o la última semana, también
+    en el del mes anterior o el siguiente.
+    """
+    claves = set()
+    for id_atc, fecha in turnos:
+        mes_actual = fecha.replace(day=1)
+        anterior = (mes_actual - timedelta(days=1)).replace(day=1)
+        siguiente = (mes_actual + timedelta(days=31)).replace(day=1)
+        for mes in (anterior, mes_actual, siguiente):
+            inicio, fin = GenCalMensual.ventana(mes.year, mes.month)
+            if inicio <= fecha <= fin:
+                claves.add(clave_calendario(id_atc, mes.year, mes.month))
+    return claves
+
+
+def clave_turnos_del_mes(año: int, mes: int) -> str:
+    """Clave de versión de todos los turnos de un mes."""
+    return f"turnos:{año}-{mes:02d}"
+
+
+def clave_turnos_de_atc(id_atc: int) -> str:
+    """Clave de versión de todos los turnos de un ATC."""
+    return f"turnos_atc:{id_atc}"
+
+
+def claves_de_turnos_modificados(turnos: Iterable[tuple[int, date]]) -> set[str]:
+    """Claves de versión que cambian al escribir o borrar los turnos.
+
+    Son las de los calendarios de cada ATC que muestran algún turno, las
+    de los meses de los turnos, de las que dependen los cuadrantes de
+    equipo, y las de todos los turnos de cada ATC, de las que depende su
+    calendario iCalendar.
+    """
+    turnos = list(turnos)
+    claves = claves_calendario_de_turnos(turnos)
+    claves.update(clave_turnos_del_mes(fecha.year, fecha.month) for _, fecha in turnos)
+    claves.update(clave_turnos_de_atc(id_atc) for id_atc, _ in turnos)
+    return claves
+
+
+calendarios: CacheVersionada[CalendarioMensual] = CacheVersionada()
+"""Calendarios mensuales generados, por clave_calendario."""
+
+
+def calendario_de_atc(
+    año: int,
+    mes: int,
+    atc: ATC,
+    session: Session,
+) -> CalendarioMensual:
+    """Calendario de un mes de un ATC, de la caché si no ha cambiado.
+
+    Depende de los turnos del ATC y de su dependencia, que decide los
+    festivos, así que se guarda con la versión del calendario y la de
+    clave_atcs de su dependencia. Las versiones se leen antes de generar el
+    calendario, de forma que una carga simultánea deja la entrada guardada
+    como obsoleta y nunca al revés.
+    """
+    clave = clave_calendario(atc.id, año, mes)
+    claves = (clave, clave_atcs(atc.dependencia))
+    versiones = lee_versiones(session, claves)
+    version = tuple(versiones[c] for c in claves)
+    calendario = calendarios.obtiene(clave, version)
+    if calendario is None:
+        calendario = GenCalMensual.generate(año, mes, atc, session)
+        calendarios.guarda(clave, version, calendario)
+    return calendario
+
+
+@dataclass
+class FilaEquipo:
+    """Turnos de un mes de un controlador de un equipo."""
+
+    id_atc: int
+    nombre: str
+    categoria: str | None
+    turnos: list[Turno | None]
+    """Turno de cada día del mes, empezando por el día 1."""
+
+
+@dataclass
+class CuadranteEquipo:
+    """Turnos de un mes de todos los controladores de un equipo.
+
+    Una fila por controlador, ordenadas por apellidos, y una columna por
+    cada día del mes.
+    """
+
+    dependencia: str
+    equipo: str
+    año: int
+    mes: int
+    dias: list[Dia]
+    filas: list[FilaEquipo]
+
+    @property
+    def nombre_mes(self) -> str:
+        """Return the name of the month."""
+        return self.dias[0].fecha.strftime("%B").capitalize()
+
+
+def genera_cuadrante_equipo(
+    dependencia: str,
+    equipo: str,
+    año: int,
+    mes: int,
+    session: Session,
+) -> CuadranteEquipo:
+    """Genera el cuadrante de un mes de un equipo con una sola consulta.
+
+    Los turnos se unen a los controladores del equipo con un outer join,
+    así que también aparecen los que no tienen turnos en el mes.
+    """
+    n_dias = monthrange(año, mes)[1]
+    primero, ultimo = date(año, mes, 1), date(año, mes, n_dias)
+    region = region_de_dependencia(dependencia)
+    dias = []
+    for dia in range(n_dias):
+        fecha = primero + timedelta(days=dia)
+        dias.append(
+            Dia(
+                fecha=fecha,
+                dia_de_la_semana=fecha.strftime("%A"),
+                es_festivo=es_festivo(fecha, region),
+            ),
+        )
+
+    consulta = (
+        select(
+            ATC.id,
+            ATC.apellidos_nombre,
+            ATC.categoria,
+            DBShift.fecha,
+            DBShift.turno,
+        )
+        .outerjoin(
+            DBShift,
+            and_(DBShift.id_atc == ATC.id, DBShift.fecha.between(primero, ultimo)),
+        )
+        .where(ATC.dependencia == dependencia, ATC.equipo == equipo)
+        .order_by(ATC.apellidos_nombre, ATC.id)
+    )
+    filas: dict[int, FilaEquipo] = {}
+    turnos: dict[str, Turno] = {}
+    for id_atc, nombre, categoria, fecha, codigo in session.execute(consulta):
+        fila = filas.get(id_atc)
+        if fila is None:
+            fila = FilaEquipo(id_atc, nombre, categoria, [None] * n_dias)
+            filas[id_atc] = fila
+        if fecha is None:
+            continue
+        turno = turnos.get(codigo)
+        if turno is None:
+            turno = turnos[codigo] = Turno(
+                period=period_from_code(codigo),
+                codigo=codigo,
+                descripcion=description_from_code(codigo),
+            )
+        fila.turnos[fecha.day - 1] = turno
+
+    return CuadranteEquipo(
+        dependencia=dependencia,
+        equipo=equipo,
+        año=año,
+        mes=mes,
+        dias=dias,
+        filas=list(filas.values()),
+    )
+
+
+cuadrantes: CacheVersionada[CuadranteEquipo] = CacheVersionada(256)
+"""Cuadrantes de equipo generados, por dependencia, equipo y mes."""
+
+
+def cuadrante_de_equipo(
+    dependencia: str,
+    equipo: str,
+    año: int,
+    mes: int,
+    session: Session,
+) -> CuadranteEquipo:
+    """Cuadrante de un mes de un equipo, de la caché si no ha cambiado.
+
+    Depende de los turnos del mes y de los equipos de los controladores,
+    así que se guarda con la versión de las dos claves.
+    """
+    claves = (clave_turnos_del_mes(año, mes), clave_atcs(dependencia))
+    versiones = lee_versiones(session, claves)
+    version = tuple(versiones[clave] for clave in claves)
+    clave = f"equipo:{dependencia}:{equipo}:{año}-{mes:02d}"
+    cuadrante = cuadrantes.obtiene(clave, version)
+    if cuadrante is None:
+        cuadrante = genera_cuadrante_equipo(dependencia, equipo, año, mes, session)
+        cuadrantes.guarda(clave, version, cuadrante)
+    return cuadrante
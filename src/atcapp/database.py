@@ -5,18 +5,27 @@ from __future__ import annotations
 from logging import getLogger
 from typing import TYPE_CHECKING
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from .models import Base
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Any
+
     from flask import Flask
     from sqlalchemy.engine import Engine
-    from sqlalchemy.schema import MetaData
+    from sqlalchemy.orm import Session
+    from sqlalchemy.schema import MetaData, Table
+    from sqlalchemy.sql.dml import Insert
 
 logger = getLogger(__name__)
 
+UPSERT_BATCH_SIZE = 500
+"""Número de filas por cada executemany de bulk_upsert."""
+
 
 class DB:
     """Base de datos.
@@ -44,11 +53,13 @@ class DB:
             logger.debug("Inicialización de la base de datos ya realizada. Ignorada.")
             return
 
-        self.engine = create_engine(
-            app.config["SQLALCHEMY_DATABASE_URI"],
-            echo=False,
-            future=True,
-        )
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        opciones: dict[str, Any] = {}
+        # SQLite no usa un pool de conexiones por servidor
+        if make_url(uri).get_backend_name() != "sqlite":
+            opciones["pool_size"] = app.config["SQLALCHEMY_POOL_SIZE"]
+            opciones["max_overflow"] = app.config["SQLALCHEMY_MAX_OVERFLOW"]
+        self.engine = create_engine(uri, echo=False, future=True, **opciones)
         self.session_factory = sessionmaker(bind=self.engine)
         self.session = scoped_session(self.session_factory)
         app.teardown_appcontext(self.shutdown_session)
@@ -87,4 +98,48 @@ class DB:
         return Base.metadata
 
 
+def bulk_upsert(
+    session: Session | scoped_session,
+    table: Table,
+    rows: Sequence[dict[str, Any]],
+    *,
+    index_elements: Sequence[str],
+    update_columns: Sequence[str],
+) -> None:
+    """Inserta o actualiza filas en bloque con la sintaxis propia del dialecto.
+
+    MySQL/MariaDB usa ON DUPLICATE KEY UPDATE; SQLite y PostgreSQL usan
+    ON CONFLICT (index_elements) DO UPDATE. Las filas se envían en lotes de
+    UPSERT_BATCH_SIZE con un único executemany por lote.
+    """
+    if not rows:
+        return
+
+    dialect = session.get_bind().dialect.name
+    stmt: Insert
+    if dialect in ("mysql", "mariadb"):
+        mysql_stmt = mysql.insert(table)
+        stmt = mysql_stmt.on_duplicate_key_update(
+            {col: mysql_stmt.inserted[col] for col in update_columns},
+        )
+    elif dialect == "sqlite":
+        sqlite_stmt = sqlite.insert(table)
+        stmt = sqlite_stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={col: sqlite_stmt.excluded[col] for col in update_columns},
+        )
+    elif dialect == "postgresql":
+        pg_stmt = postgresql.insert(table)
+        stmt = pg_stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={col: pg_stmt.excluded[col] for col in update_columns},
+        )
+    else:
+        msg = f"Dialecto {dialect} no soportado por bulk_upsert."
+        raise NotImplementedError(msg)
+
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        session.execute(stmt, list(rows[start : start + UPSERT_BATCH_SIZE]))
+
+
 db = DB()
@@ -8,12 +8,19 @@ from __future__ import annotations
 
 import colorsys
 from collections import defaultdict, deque
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import TYPE_CHECKING
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from . import get_timezone
 from .models import ATC, Estadillo, Periodo
+from .versiones import CacheVersionada, clave_atcs, lee_versiones
+
+VERSION_JSON = 1
+"""Versión del formato de estadillo_a_json. Cambiarla invalida los ETag."""
 
 if TYPE_CHECKING:
     import pytz
@@ -38,7 +45,10 @@ class Grupo:
     controladores: dict[ATC, list[Periodo]]
     duracion: int
     """Duración total del grupo en minutos."""
-    anchor: Periodo | None = None
+    inicio: datetime
+    """Hora de inicio del estadillo, como Estadillo.hora_inicio."""
+    fin: datetime
+    """Hora de fin del estadillo, como Estadillo.hora_fin."""
 
 
 @dataclass
@@ -60,6 +70,10 @@ class PeriodoData:
     """Indica si el periodo está activo, está pasado o es futuro. PAS, ACT, FUT."""
     scroll_anchor: bool = False
     "Indica si este periodo se debe mostrar en la pantalla al cargar la página."
+    inicio: datetime | None = None
+    """Hora de inicio en UTC, para actualizar el estado en el navegador."""
+    fin: datetime | None = None
+    """Hora de fin en UTC."""
 
 
 @dataclass
@@ -85,6 +99,10 @@ class GrupoDatos:
     """Horas de inicio de todos los periodos para la cabecera."""
     marcador: float = 0.0
     """Posición del marcador de la hora actual en porcentaje."""
+    inicio: datetime | None = None
+    """Hora de inicio del estadillo."""
+    fin: datetime | None = None
+    """Hora de fin del estadillo."""
 
 
 def identifica_grupos(
@@ -96,11 +114,30 @@ def identifica_grupos(
     La base de datos solo guarda periodos individuales asociados a un controlador
     y a un estadillo. Esta función identifica los grupos de controladores que
     trabajan juntos en los mismos sectores.
+
+    Los periodos se leen con su controlador y su sector en una sola
+    consulta, y las horas de inicio y fin del estadillo se calculan con
+    ellos en lugar de cargar de nuevo Estadillo.periodos.
     """
     res: list[Grupo] = []
 
-    # Obtener todos los periodos del estadillo
-    periodos = session.query(Periodo).filter_by(id_estadillo=estadillo.id).all()
+    # Todos los periodos del estadillo con sus controladores y sectores
+    periodos = session.scalars(
+        select(Periodo)
+        .where(Periodo.id_estadillo == estadillo.id)
+        .options(
+            joinedload(Periodo.controlador, innerjoin=True),
+            joinedload(Periodo.sector),
+        )
+        # Al reconciliar, un periodo cambiado es una fila nueva: el id no
+        # sigue el orden de las horas
+        .order_by(Periodo.hora_inicio, Periodo.id),
+    ).all()
+    if not periodos:
+        return res
+    tz = get_timezone(estadillo.dependencia)
+    inicio_estadillo = min(p.hora_inicio_utc for p in periodos).astimezone(tz)
+    fin_estadillo = max(p.hora_fin_utc for p in periodos).astimezone(tz)
 
     # Crear un diccionario que mapea cada controlador a los sectores en los que trabaja
     sectores_por_controlador: dict[ATC, set[Sector]] = defaultdict(set)
@@ -110,7 +147,11 @@ def identifica_grupos(
             sectores_por_controlador[periodo.controlador].add(periodo.sector)
         periodos_por_controlador[periodo.controlador].append(periodo)
 
-    controladores_sin_asignar = list(sectores_por_controlador.keys())
+    # Los controladores siguen el orden en que se guardaron, el del estadillo
+    controladores_sin_asignar = sorted(
+        sectores_por_controlador,
+        key=lambda c: min(p.id for p in periodos_por_controlador[c]),
+    )
 
     # Mientras haya controladores sin asignar, buscamos grupos
     while controladores_sin_asignar:
@@ -133,53 +174,25 @@ def identifica_grupos(
                 controladores_sin_asignar.remove(otro_controlador)
 
         # Calcular la duración total del grupo
-        inicio = grupo_controladores[controlador][0].hora_inicio
-        fin = grupo_controladores[controlador][-1].hora_fin
+        periodos_controlador = grupo_controladores[controlador]
+        inicio = min(p.hora_inicio for p in periodos_controlador)
+        fin = max(p.hora_fin for p in periodos_controlador)
         duracion = (fin - inicio).seconds // 60
 
-        res.append(Grupo(estadillo, grupo_sectores, grupo_controladores, duracion))
+        res.append(
+            Grupo(
+                estadillo,
+                grupo_sectores,
+                grupo_controladores,
+                duracion,
+                inicio_estadillo,
+                fin_estadillo,
+            ),
+        )
 
     return res
 
 
-def marca_anchor(grupos: list[Grupo], user: ATC | None, tz: pytz.BaseTzInfo) -> None:
-    """Marca el periodo activo en el grupo de controladores.
-
-    El periodo activo es el que está en curso en el momento de la consulta.
-    Primero se identifican todos los periodos que estén activos.
-    Si user no es None y alguno de los periodos activos está asociado a user,
-    se marca como el group anchor.
-    Si no, se marca el periodo que pertenezca a un grupo con más controladores.
-    """
-    now = datetime.now(tz)
-    periodos_activos = [
-        periodo
-        for grupo in grupos
-        for controlador, periodos in grupo.controladores.items()
-        for periodo in periodos
-        if periodo.hora_inicio_utc <= now <= periodo.hora_fin_utc
-    ]
-
-    if user:
-        for periodo in periodos_activos:
-            if periodo.controlador == user:
-                grupo = next(
-                    (grupo for grupo in grupos if user in grupo.controladores),
-                    None,
-                )
-                if grupo:
-                    grupo.anchor = periodo
-                    return
-
-    # Si no hay grupo con el usuario, se marca el grupo con más controladores
-    if periodos_activos:
-        grupo_con_mas_controladores = max(grupos, key=lambda g: len(g.controladores))
-        for periodo in periodos_activos:
-            if periodo.controlador in grupo_con_mas_controladores.controladores:
-                grupo_con_mas_controladores.anchor = periodo
-                return
-
-
 def _genera_actividad(per: Periodo) -> str:
     """Genera la actividad de un periodo para presentar en una plantilla."""
     if per.actividad == "D":
@@ -246,6 +259,11 @@ def _genera_color(per: Periodo, color_manager: ColorManager) -> str:
     return color_manager.get_color(per.sector.nombre, is_executive=per.actividad == "E")
 
 
+def _porcentaje(duracion: int, total: int) -> float:
+    """Porcentaje de la duración total, 0 si el total es 0."""
+    return duracion / total * 100 if total else 0.0
+
+
 def _genera_horas_de_inicio(
     dur_total: int,
     controladores: dict[ATC, list[Periodo]],
@@ -285,7 +303,7 @@ def _genera_horas_de_inicio(
                 actividad="",
                 color="",
                 duracion=duracion,
-                porcentaje=duracion / dur_total * 100,
+                porcentaje=_porcentaje(duracion, dur_total),
             ),
         )
 
@@ -309,11 +327,12 @@ def _es_activo(
     return "ACT"
 
 
-def calcula_marcador(grupo: Grupo, now: datetime) -> float:
+def calcula_marcador(
+    inicio_grupo: datetime,
+    fin_grupo: datetime,
+    now: datetime,
+) -> float:
     """Calcula la posición del marcador de la hora actual en porcentaje."""
-    inicio_grupo = grupo.estadillo.hora_inicio
-    fin_grupo = grupo.estadillo.hora_fin
-
     if now < inicio_grupo:
         return 0.0
     if now > fin_grupo:
@@ -324,65 +343,287 @@ def calcula_marcador(grupo: Grupo, now: datetime) -> float:
     return (duracion_actual / total_duracion) * 100
 
 
-def genera_datos_grupo(
+def _duracion(per: Periodo) -> int:
+    """Duración de un periodo en minutos."""
+    return (per.hora_fin - per.hora_inicio).seconds // 60
+
+
+@dataclass(frozen=True)
+class PeriodoFijo:
+    """Periodo con los datos de presentación que no dependen de la hora."""
+
+    datos: PeriodoData
+    """Datos del periodo con activo y scroll_anchor sin calcular."""
+    inicio: datetime
+    """Hora de inicio en UTC."""
+    fin: datetime
+    """Hora de fin en UTC."""
+
+
+@dataclass(frozen=True)
+class ControladorFijo:
+    """Controlador de un grupo con sus periodos."""
+
+    id_atc: int
+    nombre: str
+    periodos: list[PeriodoFijo]
+
+
+@dataclass(frozen=True)
+class GrupoFijo:
+    """Parte de GrupoDatos que solo depende del estadillo.
+
+    Se calcula una vez por versión del estadillo y se comparte entre
+    peticiones, así que no debe modificarse. aplica_estado le añade en
+    cada petición lo que depende de la hora y del usuario.
+    """
+
+    sectores: list[str]
+    controladores: list[ControladorFijo]
+    horas_inicio: list[PeriodoData]
+    inicio: datetime
+    """Hora de inicio del estadillo."""
+    fin: datetime
+    """Hora de fin del estadillo."""
+
+
+def genera_grupo_fijo(
     grupo: Grupo,
     color_manager: ColorManager,
     tz: pytz.BaseTzInfo,
-    user: ATC | None = None,
-) -> GrupoDatos:
-    """Genera los datos de un grupo de controladores para presentar en una plantilla."""
-    sectores = [sector.nombre for sector in grupo.sectores]
-    sectores.sort()
-    atcs = []
-    now = datetime.now(tz)
-    for controlador, periodos in grupo.controladores.items():
-        atc_data = EstadilloPersonalData(
+) -> GrupoFijo:
+    """Calcula los datos de presentación de un grupo que no dependen de la hora."""
+    controladores = [
+        ControladorFijo(
+            id_atc=controlador.id,
             nombre=f"{controlador.nombre_apellidos}",
             periodos=[
-                PeriodoData(
-                    hora_inicio=datetime.strftime(
-                        p.hora_inicio_utc.astimezone(tz),
-                        "%H:%M",
+                PeriodoFijo(
+                    datos=PeriodoData(
+                        hora_inicio=datetime.strftime(
+                            p.hora_inicio_utc.astimezone(tz),
+                            "%H:%M",
+                        ),
+                        hora_fin=datetime.strftime(
+                            p.hora_fin_utc.astimezone(tz),
+                            "%H:%M",
+                        ),
+                        actividad=_genera_actividad(p),
+                        color=_genera_color(p, color_manager),
+                        duracion=(duracion := _duracion(p)),
+                        porcentaje=_porcentaje(duracion, grupo.duracion),
+                        inicio=p.hora_inicio_utc,
+                        fin=p.hora_fin_utc,
                     ),
-                    hora_fin=datetime.strftime(p.hora_fin_utc.astimezone(tz), "%H:%M"),
-                    actividad=_genera_actividad(p),
-                    color=_genera_color(p, color_manager),
-                    duracion=(duracion := (p.hora_fin - p.hora_inicio).seconds // 60),
-                    porcentaje=duracion / grupo.duracion * 100,
-                    activo=_es_activo(
-                        p.hora_inicio_utc,
-                        p.hora_fin_utc,
-                        grupo.estadillo.hora_inicio,
-                        grupo.estadillo.hora_fin,
-                        now,
-                    ),
-                    scroll_anchor=p == grupo.anchor,
+                    inicio=p.hora_inicio_utc,
+                    fin=p.hora_fin_utc,
                 )
                 for p in periodos
             ],
-            usuario_actual=controlador == user,
         )
-        atcs.append(atc_data)
+        for controlador, periodos in grupo.controladores.items()
+    ]
+    return GrupoFijo(
+        sectores=sorted(sector.nombre for sector in grupo.sectores),
+        controladores=controladores,
+        horas_inicio=_genera_horas_de_inicio(grupo.duracion, grupo.controladores, tz),
+        inicio=grupo.inicio,
+        fin=grupo.fin,
+    )
+
+
+def busca_anchor(
+    grupos: list[GrupoFijo],
+    id_user: int | None,
+    now: datetime,
+) -> PeriodoFijo | None:
+    """Busca el periodo que se debe mostrar en la pantalla al cargar la página.
+
+    Es uno de los periodos en curso. Si alguno es del usuario, el suyo.
+    Si no, el primero del grupo con más controladores.
+    """
+    activos = [
+        (controlador.id_atc, periodo)
+        for grupo in grupos
+        for controlador in grupo.controladores
+        for periodo in controlador.periodos
+        if periodo.inicio <= now <= periodo.fin
+    ]
+    if not activos:
+        return None
 
-    horas_inicio = _genera_horas_de_inicio(grupo.duracion, grupo.controladores, tz)
-    marcador = calcula_marcador(grupo, now)
+    if id_user is not None:
+        for id_atc, periodo in activos:
+            if id_atc == id_user:
+                return periodo
 
+    mayor = max(grupos, key=lambda g: len(g.controladores))
+    ids_mayor = {controlador.id_atc for controlador in mayor.controladores}
+    return next((p for id_atc, p in activos if id_atc in ids_mayor), None)
+
+
+def aplica_estado(
+    grupo: GrupoFijo,
+    anchor: PeriodoFijo | None,
+    id_user: int | None,
+    now: datetime,
+) -> GrupoDatos:
+    """Completa los datos fijos de un grupo con los que dependen de la hora.
+
+    Marca los periodos pasados, activos y futuros, el periodo anchor, el
+    usuario actual y la posición del marcador. Crea datos nuevos sin
+    modificar el grupo fijo.
+    """
+    atcs = [
+        EstadilloPersonalData(
+            nombre=controlador.nombre,
+            periodos=[
+                replace(
+                    periodo.datos,
+                    activo=_es_activo(
+                        periodo.inicio,
+                        periodo.fin,
+                        grupo.inicio,
+                        grupo.fin,
+                        now,
+                    ),
+                    scroll_anchor=periodo is anchor,
+                )
+                for periodo in controlador.periodos
+            ],
+            usuario_actual=controlador.id_atc == id_user,
+        )
+        for controlador in grupo.controladores
+    ]
     return GrupoDatos(
-        sectores=sectores,
+        sectores=grupo.sectores,
         atcs=atcs,
-        horas_inicio=horas_inicio,
-        marcador=marcador,
+        horas_inicio=grupo.horas_inicio,
+        marcador=calcula_marcador(grupo.inicio, grupo.fin, now),
+        inicio=grupo.inicio,
+        fin=grupo.fin,
     )
 
 
+def genera_datos_grupo(
+    grupo: Grupo,
+    color_manager: ColorManager,
+    tz: pytz.BaseTzInfo,
+    user: ATC | None = None,
+) -> GrupoDatos:
+    """Genera los datos de un grupo de controladores para presentar en una plantilla.
+
+    No marca ningún periodo como anchor, que genera_datos_estadillo elige
+    entre todos los grupos del estadillo.
+    """
+    fijo = genera_grupo_fijo(grupo, color_manager, tz)
+    return aplica_estado(fijo, None, user.id if user else None, datetime.now(tz))
+
+
+def clave_estadillo(id_estadillo: int) -> str:
+    """Clave de versión de los datos de un estadillo."""
+    return f"estadillo:{id_estadillo}"
+
+
+def clave_estadillos_de_dependencia(dependencia: str) -> str:
+    """Clave que cambia al guardar un estadillo nuevo o sustituido."""
+    return f"estadillos:{dependencia.upper()}"
+
+
+def version_estadillo(
+    id_estadillo: int,
+    dependencia: str,
+    session: Session | scoped_session,
+) -> tuple[int, ...]:
+    """Versión de los datos fijos de un estadillo, con una consulta.
+
+    Dependen de los periodos del estadillo y de los nombres de los
+    controladores de su dependencia, así que es la versión de las dos claves.
+    """
+    claves = (clave_estadillo(id_estadillo), clave_atcs(dependencia))
+    versiones = lee_versiones(session, claves)
+    return tuple(versiones[clave] for clave in claves)
+
+
+def etag_estadillo(id_estadillo: int, version: tuple[int, ...]) -> str:
+    """ETag del JSON de un estadillo, que cambia con su versión."""
+    return "-".join(map(str, (id_estadillo, *version, f"v{VERSION_JSON}")))
+
+
+estadillos_fijos: CacheVersionada[list[GrupoFijo]] = CacheVersionada(64)
+"""Grupos fijos de los estadillos consultados, por clave_estadillo."""
+
+
+def grupos_fijos(
+    estadillo: Estadillo,
+    session: Session | scoped_session,
+) -> list[GrupoFijo]:
+    """Grupos fijos de un estadillo, de la caché si no ha cambiado."""
+    clave = clave_estadillo(estadillo.id)
+    version = version_estadillo(estadillo.id, estadillo.dependencia, session)
+    grupos = estadillos_fijos.obtiene(clave, version)
+    if grupos is None:
+        tz = get_timezone(estadillo.dependencia)
+        color_manager = ColorManager()
+        grupos = [
+            genera_grupo_fijo(grupo, color_manager, tz)
+            for grupo in identifica_grupos(estadillo, session)
+        ]
+        estadillos_fijos.guarda(clave, version, grupos)
+    return grupos
+
+
 def genera_datos_estadillo(
     estadillo: Estadillo,
     session: Session | scoped_session,
     user: ATC | None = None,
 ) -> list[GrupoDatos]:
-    """Genera los datos de un estadillo para presentar en una plantilla."""
-    grupos = identifica_grupos(estadillo, session)
-    tz = get_timezone(estadillo.dependencia)
-    marca_anchor(grupos, user, tz)
-    color_manager = ColorManager()  # Crear una instancia de ColorManager
-    return [genera_datos_grupo(grupo, color_manager, tz, user) for grupo in grupos]
+    """Genera los datos de un estadillo para presentar en una plantilla.
+
+    La parte fija sale de la caché; en cada llamada solo se calcula lo
+    que depende de la hora actual y del usuario.
+    """
+    grupos = grupos_fijos(estadillo, session)
+    now = datetime.now(timezone.utc)
+    id_user = user.id if user else None
+    anchor = busca_anchor(grupos, id_user, now)
+    return [aplica_estado(grupo, anchor, id_user, now) for grupo in grupos]
+
+
+def estadillo_a_json(grupos: list[GrupoFijo]) -> list[dict[str, Any]]:
+    """Grupos fijos de un estadillo en JSON, para actualizarlo en el navegador.
+
+    Es igual para todos los usuarios; el navegador calcula el estado de
+    cada periodo y el marcador a partir de las horas en UTC.
+    """
+    return [
+        {
+            "sectores": grupo.sectores,
+            "inicio": grupo.inicio.isoformat(),
+            "fin": grupo.fin.isoformat(),
+            "horas_inicio": [
+                {"hora_inicio": hora.hora_inicio, "porcentaje": hora.porcentaje}
+                for hora in grupo.horas_inicio
+            ],
+            "controladores": [
+                {
+                    "id_atc": controlador.id_atc,
+                    "nombre": controlador.nombre,
+                    "periodos": [
+                        {
+                            "hora_inicio": periodo.datos.hora_inicio,
+                            "hora_fin": periodo.datos.hora_fin,
+                            "actividad": periodo.datos.actividad,
+                            "color": periodo.datos.color,
+                            "porcentaje": periodo.datos.porcentaje,
+                            "inicio": periodo.inicio.isoformat(),
+                            "fin": periodo.fin.isoformat(),
+                        }
+                        for periodo in controlador.periodos
+                    ],
+                }
+                for controlador in grupo.controladores
+            ],
+        }
+        for grupo in grupos
+    ]
@@ -0,0 +1,192 @@
+"""Avisos de estadillos nuevos a las páginas abiertas con Server-Sent Events.
+
+Las páginas de estadillo abren una conexión a /events/estadillo que queda
+a la espera. Cada worker de gunicorn tiene un Vigilante con un hilo que,
+solo mientras haya conexiones abiertas, lee cada EVENTOS_INTERVALO
+segundos en versiones_datos la versión de los estadillos de las
+dependencias con suscriptores. Las cargas de estadillos cambian esa
+versión en la misma transacción en que guardan los datos, así que los
+avisos llegan a las conexiones de todos los workers sin Redis ni otro
+broker. Una consulta por worker sirve a todas sus conexiones, y sin
+conexiones el hilo espera sin consultar la base de datos.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .estadillos import clave_estadillos_de_dependencia
+from .versiones import lee_version, lee_versiones
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable, Iterator
+
+    from flask import Flask
+    from sqlalchemy.orm import Session, scoped_session
+
+logger = getLogger(__name__)
+
+KEEPALIVE = 25.0
+"""Segundos máximos sin enviar nada, para que el proxy no cierre la conexión."""
+
+REINTENTO_MS = 10000
+"""Espera del navegador antes de reconectar tras perder la conexión."""
+
+
+class Vigilante:
+    """Vigila la versión de los estadillos de las dependencias con suscriptores.
+
+    Las conexiones se registran con suscribe y esperan con espera, que
+    vuelve en cuanto el hilo del vigilante ve una versión distinta.
+    """
+
+    session_factory: Callable[[], Session] | None = None
+    intervalo: float = 2.0
+    max_conexiones: int = 64
+
+    def __init__(self) -> None:
+        """Crea el vigilante sin suscriptores. El hilo arranca con el primero."""
+        self._condicion = threading.Condition()
+        self._suscriptores: Counter[str] = Counter()
+        self._versiones: dict[str, int] = {}
+        self._hilo: threading.Thread | None = None
+
+    def init_app(self, app: Flask, session_factory: Callable[[], Session]) -> None:
+        """Configura el vigilante a partir de la configuración de la app."""
+        self.session_factory = session_factory
+        self.intervalo = float(app.config["EVENTOS_INTERVALO"])
+        self.max_conexiones = int(app.config["EVENTOS_CONEXIONES"])
+
+    @property
+    def conexiones(self) -> int:
+        """Conexiones abiertas en este worker."""
+        with self._condicion:
+            return sum(self._suscriptores.values())
+
+    def suscribe(
+        self,
+        dependencia: str,
+        db_session: Session | scoped_session,
+    ) -> int | None:
+        """Registra una conexión y devuelve la versión actual de la dependencia.
+
+        Devuelve None sin registrarla si el worker ya tiene max_conexiones
+        abiertas, para no ocupar todos sus hilos con conexiones en espera.
+        """
+        clave = clave_estadillos_de_dependencia(dependencia)
+        with self._condicion:
+            if sum(self._suscriptores.values()) >= self.max_conexiones:
+                return None
+            self._suscriptores[clave] += 1
+            version = self._versiones.get(clave)
+        if version is None:
+            version = lee_version(db_session, clave)
+            with self._condicion:
+                # Se usa la del hilo si la ha leído entretanto
+                version = self._versiones.setdefault(clave, version)
+        self._arranca()
+        return version
+
+    def baja(self, dependencia: str) -> None:
+        """Quita el registro de una conexión cerrada."""
+        clave = clave_estadillos_de_dependencia(dependencia)
+        with self._condicion:
+            self._suscriptores[clave] -= 1
+            if self._suscriptores[clave] <= 0:
+                del self._suscriptores[clave]
+                self._versiones.pop(clave, None)
+
+    def espera(self, dependencia: str, version: int, timeout: float) -> int:
+        """Espera hasta timeout segundos a que cambie la versión y la devuelve."""
+        clave = clave_estadillos_de_dependencia(dependencia)
+        with self._condicion:
+            self._condicion.wait_for(
+                lambda: self._versiones.get(clave, version) != version,
+                timeout,
+            )
+            return self._versiones.get(clave, version)
+
+    def comprueba(self, db_session: Session | scoped_session) -> None:
+        """Lee con una consulta las versiones con suscriptores y avisa si cambian."""
+        with self._condicion:
+            claves = list(self._suscriptores)
+        if not claves:
+            return
+        versiones = lee_versiones(db_session, claves)
+        with self._condicion:
+            cambios = False
+            for clave, version in versiones.items():
+                # Sin la clave, la última conexión se ha cerrado entretanto
+                if clave not in self._suscriptores:
+                    continue
+                if self._versiones.get(clave) != version:
+                    self._versiones[clave] = version
+                    cambios = True
+            if cambios:
+                self._condicion.notify_all()
+
+    def _arranca(self) -> None:
+        """Arranca el hilo la primera vez que hay suscriptores."""
+        if self.session_factory is None:
+            return
+        with self._condicion:
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._vigila,
+                    name="vigilante-estadillos",
+                    daemon=True,
+                )
+                self._hilo.start()
+            self._condicion.notify_all()
+
+    def _vigila(self) -> None:
+        while True:
+            with self._condicion:
+                # Sin suscriptores no se consulta la base de datos
+                self._condicion.wait_for(lambda: bool(self._suscriptores))
+            try:
+                with self.session_factory() as db_session:  # type: ignore[misc]
+                    self.comprueba(db_session)
+            except SQLAlchemyError:
+                logger.exception("Error al leer las versiones de los estadillos")
+            time.sleep(self.intervalo)
+
+
+vigilante = Vigilante()
+
+
+def evento_estadillo(dependencia: str, version: int) -> str:
+    """Evento SSE de un estadillo nuevo o sustituido en la dependencia."""
+    datos = json.dumps({"dependencia": dependencia, "version": version})
+    return f"id: {version}\nevent: estadillo\ndata: {datos}\n\n"
+
+
+def flujo_estadillo(
+    vigilante: Vigilante,
+    dependencia: str,
+    version: int,
+    ultima: str | None = None,
+) -> Iterator[str]:
+    """Flujo SSE de una conexión ya suscrita con suscribe.
+
+    ultima es el id del último evento recibido por el navegador antes de
+    reconectar. Si no coincide con la versión actual se avisa enseguida.
+    Entre avisos se envía un comentario cada KEEPALIVE segundos.
+    """
+    yield f"retry: {REINTENTO_MS}\n\n"
+    if ultima is not None and ultima != str(version):
+        yield evento_estadillo(dependencia, version)
+    while True:
+        nueva = vigilante.espera(dependencia, version, KEEPALIVE)
+        if nueva == version:
+            yield ": keepalive\n\n"
+        else:
+            version = nueva
+            yield evento_estadillo(dependencia, version)
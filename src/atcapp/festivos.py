@@ -0,0 +1,137 @@
+"""Festivos nacionales y autonómicos de cada dependencia.
+
+Los festivos de cada año se calculan una sola vez por región y se guardan
+en un conjunto de fechas, así que comprobar si un día es festivo es una
+búsqueda en un conjunto. Las fiestas móviles (Jueves Santo, Viernes Santo
+y Lunes de Pascua) se calculan a partir del domingo de Pascua.
+
+Solo se incluyen las fiestas que se repiten todos los años. Los traslados
+al lunes de las fiestas que caen en domingo, y las fiestas que cada
+comunidad elige año a año, se publican en el BOE y no se calculan aquí.
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable
+
+NACIONAL = ""
+"""Región sin festivos autonómicos."""
+
+REGION_DE_DEPENDENCIA = {
+    "LECB": "CT",  # Barcelona: Cataluña
+    "LECM": "MD",  # Madrid: Comunidad de Madrid
+    "LECS": "AN",  # Sevilla: Andalucía
+    "GCCC": "CN",  # Canarias
+}
+"""Comunidad autónoma de cada dependencia, por su código ISO 3166-2:ES."""
+
+
+def domingo_de_pascua(año: int) -> date:
+    """Domingo de Pascua del calendario gregoriano.
+
+    Algoritmo anónimo gregoriano (Meeus/Jones/Butcher).
+    """
+    a = año % 19
+    b, c = divmod(año, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(año, mes, dia + 1)
+
+
+def _nacionales(año: int) -> set[date]:
+    """Fiestas de ámbito nacional."""
+    pascua = domingo_de_pascua(año)
+    return {
+        date(año, 1, 1),  # Año Nuevo
+        date(año, 1, 6),  # Epifanía del Señor
+        pascua - timedelta(days=2),  # Viernes Santo
+        date(año, 5, 1),  # Fiesta del Trabajo
+        date(año, 8, 15),  # Asunción de la Virgen
+        date(año, 10, 12),  # Fiesta Nacional de España
+        date(año, 11, 1),  # Todos los Santos
+        date(año, 12, 6),  # Día de la Constitución
+        date(año, 12, 8),  # Inmaculada Concepción
+        date(año, 12, 25),  # Natividad del Señor
+    }
+
+
+def _jueves_santo(año: int) -> date:
+    return domingo_de_pascua(año) - timedelta(days=3)
+
+
+def _cataluña(año: int) -> set[date]:
+    return {
+        domingo_de_pascua(año) + timedelta(days=1),  # Lunes de Pascua
+        date(año, 6, 24),  # Sant Joan
+        date(año, 9, 11),  # Diada Nacional de Catalunya
+        date(año, 12, 26),  # Sant Esteve
+    }
+
+
+def _madrid(año: int) -> set[date]:
+    return {
+        _jueves_santo(año),
+        date(año, 5, 2),  # Fiesta de la Comunidad de Madrid
+    }
+
+
+def _andalucia(año: int) -> set[date]:
+    return {
+        _jueves_santo(año),
+        date(año, 2, 28),  # Día de Andalucía
+    }
+
+
+def _canarias(año: int) -> set[date]:
+    return {
+        _jueves_santo(año),
+        date(año, 5, 30),  # Día de Canarias
+    }
+
+
+_AUTONOMICOS: dict[str, Callable[[int], set[date]]] = {
+    "CT": _cataluña,
+    "MD": _madrid,
+    "AN": _andalucia,
+    "CN": _canarias,
+}
+
+_tablas: dict[tuple[str, int], frozenset[date]] = {}
+_tablas_lock = threading.Lock()
+
+
+def region_de_dependencia(dependencia: str | None) -> str:
+    """Región de los festivos de una dependencia. NACIONAL si no se conoce."""
+    if not dependencia:
+        return NACIONAL
+    return REGION_DE_DEPENDENCIA.get(dependencia.upper(), NACIONAL)
+
+
+def festivos(region: str, año: int) -> frozenset[date]:
+    """Festivos de un año en una región, calculados la primera vez."""
+    clave = (region, año)
+    tabla = _tablas.get(clave)
+    if tabla is not None:
+        return tabla
+    fechas = _nacionales(año)
+    autonomicos = _AUTONOMICOS.get(region)
+    if autonomicos is not None:
+        fechas |= autonomicos(año)
+    with _tablas_lock:
+        return _tablas.setdefault(clave, frozenset(fechas))
+
+
+def es_festivo(fecha: date, region: str = NACIONAL) -> bool:
+    """Indica si una fecha es festivo nacional o de la región."""
+    return fecha in festivos(region, fecha.year)
@@ -0,0 +1,208 @@
+"""Calendario iCalendar (RFC 5545) con los turnos de un ATC.
+
+Cada ATC puede suscribirse a sus turnos desde la aplicación de calendario
+del móvil con una URL que incluye un token secreto. Las aplicaciones
+consultan la URL periódicamente; el ETag y Last-Modified de la respuesta
+se derivan de la versión de los turnos del ATC en versiones_datos, que
+cambian las cargas de turneros, así que mientras no haya cambios se
+responde 304 sin consultar la tabla de turnos.
+"""
+
+from __future__ import annotations
+
+import secrets
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select
+
+from .core import TURNOS_BASICOS, TipoTurno, description_from_code, period_from_code
+from .database import bulk_upsert
+from .models import TokenCalendario, Turno
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterable
+
+    import pytz
+    from sqlalchemy.orm import Session, scoped_session
+
+VERSION_ICAL = 1
+"""Versión del formato generado. Cambiarla invalida los ETag anteriores."""
+
+MESES_PASADOS = 3
+"""Meses anteriores al actual que se incluyen en el calendario."""
+
+HORARIOS: dict[TipoTurno, tuple[time, time]] = {
+    TipoTurno.M: (time(7, 0), time(15, 0)),
+    TipoTurno.T: (time(15, 0), time(22, 30)),
+    TipoTurno.N: (time(22, 30), time(7, 0)),
+}
+"""Hora local de inicio y fin de cada tipo de turno. La noche acaba al día
+siguiente. Las horas de fin coinciden con las de los estadillos."""
+
+PRODID = "-//ATCApp//Turnos//ES"
+LONGITUD_LINEA = 75
+"""Octetos máximos por línea antes de plegarla, según RFC 5545."""
+
+
+def crea_token(db_session: Session | scoped_session, id_atc: int) -> str:
+    """Crea un token nuevo para el ATC, que sustituye al anterior."""
+    token = secrets.token_urlsafe(32)
+    bulk_upsert(
+        db_session,
+        TokenCalendario.__table__,  # type: ignore[arg-type]
+        [
+            {
+                "id_atc": id_atc,
+                "token": token,
+                "creado": datetime.now(timezone.utc).replace(tzinfo=None),
+            },
+        ],
+        index_elements=("id_atc",),
+        update_columns=("token", "creado"),
+    )
+    db_session.commit()
+    return token
+
+
+def token_de_atc(db_session: Session | scoped_session, id_atc: int) -> str | None:
+    """Token actual del ATC, o None si no ha creado ninguno."""
+    return db_session.scalar(
+        select(TokenCalendario.token).where(TokenCalendario.id_atc == id_atc),
+    )
+
+
+def atc_de_token(db_session: Session | scoped_session, token: str) -> int | None:
+    """Id del ATC dueño del token, o None si el token no existe."""
+    return db_session.scalar(
+        select(TokenCalendario.id_atc).where(TokenCalendario.token == token),
+    )
+
+
+def primer_dia_incluido(hoy: date) -> date:
+    """Primer día del calendario: el día 1 de MESES_PASADOS meses atrás."""
+    primero = hoy.replace(day=1)
+    for _ in range(MESES_PASADOS):
+        primero = (primero - timedelta(days=1)).replace(day=1)
+    return primero
+
+
+def etag_ical(id_atc: int, version: int, desde: date) -> str:
+    """ETag del calendario de un ATC con una versión de sus turnos."""
+    return f"{id_atc}-{version}-{desde:%Y%m}-v{VERSION_ICAL}"
+
+
+def lee_turnos(
+    db_session: Session | scoped_session,
+    id_atc: int,
+    desde: date,
+) -> list[tuple[date, str]]:
+    """Fecha y código de los turnos del ATC desde una fecha, en orden."""
+    return list(
+        db_session.execute(
+            select(Turno.fecha, Turno.turno)
+            .where(Turno.id_atc == id_atc, Turno.fecha >= desde)
+            .order_by(Turno.fecha),
+        ).tuples(),
+    )
+
+
+def horario_de_turno(
+    codigo: str,
+    fecha: date,
+    tz: pytz.BaseTzInfo,
+) -> tuple[datetime, datetime] | None:
+    """Inicio y fin en UTC de un turno, o None si no es un turno de trabajo.
+
+    Son turnos de trabajo los códigos que empiezan por M, T o N y los
+    turnos básicos. El resto (vacaciones, licencias, cursos...) se
+    muestran como eventos de día completo.
+    """
+    if codigo not in TURNOS_BASICOS and codigo[:1] not in ("M", "T", "N"):
+        return None
+    inicio, fin = HORARIOS[period_from_code(codigo)]
+    fecha_fin = fecha if fin > inicio else fecha + timedelta(days=1)
+    return (
+        tz.localize(datetime.combine(fecha, inicio)).astimezone(timezone.utc),
+        tz.localize(datetime.combine(fecha_fin, fin)).astimezone(timezone.utc),
+    )
+
+
+def _escapa(texto: str) -> str:
+    return (
+        texto.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _pliega(linea: str) -> str:
+    """Divide las líneas de más de 75 octetos sin partir caracteres UTF-8."""
+    if len(linea.encode()) <= LONGITUD_LINEA:
+        return linea
+    partes: list[str] = []
+    actual = ""
+    for caracter in linea:
+        # Las líneas de continuación empiezan por un espacio
+        limite = LONGITUD_LINEA - (1 if partes else 0)
+        if len((actual + caracter).encode()) > limite:
+            partes.append(actual)
+            actual = ""
+        actual += caracter
+    partes.append(actual)
+    return "\r\n ".join(partes)
+
+
+def _utc(momento: datetime) -> str:
+    return momento.strftime("%Y%m%dT%H%M%SZ")
+
+
+def genera_ical(
+    id_atc: int,
+    nombre: str,
+    turnos: Iterable[tuple[date, str]],
+    *,
+    tz: pytz.BaseTzInfo,
+    actualizado: datetime,
+) -> str:
+    """Genera el calendario iCalendar con un evento por turno.
+
+    actualizado es la fecha UTC del último cambio de los turnos, que se
+    usa como DTSTAMP para que el mismo contenido genere siempre el mismo
+    texto.
+    """
+    lineas = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escapa(f'Turnos {nombre}')}",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT15M",
+        "X-PUBLISHED-TTL:PT15M",
+    ]
+    dtstamp = _utc(actualizado)
+    for fecha, codigo in turnos:
+        lineas += [
+            "BEGIN:VEVENT",
+            f"UID:{id_atc}-{fecha:%Y%m%d}@atcapp",
+            f"DTSTAMP:{dtstamp}",
+        ]
+        horario = horario_de_turno(codigo, fecha, tz)
+        if horario is None:
+            fin = fecha + timedelta(days=1)
+            lineas += [
+                f"DTSTART;VALUE=DATE:{fecha:%Y%m%d}",
+                f"DTEND;VALUE=DATE:{fin:%Y%m%d}",
+                "TRANSP:TRANSPARENT",
+            ]
+        else:
+            lineas += [f"DTSTART:{_utc(horario[0])}", f"DTEND:{_utc(horario[1])}"]
+        lineas += [
+            f"SUMMARY:{_escapa(codigo)}",
+            f"DESCRIPTION:{_escapa(description_from_code(codigo))}",
+            "END:VEVENT",
+        ]
+    lineas.append("END:VCALENDAR")
+    return "".join(f"{_pliega(linea)}\r\n" for linea in lineas)
@@ -0,0 +1,192 @@
+"""Métricas de la carga de turneros y estadillos.
+
+Cada carga mide el tiempo de sus etapas (lectura del archivo, extracción
+de las tablas del pdf, identificación de usuarios y escritura) y cuenta
+páginas, tablas, filas extraídas, consultas, filas escritas y bytes leídos.
+
+Al terminar, las métricas se escriben en el log como una línea JSON y se
+entregan a las funciones suscritas con suscribe, por ejemplo para enviarlas
+a un sistema de métricas:
+
+    @suscribe
+    def envia(metricas: MetricasCarga) -> None:
+        statsd.timing("carga.extraccion", metricas.segundos["extraccion"])
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from logging import getLogger
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import event
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable, Iterator
+
+    from sqlalchemy.engine import Connection
+    from sqlalchemy.engine.default import DefaultExecutionContext
+    from sqlalchemy.engine.interfaces import DBAPICursor
+    from sqlalchemy.orm import Session, scoped_session
+
+logger = getLogger(__name__)
+
+_suscriptores: list[Callable[[MetricasCarga], None]] = []
+
+
+@dataclass
+class MetricasCarga:
+    """Tiempos y contadores de la carga de un archivo."""
+
+    tipo: str = ""
+    segundos: dict[str, float] = field(default_factory=dict)
+    """Segundos de cada etapa."""
+    paginas: int = 0
+    tablas: int = 0
+    """Tablas del pdf analizadas."""
+    filas: int = 0
+    """Filas de datos extraídas de las tablas."""
+    consultas: int = 0
+    """Sentencias SQL ejecutadas. Un executemany cuenta como una."""
+    filas_escritas: int = 0
+    """Filas insertadas, modificadas o borradas."""
+    bytes_leidos: int = 0
+
+    @property
+    def segundos_total(self) -> float:
+        """Duración de todas las etapas."""
+        return sum(self.segundos.values())
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Mide el bloque y lo suma a la etapa nombre."""
+        inicio = perf_counter()
+        try:
+            yield
+        finally:
+            self.segundos[nombre] = (
+                self.segundos.get(nombre, 0.0) + perf_counter() - inicio
+            )
+
+    @contextmanager
+    def cuenta_consultas(
+        self,
+        db_session: Session | scoped_session,
+    ) -> Iterator[None]:
+        """Cuenta las consultas y filas escritas por la sesión en el bloque.
+
+        Los eventos se registran en el engine, compartido por todos los
+        hilos, así que solo se cuentan las sentencias de este hilo.
+
+        El rowcount de un INSERT con RETURNING no es fiable en todos los
+        drivers, así que de los INSERT se cuentan las filas de parámetros.
+        """
+        bind = db_session.get_bind()
+        hilo = threading.get_ident()
+        ultimo_insert: list[DefaultExecutionContext] = []
+
+        def antes(*_: Any) -> None:  # noqa: ANN401
+            if threading.get_ident() == hilo:
+                self.consultas += 1
+
+        def despues(
+            _conn: Connection,
+            cursor: DBAPICursor,
+            _statement: str,
+            _parameters: Any,  # noqa: ANN401
+            context: DefaultExecutionContext | None,
+            _executemany: bool,  # noqa: FBT001
+        ) -> None:
+            if threading.get_ident() != hilo or context is None:
+                return
+            if context.isinsert:
+                # Un executemany puede ejecutarse en varios lotes del mismo contexto
+                if not ultimo_insert or ultimo_insert[0] is not context:
+                    ultimo_insert[:] = [context]
+                    self.filas_escritas += len(context.compiled_parameters)
+            elif (context.isupdate or context.isdelete) and cursor.rowcount > 0:
+                self.filas_escritas += cursor.rowcount
+
+        event.listen(bind, "before_cursor_execute", antes)
+        event.listen(bind, "after_cursor_execute", despues)
+        try:
+            yield
+        finally:
+            event.remove(bind, "before_cursor_execute", antes)
+            event.remove(bind, "after_cursor_execute", despues)
+
+    def incluye(self, other: MetricasCarga) -> MetricasCarga:
+        """Suma las métricas de otra carga a estas y devuelve el propio objeto."""
+        for nombre, segundos in other.segundos.items():
+            self.segundos[nombre] = self.segundos.get(nombre, 0.0) + segundos
+        self.paginas += other.paginas
+        self.tablas += other.tablas
+        self.filas += other.filas
+        self.consultas += other.consultas
+        self.filas_escritas += other.filas_escritas
+        self.bytes_leidos += other.bytes_leidos
+        return self
+
+    def a_dict(self) -> dict[str, Any]:
+        """Métricas en un diccionario plano, para el log y las respuestas JSON."""
+        return {
+            "tipo": self.tipo,
+            **{
+                f"segundos_{nombre}": round(segundos, 4)
+                for nombre, segundos in self.segundos.items()
+            },
+            "segundos_total": round(self.segundos_total, 4),
+            "paginas": self.paginas,
+            "tablas": self.tablas,
+            "filas": self.filas,
+            "consultas": self.consultas,
+            "filas_escritas": self.filas_escritas,
+            "bytes_leidos": self.bytes_leidos,
+        }
+
+    def texto(self) -> str:
+        """Resumen legible de las métricas, para los mensajes de la web."""
+        etapas = ", ".join(
+            f"{nombre} {segundos:.2f} s" for nombre, segundos in self.segundos.items()
+        )
+        return (
+            f"Tiempos: {etapas}. "
+            f"Páginas: {self.paginas}, tablas: {self.tablas}, "
+            f"filas: {self.filas}, consultas: {self.consultas}, "
+            f"filas escritas: {self.filas_escritas}, "
+            f"KB leídos: {self.bytes_leidos / 1024:.0f}"
+        )
+
+
+def suscribe(
+    suscriptor: Callable[[MetricasCarga], None],
+) -> Callable[[MetricasCarga], None]:
+    """Añade una función que recibe las métricas de cada carga.
+
+    Devuelve la propia función, para poder usarse como decorador.
+    """
+    _suscriptores.append(suscriptor)
+    return suscriptor
+
+
+def cancela_suscripcion(suscriptor: Callable[[MetricasCarga], None]) -> None:
+    """Deja de entregar las métricas a una función suscrita."""
+    if suscriptor in _suscriptores:
+        _suscriptores.remove(suscriptor)
+
+
+def publica(metricas: MetricasCarga) -> None:
+    """Escribe las métricas en el log y las entrega a los suscriptores.
+
+    Un error en un suscriptor se registra pero no interrumpe la carga.
+    """
+    logger.info("metricas_carga %s", json.dumps(metricas.a_dict(), sort_keys=True))
+    for suscriptor in list(_suscriptores):
+        try:
+            suscriptor(metricas)
+        except Exception:
+            logger.exception("Error al publicar las métricas de carga")
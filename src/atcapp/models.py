@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING
 
 import pytz
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     Date,
@@ -16,6 +17,7 @@ from sqlalchemy import (
     Integer,
     String,
     Table,
+    Text,
     UniqueConstraint,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -331,3 +333,110 @@ class Servicio(Base):
         back_populates="servicios",
         overlaps="atcs,estadillos",
     )
+
+
+class Carga(Base):
+    """Registro de archivos pdf procesados.
+
+    Identifica cada archivo por el SHA-256 de su contenido, de forma que
+    una segunda carga del mismo archivo se pueda resolver con el resumen
+    guardado sin volver a procesar el pdf.
+    """
+
+    __tablename__ = "cargas"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    tipo: Mapped[str] = mapped_column(String(10), nullable=False)
+    """turnero o estadillo."""
+    nombre_archivo: Mapped[str] = mapped_column(String(255), nullable=False)
+    fecha: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC de la última vez que se procesó el archivo."""
+    resumen: Mapped[str] = mapped_column(Text, nullable=False)
+    """Resumen del resultado del procesado en JSON."""
+
+
+class TrabajoCarga(Base):
+    """Trabajo de procesado en segundo plano de un archivo subido.
+
+    El archivo se guarda en el directorio de spool y el trabajo lo procesa
+    uno de los hilos de la cola. La fila sirve para consultar el progreso
+    y el resultado desde cualquier worker del servidor.
+    """
+
+    __tablename__ = "trabajos_carga"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tipo: Mapped[str] = mapped_column(String(10), nullable=False)
+    nombre_archivo: Mapped[str] = mapped_column(String(255), nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    ruta: Mapped[str] = mapped_column(String(255), nullable=False)
+    """Ruta del archivo en el directorio de spool."""
+    estado: Mapped[str] = mapped_column(String(12), nullable=False, index=True)
+    """pendiente, procesando, terminado o error."""
+    paginas_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    paginas_procesadas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    resultado: Mapped[str | None] = mapped_column(Text, nullable=True)
+    """Resumen del resultado del procesado en JSON."""
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    creado: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC de creación del trabajo."""
+    actualizado: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC del último cambio de estado o progreso."""
+
+
+class PrevisualizacionTurnero(Base):
+    """Cambios calculados al previsualizar la carga de un turnero.
+
+    Guarda el conjunto de cambios en JSON para que al confirmar se apliquen
+    exactamente esos cambios sin volver a procesar el pdf.
+    """
+
+    __tablename__ = "previsualizaciones_turnero"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    nombre_archivo: Mapped[str] = mapped_column(String(255), nullable=False)
+    cambios: Mapped[str] = mapped_column(Text(16_777_215), nullable=False)
+    """Cambios en JSON. MEDIUMTEXT en MySQL; un turnero completo supera TEXT."""
+    creado: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC de la previsualización."""
+
+
+class VersionDatos(Base):
+    """Versión de un conjunto de datos derivados, para invalidar cachés.
+
+    Cada clave identifica un conjunto de datos que los workers guardan en
+    memoria, por ejemplo el calendario de un mes de un ATC. Las cargas que
+    modifican esos datos cambian la versión en la misma transacción, así
+    que una caché solo tiene que comparar la versión que guardó con la
+    actual, con una consulta por clave primaria.
+    """
+
+    __tablename__ = "versiones_datos"
+
+    clave: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    """Distinta en cada cambio. Son nanosegundos desde la época Unix."""
+    actualizado: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC del último cambio."""
+
+
+class TokenCalendario(Base):
+    """Token secreto de la suscripción iCalendar de un ATC.
+
+    El token va en la URL del calendario, que las aplicaciones de
+    calendario consultan sin iniciar sesión. Generar uno nuevo invalida
+    la URL anterior.
+    """
+
+    __tablename__ = "tokens_calendario"
+
+    id_atc: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("atcs.id"),
+        primary_key=True,
+    )
+    token: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    creado: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    """Fecha y hora UTC de creación del token."""
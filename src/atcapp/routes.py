@@ -3,13 +3,17 @@
 from __future__ import annotations
 
 import contextlib
-from datetime import datetime
-from functools import wraps
+from datetime import datetime, timezone
+from functools import partial, wraps
+from io import BytesIO
 from logging import getLogger
+from pathlib import Path
 from typing import TYPE_CHECKING, Callable
 
 from flask import (
     Blueprint,
+    abort,
+    current_app,
     flash,
     jsonify,
     redirect,
@@ -19,19 +23,67 @@ from flask import (
     url_for,
 )
 from sqlalchemy.exc import IntegrityError
+from werkzeug.http import is_resource_modified
 
 from . import get_timezone
-from .carga_estadillo import procesa_estadillo
-from .carga_turnero import ResultadoProcesadoTurnero, procesa_turnero
-from .core import GenCalMensual
+from .cache_analisis import cache_de_config
+from .carga_estadillo import procesa_estadillo, resumen_estadillo
+from .carga_turnero import (
+    ArchivoTurnero,
+    CambiosTurnero,
+    ResultadoProcesadoTurnero,
+    aplica_cambios_turnero,
+    cambios_vigentes,
+    previsualiza_turnero,
+    procesa_turneros,
+)
+from .cargas import (
+    TIPO_ESTADILLO,
+    TIPO_TURNERO,
+    busca_carga,
+    guarda_previsualizacion,
+    hash_contenido,
+    registra_carga,
+    resumen_carga,
+)
+from .core import calendario_de_atc, clave_turnos_de_atc, cuadrante_de_equipo
 from .database import db
-from .estadillos import genera_datos_estadillo
+from .estadillos import (
+    clave_estadillos_de_dependencia,
+    estadillo_a_json,
+    etag_estadillo,
+    genera_datos_estadillo,
+    grupos_fijos,
+    version_estadillo,
+)
+from .eventos import flujo_estadillo, vigilante
 from .firebase import get_recognized_emails, invalidate_token, verify_id_token
-from .models import ATC, Estadillo
+from .ical import (
+    atc_de_token,
+    crea_token,
+    etag_ical,
+    genera_ical,
+    lee_turnos,
+    primer_dia_incluido,
+    token_de_atc,
+)
+from .metricas import MetricasCarga
+from .models import ATC, Estadillo, PrevisualizacionTurnero, TrabajoCarga
+from .trabajos import (
+    cola,
+    crea_trabajo,
+    estado_trabajo,
+    interrumpido,
+    marca_interrumpidos,
+)
+from .versiones import lee_version, lee_version_y_fecha
 
 if TYPE_CHECKING:  # pragma: no cover
     from flask import Flask
     from werkzeug import Response
+    from werkzeug.datastructures import FileStorage
+
+    from .models import Carga
 
 logger = getLogger(__name__)
 
@@ -130,7 +182,7 @@ def calendario() -> Response | str:
     year = request.args.get("year", type=int, default=now.year)
 
     logger.debug("Generando calendario para %s %s", month, year)
-    calendar = GenCalMensual.generate(year, month, user, db.session)  # type: ignore[arg-type]
+    calendar = calendario_de_atc(year, month, user, db.session)  # type: ignore[arg-type]
 
     # Check the session for the toggleDescriptions state
     if "toggleDescriptions" not in session:
@@ -147,6 +199,114 @@ def calendario() -> Response | str:
     )
 
 
+@main.route("/equipo")
+@privacy_policy_accepted
+def equipo() -> Response | str:
+    """Render the month roster of a team.
+
+    Regular users only see their own team. Admins can choose any team of
+    their dependencia with the equipo query parameter.
+    """
+    if "id_atc" not in session:
+        return redirect(url_for("main.login"))
+
+    user = db.session.get(ATC, session["id_atc"])
+    if not user:
+        return redirect(url_for("main.logout"))
+
+    now = datetime.now(tz=get_timezone(user.dependencia))
+    month = request.args.get("month", type=int, default=now.month)
+    year = request.args.get("year", type=int, default=now.year)
+    equipo = request.args.get("equipo", default=user.equipo or "").upper()
+
+    if not equipo:
+        flash("No tienes un equipo asignado.", "info")
+        return redirect(url_for("main.index"))
+    if equipo != user.equipo and not user.es_admin:
+        flash("Solo puedes ver el cuadrante de tu equipo.", "warning")
+        return redirect(url_for("main.equipo"))
+
+    cuadrante = cuadrante_de_equipo(
+        user.dependencia,
+        equipo,
+        year,
+        month,
+        db.session,  # type: ignore[arg-type]
+    )
+    return render_template("equipo.html", cuadrante=cuadrante)
+
+
+@main.route("/ical", methods=["GET", "POST"])
+@privacy_policy_accepted
+def ical_suscripcion() -> Response | str:
+    """Show the iCalendar subscription URL. POST creates a new one."""
+    if "id_atc" not in session:
+        return redirect(url_for("main.login"))
+
+    user = db.session.get(ATC, session["id_atc"])
+    if not user:
+        return redirect(url_for("main.logout"))
+
+    if request.method == "POST":
+        crea_token(db.session, user.id)
+        flash("Se ha generado una nueva URL. La anterior ya no funciona.", "info")
+        return redirect(url_for("main.ical_suscripcion"))
+
+    token = token_de_atc(db.session, user.id)
+    url = url_for("main.ical", token=token, _external=True) if token else None
+    return render_template("ical.html", url=url)
+
+
+@main.route("/ical/<token>.ics")
+def ical(token: str) -> Response:
+    """Serve the iCalendar feed of the ATC that owns the token.
+
+    The ETag and Last-Modified come from the version of the ATC's shifts,
+    so conditional requests are answered with a 304 without reading them.
+    """
+    # Las aplicaciones de calendario no muestran la página de error; basta
+    # con que reciban el 404 al usar una URL revocada
+    id_atc = atc_de_token(db.session, token)
+    if id_atc is None:
+        return current_app.response_class(status=404)
+
+    version, actualizado = lee_version_y_fecha(
+        db.session,
+        clave_turnos_de_atc(id_atc),
+    )
+    desde = primer_dia_incluido(datetime.now(timezone.utc).date())
+    etag = etag_ical(id_atc, version, desde)
+    if actualizado is None:
+        actualizado = datetime.fromtimestamp(0, tz=timezone.utc)
+    else:
+        actualizado = actualizado.replace(tzinfo=timezone.utc)
+
+    if not is_resource_modified(
+        request.environ,
+        etag=etag,
+        last_modified=actualizado,
+    ):
+        response = current_app.response_class(status=304)
+    else:
+        user = db.session.get(ATC, id_atc)
+        if not user:
+            return current_app.response_class(status=404)
+        contenido = genera_ical(
+            id_atc,
+            user.apellidos_nombre,
+            lee_turnos(db.session, id_atc, desde),
+            tz=get_timezone(user.dependencia),
+            actualizado=actualizado,
+        )
+        response = current_app.response_class(contenido, mimetype="text/calendar")
+
+    response.set_etag(etag)
+    response.last_modified = actualizado
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 @main.route("/toggle_descriptions")
 def toggle_descriptions() -> Response:
     """Toggle the descriptions on or off and save the state in the session."""
@@ -278,6 +438,33 @@ def privacy_policy() -> Response | str:
     return render_template("privacy_policy.html")
 
 
+def _flash_carga_previa(carga: Carga, nombre_archivo: str | None) -> None:
+    """Informa de que un archivo ya se había procesado y de su resumen."""
+    resumen = resumen_carga(carga)
+    if carga.tipo == TIPO_TURNERO:
+        detalle = (
+            f"Usuarios reconocidos: {resumen['n_total_users']}, "
+            f"turnos agregados: {resumen['n_created_shifts']}"
+        )
+    else:
+        detalle = (
+            f"Controladores reconocidos: {resumen['n_controladores']},"
+            f" periodos agregados: {resumen['n_periodos']}"
+        )
+    flash(
+        f"El archivo {nombre_archivo} ya se cargó el "
+        f"{carga.fecha.strftime('%d/%m/%Y')}. {detalle}. "
+        "Marque 'Forzar reprocesado' para volver a procesarlo.",
+        "info",
+    )
+
+
+def _flash_metricas(metricas: MetricasCarga | None) -> None:
+    """Muestra los tiempos y contadores de la carga si UPLOAD_METRICAS."""
+    if metricas and current_app.config["UPLOAD_METRICAS"]:
+        flash(metricas.texto(), "info")
+
+
 @main.route("/upload", methods=["GET", "POST"])
 @privacy_policy_accepted
 @es_admin
@@ -299,28 +486,237 @@ def upload() -> Response | str:
         )
         return redirect(url_for("main.upload"))
 
-    total = ResultadoProcesadoTurnero()
+    forzar = bool(request.form.get("force"))
+    if request.form.get("preview"):
+        return _previsualiza_turneros(files, forzar=forzar)
+    if current_app.config["UPLOAD_ASYNC"]:
+        return _encola_turneros(files, forzar=forzar)
+    return _procesa_turneros(files, forzar=forzar)
+
+
+def _procesa_turneros(files: list[FileStorage], *, forzar: bool) -> Response:
+    """Procesa los turneros en la petición y muestra el resultado.
+
+    Los archivos se extraen en paralelo y se escriben todos en una única
+    transacción. Si alguno no es válido no se carga ninguno.
+    """
+    archivos = []
+    for file in files:
+        contenido = file.read()
+        sha256 = hash_contenido(contenido)
+        carga = None if forzar else busca_carga(sha256, TIPO_TURNERO, db.session)
+        if carga:
+            _flash_carga_previa(carga, file.filename)
+            continue
+        archivos.append(
+            ArchivoTurnero(
+                nombre=file.filename or "",
+                contenido=contenido,
+                sha256=sha256,
+            ),
+        )
+
+    if not archivos:
+        return redirect(url_for("main.index"))
+
+    total = procesa_turneros(
+        archivos,
+        db.session,
+        workers=current_app.config["TURNERO_WORKERS"],
+        procesos_archivos=current_app.config["TURNERO_ARCHIVOS_WORKERS"],
+        extractor=current_app.config["TURNERO_EXTRACTOR"],
+        cache=cache_de_config(current_app.config),
+    )
+
+    errores = [archivo for archivo in archivos if archivo.error]
+    if errores:
+        for archivo in errores:
+            flash(f"Formato de archivo no válido: {archivo.nombre}", "danger")
+            logger.warning("Turnero %s no válido: %s", archivo.nombre, archivo.error)
+        if len(archivos) > len(errores):
+            flash("No se ha cargado ninguno de los archivos", "warning")
+        return redirect(url_for("main.upload"))
+
+    plural = "s" if len(archivos) > 1 else ""
+    flash(
+        f"Archivo{plural} cargado{plural} con éxito. "
+        f"Usuarios reconocidos: {total.n_total_users}, "
+        f"turnos agregados: {total.n_created_shifts}",
+        "success",
+    )
+    if len(archivos) > 1:
+        for archivo in archivos:
+            res = archivo.resultado or ResultadoProcesadoTurnero()
+            flash(
+                f"{archivo.nombre}: {res.n_total_users} usuarios, "
+                f"{res.n_created_shifts} turnos agregados, "
+                f"extraído en {archivo.segundos_extraccion:.2f} s",
+                "info",
+            )
+    _flash_metricas(total.metricas)
+    return redirect(url_for("main.index"))
+
+
+def _previsualiza_turneros(
+    files: list[FileStorage],
+    *,
+    forzar: bool,
+) -> Response | str:
+    """Calcula y muestra los cambios de cada turnero sin aplicarlos.
+
+    La previsualización se hace siempre en la petición, también con
+    UPLOAD_ASYNC, porque el usuario espera el resultado para confirmarlo.
+    """
+    previsualizaciones = []
     for file in files:
+        contenido = file.read()
+        sha256 = hash_contenido(contenido)
+        carga = None if forzar else busca_carga(sha256, TIPO_TURNERO, db.session)
+        if carga:
+            _flash_carga_previa(carga, file.filename)
+            continue
+
         try:
-            res = procesa_turnero(
-                file,
+            cambios = previsualiza_turnero(
+                BytesIO(contenido),
                 db.session,
+                workers=current_app.config["TURNERO_WORKERS"],
+                extractor=current_app.config["TURNERO_EXTRACTOR"],
+                cache=cache_de_config(current_app.config),
             )
-            total = total.incluye(res)
         except ValueError:
             flash(f"Formato de archivo no válido: {file.filename}", "danger")
             return redirect(url_for("main.upload"))
 
-    plural = "s" if len(files) > 1 else ""
-    flash(
-        f"Archivo{plural} cargado{plural} con éxito. "
-        f"Usuarios reconocidos: {total.n_total_users}, "
-        f"turnos agregados: {total.n_created_shifts}",
-        "success",
+        previsualizacion = guarda_previsualizacion(
+            sha256,
+            file.filename or "",
+            cambios,
+            db.session,
+        )
+        previsualizaciones.append((previsualizacion, cambios))
+
+    if not previsualizaciones:
+        return redirect(url_for("main.index"))
+
+    return render_template(
+        "upload_preview.html",
+        previsualizaciones=previsualizaciones,
     )
+
+
+@main.route("/upload/confirm", methods=["POST"])
+@privacy_policy_accepted
+@es_admin
+def upload_confirm() -> Response:
+    """Apply the previewed changes without processing the pdf files again."""
+    vigentes: list[tuple[PrevisualizacionTurnero, CambiosTurnero]] = []
+    for id_previsualizacion in request.form.getlist("ids", type=int):
+        previsualizacion = db.session.get(PrevisualizacionTurnero, id_previsualizacion)
+        if not previsualizacion:
+            flash(
+                "La previsualización ha caducado o ya se aplicó. "
+                "Vuelva a subir el archivo.",
+                "warning",
+            )
+            continue
+
+        # Se comprueban todas antes de aplicar ninguna, porque aplicar una
+        # cambia la versión de los turnos del mes de las demás
+        cambios = CambiosTurnero.de_json(previsualizacion.cambios)
+        if not cambios_vigentes(cambios, db.session):
+            flash(
+                f"Los turnos han cambiado desde la previsualización de "
+                f"{previsualizacion.nombre_archivo}. Vuelva a subir el archivo.",
+                "warning",
+            )
+            db.session.delete(previsualizacion)
+            continue
+        vigentes.append((previsualizacion, cambios))
+    db.session.commit()
+
+    total = ResultadoProcesadoTurnero()
+    for previsualizacion, cambios in vigentes:
+        sha256 = previsualizacion.sha256
+        nombre_archivo = previsualizacion.nombre_archivo
+        # Se borra en la misma transacción en la que se aplican los cambios
+        db.session.delete(previsualizacion)
+        res = aplica_cambios_turnero(cambios, db.session)
+        total = total.incluye(res)
+
+        registra_carga(sha256, TIPO_TURNERO, nombre_archivo, res.resumen(), db.session)
+
+    if vigentes:
+        flash(
+            f"Cambios aplicados. Usuarios reconocidos: {total.n_total_users}, "
+            f"turnos agregados: {total.n_created_shifts}, "
+            f"modificados: {total.n_updated_shifts}, "
+            f"sin cambios: {total.n_existing_shifts}",
+            "success",
+        )
     return redirect(url_for("main.index"))
 
 
+def _encola_turneros(files: list[FileStorage], *, forzar: bool) -> Response:
+    """Guarda los turneros en el spool y los encola para procesarlos."""
+    ids_trabajos = []
+    for file in files:
+        contenido = file.read()
+        sha256 = hash_contenido(contenido)
+        carga = None if forzar else busca_carga(sha256, TIPO_TURNERO, db.session)
+        if carga:
+            _flash_carga_previa(carga, file.filename)
+            continue
+
+        trabajo = crea_trabajo(
+            contenido,
+            file.filename or "",
+            sha256,
+            Path(current_app.config["UPLOAD_SPOOL_DIR"]),
+            db.session,
+        )
+        cola.encola(trabajo.id)
+        ids_trabajos.append(trabajo.id)
+
+    if not ids_trabajos:
+        return redirect(url_for("main.index"))
+
+    flash(f"Archivos en cola de procesado: {len(ids_trabajos)}", "info")
+    return redirect(url_for("main.upload_status", job_id=ids_trabajos[0]))
+
+
+@main.route("/upload/status/<int:job_id>")
+@privacy_policy_accepted
+@es_admin
+def upload_status(job_id: int) -> Response | str:
+    """Show the progress and result of a background upload job.
+
+    Returns JSON with ?format=json or when the client prefers JSON.
+    """
+    trabajo = db.session.get(TrabajoCarga, job_id)
+    if not trabajo:
+        abort(404)
+    if interrumpido(trabajo, cola.timeout):
+        marca_interrumpidos(db.session, cola.timeout)
+        db.session.refresh(trabajo)
+
+    estado = estado_trabajo(trabajo)
+    if (
+        request.args.get("format") == "json"
+        or request.accept_mimetypes.best == "application/json"
+    ):
+        return jsonify(estado)
+
+    recientes = (
+        db.session.query(TrabajoCarga).order_by(TrabajoCarga.id.desc()).limit(10).all()
+    )
+    return render_template(
+        "upload_status.html",
+        trabajo=estado,
+        recientes=[estado_trabajo(t) for t in recientes],
+    )
+
+
 @main.route("/upload_estadillo", methods=["GET", "POST"])
 @privacy_policy_accepted
 def upload_estadillo() -> Response | str:
@@ -336,20 +732,35 @@ def upload_estadillo() -> Response | str:
         flash("No se ha seleccionado un archivo", "danger")
         return redirect(url_for("main.upload_estadillo"))
 
+    contenido = file.read()
+    sha256 = hash_contenido(contenido)
+    if not request.form.get("force"):
+        carga = busca_carga(sha256, TIPO_ESTADILLO, db.session)
+        if carga:
+            _flash_carga_previa(carga, file.filename)
+            return redirect(url_for("main.index"))
+
+    metricas = MetricasCarga(tipo=TIPO_ESTADILLO)
     try:
-        estadillo_db = procesa_estadillo(file, db.session)
-        n_controladores = len(estadillo_db.servicios)
-        n_periodos = sum(len(atc.periodos) for atc in estadillo_db.atcs)
+        estadillo_db = procesa_estadillo(
+            BytesIO(contenido),
+            db.session,
+            metricas=metricas,
+            cache=cache_de_config(current_app.config),
+        )
+        resumen = resumen_estadillo(estadillo_db)
     except ValueError:
         flash("Formato de archivo no válido", "danger")
         return redirect(url_for("main.upload_estadillo"))
 
+    registra_carga(sha256, TIPO_ESTADILLO, file.filename, resumen, db.session)
     flash(
         "Archivo cargado con éxito. "
-        f"Controladores reconocidos: {n_controladores},"
-        f" periodos agregados: {n_periodos}",
+        f"Controladores reconocidos: {resumen['n_controladores']},"
+        f" periodos agregados: {resumen['n_periodos']}",
         "success",
     )
+    _flash_metricas(metricas)
     return redirect(url_for("main.index"))
 
 
@@ -376,12 +787,104 @@ def estadillo() -> Response | str:
         flash("No hay estadillos disponibles.", "info")
         return redirect(url_for("main.index"))
 
+    # La versión se lee antes de generar los datos, como en la caché
+    etag = etag_estadillo(
+        latest_estadillo.id,
+        version_estadillo(
+            latest_estadillo.id,
+            latest_estadillo.dependencia,
+            db.session,
+        ),
+    )
     grupos = genera_datos_estadillo(latest_estadillo, db.session, user=user)
+    # Con ella /events/estadillo avisa si llega otro estadillo antes de conectar
+    version_dependencia = lee_version(
+        db.session,
+        clave_estadillos_de_dependencia(user.dependencia),
+    )
 
     return render_template(
         "estadillo.html",
         grupos=grupos,
+        estadillo=latest_estadillo,
+        user=user,
+        etag=etag,
+        version_dependencia=version_dependencia,
+    )
+
+
+@main.route("/api/estadillo/<int:id_estadillo>")
+@privacy_policy_accepted
+def api_estadillo(id_estadillo: int) -> Response:
+    """Return the groups and periods of an estadillo as JSON.
+
+    The data is the same for every user of the estadillo's dependencia;
+    the page computes the state of each period and the time marker. An
+    estadillo of another dependencia answers 404, like a missing one. The
+    strong ETag comes from the estadillo version, so a poll with a matching
+    If-None-Match gets a 304 without reading the periods.
+    """
+    if "id_atc" not in session:
+        return current_app.response_class(status=401)
+    user = db.session.get(ATC, session["id_atc"])
+    if not user:
+        return current_app.response_class(status=401)
+    dependencia = (
+        db.session.query(Estadillo.dependencia).filter_by(id=id_estadillo).scalar()
+    )
+    if dependencia != user.dependencia:
+        return current_app.response_class(status=404)
+
+    version = version_estadillo(id_estadillo, user.dependencia, db.session)
+    etag = etag_estadillo(id_estadillo, version)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        estadillo = db.session.get(Estadillo, id_estadillo)
+        if not estadillo:
+            return current_app.response_class(status=404)
+        grupos = grupos_fijos(estadillo, db.session)
+        response = jsonify({"id": estadillo.id, "grupos": estadillo_a_json(grupos)})
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@main.route("/events/estadillo")
+@privacy_policy_accepted
+def eventos_estadillo() -> Response:
+    """Stream an event when an estadillo of the user's dependencia is saved.
+
+    Server-Sent Events: the page keeps the connection open and reloads on
+    each event. While waiting the connection does not use the database;
+    the worker's vigilante reads the versions for all its connections.
+    If the worker has too many open connections the answer is a 503 and
+    the page falls back to polling /api/estadillo.
+    """
+    if "id_atc" not in session:
+        return current_app.response_class(status=401)
+    user = db.session.get(ATC, session["id_atc"])
+    if not user:
+        return current_app.response_class(status=401)
+
+    dependencia = user.dependencia
+    version = vigilante.suscribe(dependencia, db.session)
+    if version is None:
+        return current_app.response_class(status=503)
+
+    # El navegador envía Last-Event-ID al reconectar; la página, ?ultima=
+    ultima = request.headers.get("Last-Event-ID") or request.args.get("ultima")
+    response = current_app.response_class(
+        flujo_estadillo(vigilante, dependencia, version, ultima),
+        mimetype="text/event-stream",
     )
+    response.call_on_close(partial(vigilante.baja, dependencia))
+    response.cache_control.no_cache = True
+    # Sin búfer en nginx para que los eventos lleguen al momento
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @main.route("/admin/user_list")
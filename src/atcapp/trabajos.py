@@ -0,0 +1,294 @@
+"""Cola de trabajos de carga en segundo plano.
+
+Procesar un turnero dentro de la petición ocupa uno de los workers de
+gunicorn durante todo el análisis del pdf y puede provocar timeouts en el
+proxy. Con UPLOAD_ASYNC los archivos subidos se guardan en el directorio
+de spool, se registra un TrabajoCarga y la petición termina enseguida.
+
+Los trabajos se ejecutan en un pool de hilos local de cada worker. El
+estado se guarda en la propia base de datos, así que el progreso se puede
+consultar desde cualquier worker sin necesidad de un broker externo.
+"""
+
+from __future__ import annotations
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from sqlalchemy import update
+
+from .cache_analisis import cache_de_config
+from .carga_turnero import EXTRACTOR_TABLA, procesa_turnero
+from .cargas import TIPO_TURNERO, registra_carga
+from .models import TrabajoCarga
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable
+
+    from flask import Flask
+    from sqlalchemy.orm import Session, scoped_session
+
+    from .cache_analisis import CacheAnalisis
+
+logger = getLogger(__name__)
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+TERMINADO = "terminado"
+ERROR = "error"
+
+ESTADOS_FINALES = (TERMINADO, ERROR)
+
+MENSAJE_INTERRUMPIDO = "Trabajo interrumpido. Vuelva a subir el archivo."
+
+
+def _ahora() -> datetime:
+    """Fecha y hora UTC sin zona, como se guardan en la base de datos."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def crea_trabajo(
+    contenido: bytes,
+    nombre_archivo: str,
+    sha256: str,
+    spool_dir: Path,
+    db_session: Session | scoped_session,
+) -> TrabajoCarga:
+    """Guarda el archivo en el spool y registra un trabajo pendiente."""
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    ruta = spool_dir / f"{uuid4().hex}.pdf"
+    ruta.write_bytes(contenido)
+
+    ahora = _ahora()
+    trabajo = TrabajoCarga(
+        tipo=TIPO_TURNERO,
+        nombre_archivo=nombre_archivo,
+        sha256=sha256,
+        ruta=str(ruta),
+        estado=PENDIENTE,
+        paginas_total=0,
+        paginas_procesadas=0,
+        creado=ahora,
+        actualizado=ahora,
+    )
+    db_session.add(trabajo)
+    db_session.commit()
+    logger.info("Trabajo %d creado para %s", trabajo.id, nombre_archivo)
+    return trabajo
+
+
+def _reclama_trabajo(id_trabajo: int, db_session: Session | scoped_session) -> bool:
+    """Pasa el trabajo de pendiente a procesando.
+
+    La actualización es condicional, de forma que si varios workers
+    intentan ejecutar el mismo trabajo solo uno lo consigue.
+    """
+    result = db_session.execute(
+        update(TrabajoCarga)
+        .where(TrabajoCarga.id == id_trabajo, TrabajoCarga.estado == PENDIENTE)
+        .values(estado=PROCESANDO, actualizado=_ahora()),
+    )
+    db_session.commit()
+    return result.rowcount == 1  # type: ignore[attr-defined]
+
+
+def ejecuta_trabajo(
+    id_trabajo: int,
+    db_session: Session | scoped_session,
+    workers: int = 1,
+    extractor: str = EXTRACTOR_TABLA,
+    cache: CacheAnalisis | None = None,
+) -> None:
+    """Procesa el archivo de un trabajo pendiente y guarda su resultado.
+
+    El progreso por página se confirma en la base de datos durante la
+    extracción, antes de que se escriba ningún turno. Si el procesado
+    falla el trabajo queda en estado error y se conserva el archivo.
+    """
+    if not _reclama_trabajo(id_trabajo, db_session):
+        logger.info("Trabajo %d ya reclamado por otro worker", id_trabajo)
+        return
+
+    trabajo = db_session.get(TrabajoCarga, id_trabajo)
+    if not trabajo:
+        return
+
+    def progreso(n_paginas: int, total: int) -> None:
+        trabajo.paginas_procesadas = n_paginas
+        trabajo.paginas_total = total
+        trabajo.actualizado = _ahora()
+        db_session.commit()
+
+    ruta = Path(trabajo.ruta)
+    try:
+        with ruta.open("rb") as file:
+            res = procesa_turnero(
+                file,
+                db_session,
+                workers,
+                progreso,
+                extractor=extractor,
+                cache=cache,
+            )
+        resumen = res.resumen()
+        registra_carga(
+            trabajo.sha256,
+            TIPO_TURNERO,
+            trabajo.nombre_archivo,
+            resumen,
+            db_session,
+        )
+    except Exception as e:
+        logger.exception("Error en el trabajo %d", id_trabajo)
+        db_session.rollback()
+        trabajo.estado = ERROR
+        trabajo.error = (
+            "Formato de archivo no válido" if isinstance(e, ValueError) else str(e)
+        )
+        trabajo.actualizado = _ahora()
+        db_session.commit()
+        return
+
+    trabajo.estado = TERMINADO
+    resultado: dict[str, Any] = dict(resumen)
+    if res.metricas:
+        resultado["metricas"] = res.metricas.a_dict()
+    trabajo.resultado = json.dumps(resultado)
+    trabajo.actualizado = _ahora()
+    db_session.commit()
+    ruta.unlink(missing_ok=True)
+    logger.info("Trabajo %d terminado", id_trabajo)
+
+
+def interrumpido(trabajo: TrabajoCarga, timeout: timedelta) -> bool:
+    """Indica si un trabajo en proceso lleva más de timeout sin progresar.
+
+    El progreso se anota en cada página, así que es un trabajo cuyo worker
+    se detuvo mientras lo procesaba.
+    """
+    return trabajo.estado == PROCESANDO and trabajo.actualizado < _ahora() - timeout
+
+
+def marca_interrumpidos(
+    db_session: Session | scoped_session,
+    timeout: timedelta,
+) -> int:
+    """Pasa a error los trabajos interrumpidos y devuelve cuántos eran.
+
+    Sin esto seguirían en proceso para siempre y la página de estado los
+    consultaría indefinidamente. Se conserva su archivo, como en cualquier
+    otro error.
+    """
+    ahora = _ahora()
+    result = db_session.execute(
+        update(TrabajoCarga)
+        .where(
+            TrabajoCarga.estado == PROCESANDO,
+            TrabajoCarga.actualizado < ahora - timeout,
+        )
+        .values(estado=ERROR, error=MENSAJE_INTERRUMPIDO, actualizado=ahora),
+    )
+    db_session.commit()
+    n_interrumpidos = result.rowcount  # type: ignore[attr-defined]
+    if n_interrumpidos:
+        logger.warning("%d trabajos interrumpidos pasan a error", n_interrumpidos)
+    return n_interrumpidos
+
+
+def estado_trabajo(trabajo: TrabajoCarga) -> dict[str, Any]:
+    """Estado de un trabajo en un diccionario serializable a JSON."""
+    return {
+        "id": trabajo.id,
+        "nombre_archivo": trabajo.nombre_archivo,
+        "estado": trabajo.estado,
+        "terminado": trabajo.estado in ESTADOS_FINALES,
+        "paginas_total": trabajo.paginas_total,
+        "paginas_procesadas": trabajo.paginas_procesadas,
+        "resultado": json.loads(trabajo.resultado) if trabajo.resultado else None,
+        "error": trabajo.error,
+        "creado": trabajo.creado.isoformat(),
+        "actualizado": trabajo.actualizado.isoformat(),
+    }
+
+
+class ColaTrabajos:
+    """Pool local de hilos que ejecuta los trabajos de carga.
+
+    Cada trabajo se ejecuta con su propia sesión de base de datos.
+    """
+
+    executor: ThreadPoolExecutor | None = None
+    session_factory: Callable[[], Session]
+    workers: int = 1
+    extractor: str = EXTRACTOR_TABLA
+    cache: CacheAnalisis | None = None
+    timeout: timedelta = timedelta(minutes=15)
+    """Tiempo sin progreso tras el que un trabajo en proceso se da por interrumpido."""
+
+    def init_app(self, app: Flask, session_factory: Callable[[], Session]) -> None:
+        """Configura la cola a partir de la configuración de la app.
+
+        No reanuda los trabajos pendientes: create_app también se usa en los
+        comandos de flask, que no deben procesar cargas. Lo hace el punto de
+        entrada del servidor web con reanuda_pendientes.
+        """
+        self.session_factory = session_factory
+        self.workers = app.config["TURNERO_WORKERS"]
+        self.extractor = app.config["TURNERO_EXTRACTOR"]
+        self.cache = cache_de_config(app.config)
+        self.timeout = timedelta(seconds=app.config["UPLOAD_JOB_TIMEOUT"])
+        if self.executor is None:
+            # Los hilos se crean al encolar el primer trabajo
+            self.executor = ThreadPoolExecutor(
+                max_workers=app.config["UPLOAD_JOB_THREADS"],
+                thread_name_prefix="atcapp-carga",
+            )
+
+    def encola(self, id_trabajo: int) -> None:
+        """Envía un trabajo al pool."""
+        if self.executor is None:
+            msg = "Cola de trabajos no inicializada."
+            raise RuntimeError(msg)
+        self.executor.submit(self._ejecuta, id_trabajo)
+
+    def reanuda_pendientes(self) -> None:
+        """Encola los trabajos que quedaron pendientes al parar el servidor.
+
+        Antes pasa a error los que quedaron en proceso sin progresar.
+        """
+        session = self.session_factory()
+        try:
+            marca_interrumpidos(session, self.timeout)
+            ids = [
+                id_trabajo
+                for (id_trabajo,) in session.query(TrabajoCarga.id).filter_by(
+                    estado=PENDIENTE,
+                )
+            ]
+        finally:
+            session.close()
+        for id_trabajo in ids:
+            self.encola(id_trabajo)
+
+    def _ejecuta(self, id_trabajo: int) -> None:
+        session = self.session_factory()
+        try:
+            ejecuta_trabajo(
+                id_trabajo,
+                session,
+                self.workers,
+                self.extractor,
+                self.cache,
+            )
+        except Exception:
+            logger.exception("Error inesperado en el trabajo %d", id_trabajo)
+        finally:
+            session.close()
+
+
+cola = ColaTrabajos()
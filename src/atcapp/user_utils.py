@@ -16,7 +16,9 @@ from .name_utils import (
 )
 
 if TYPE_CHECKING:  # pragma: no cover
-    from sqlalchemy.orm import scoped_session
+    from collections.abc import Iterable
+
+    from sqlalchemy.orm import Session, scoped_session
 
 logger = getLogger(__name__)
 
@@ -45,16 +47,56 @@ class AtcTexto:
     email: str | None = None
 
 
+def normaliza_apellidos_nombre(apellidos_nombre: str) -> str:
+    """Forma canónica de "apellidos nombre" para buscar controladores."""
+    return no_extraneous_spaces(fix_encoding(apellidos_nombre))
+
+
+class AtcIndex:
+    """Índice en memoria de controladores por apellidos_nombre normalizado.
+
+    Se construye una vez por carga con una única consulta. Después cada
+    búsqueda es un acceso a diccionario, sin consultas a la base de datos.
+    Los controladores creados durante la carga se añaden con añade.
+    """
+
+    def __init__(self, atcs: Iterable[ATC] = ()) -> None:
+        """Indexa los controladores dados."""
+        self._atcs: dict[str, ATC] = {}
+        for atc in atcs:
+            self.añade(atc)
+
+    @classmethod
+    def carga(cls, db_session: Session | scoped_session) -> AtcIndex:
+        """Construye el índice con todos los controladores de la base de datos."""
+        return cls(db_session.query(ATC))
+
+    def busca(self, apellidos_nombre: str) -> ATC | None:
+        """Busca un controlador por nombre en el formato "apellidos nombre"."""
+        return self._atcs.get(normaliza_apellidos_nombre(apellidos_nombre))
+
+    def añade(self, atc: ATC) -> None:
+        """Añade o sustituye un controlador en el índice."""
+        self._atcs[normaliza_apellidos_nombre(atc.apellidos_nombre)] = atc
+
+    def __len__(self) -> int:
+        """Número de controladores indexados."""
+        return len(self._atcs)
+
+
 def create_user(
     atc_texto: AtcTexto,
-    db_session: scoped_session,
+    db_session: Session | scoped_session,
+    indice: AtcIndex | None = None,
 ) -> ATC:
     """Create a new user in the database.
 
     Args:
     ----
         atc_texto (AtcTexto): The user's data in text form.
-        db_session (scoped_session): The database session.
+        db_session (Session | scoped_session): The database session.
+        indice (AtcIndex | None): If given, the existing user is looked up in
+            the index instead of the database, and the new user is added to it.
 
     Returns:
     -------
@@ -82,7 +124,11 @@ def create_user(
         email = f"{email_name}@example.com"
 
     # Check first whether the user already exists
-    existing_user = find_user(apellidos_nombre, db_session)
+    existing_user = (
+        indice.busca(apellidos_nombre)
+        if indice is not None
+        else find_user(apellidos_nombre, db_session)
+    )
     if existing_user:
         logger.warning(
             "Controlador existente: %s. No creamos uno nuevo con el mismo nombre.",
@@ -102,6 +148,8 @@ def create_user(
     )
     logger.debug("Creando nuevo controlador: %s", new_user)
     db_session.add(new_user)
+    if indice is not None:
+        indice.añade(new_user)
     return new_user
 
 
@@ -119,16 +167,15 @@ def update_user(user: ATC, role: str, equipo: str | None) -> UpdateResult:
 
 def find_user(
     apellidos_nombre: str,
-    db_session: scoped_session,
+    db_session: Session | scoped_session,
 ) -> ATC | None:
     """Find a user in the database by name.
 
     The name is expected to be in the format "apellidos nombre".
     """
     # Find the user in the database by name
-    query = db_session.query(ATC).filter(
-        ATC.apellidos_nombre == fix_encoding(apellidos_nombre),
+    return (
+        db_session.query(ATC)
+        .filter(ATC.apellidos_nombre == fix_encoding(apellidos_nombre))
+        .first()
     )
-    if query.count() > 0:
-        return query.first()
-    return None
@@ -0,0 +1,166 @@
+"""Versiones de los datos derivados que los workers guardan en memoria.
+
+Un worker que guarda en memoria datos calculados a partir de la base de
+datos, como el calendario mensual de un ATC, anota la versión con la que
+los calculó. Antes de reutilizarlos la compara con la de la tabla
+versiones_datos, que cambian las cargas que modifican esos datos. Así las
+cachés de todos los workers se invalidan sin necesidad de un broker.
+
+Una clave sin fila tiene la versión 0.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from sqlalchemy import select
+
+from .database import bulk_upsert
+from .models import VersionDatos
+
+if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterable
+
+    from sqlalchemy.orm import Session, scoped_session
+
+T = TypeVar("T")
+
+
+def clave_atcs(dependencia: str) -> str:
+    """Clave que cambia al crear o modificar controladores de la dependencia."""
+    return f"atcs:{dependencia.upper()}"
+
+
+_ultima_version = 0
+_version_lock = threading.Lock()
+
+
+def nueva_version() -> int:
+    """Versión distinta de todas las anteriores de este proceso.
+
+    Son los nanosegundos actuales, o uno más que la anterior si el reloj
+    no ha avanzado desde entonces.
+    """
+    global _ultima_version  # noqa: PLW0603
+    with _version_lock:
+        _ultima_version = max(time.time_ns(), _ultima_version + 1)
+        return _ultima_version
+
+
+def lee_version(db_session: Session | scoped_session, clave: str) -> int:
+    """Versión actual de una clave."""
+    version = db_session.scalar(
+        select(VersionDatos.version).where(VersionDatos.clave == clave),
+    )
+    return version or 0
+
+
+def lee_version_y_fecha(
+    db_session: Session | scoped_session,
+    clave: str,
+) -> tuple[int, datetime | None]:
+    """Versión actual de una clave y fecha UTC de su último cambio.
+
+    Una clave sin fila tiene la versión 0 y ninguna fecha.
+    """
+    fila = db_session.execute(
+        select(VersionDatos.version, VersionDatos.actualizado).where(
+            VersionDatos.clave == clave,
+        ),
+    ).first()
+    if fila is None:
+        return 0, None
+    return fila.version, fila.actualizado
+
+
+def lee_versiones(
+    db_session: Session | scoped_session,
+    claves: Iterable[str],
+) -> dict[str, int]:
+    """Versión actual de cada clave, con una sola consulta."""
+    claves = set(claves)
+    versiones = dict.fromkeys(claves, 0)
+    if claves:
+        versiones.update(
+            db_session.execute(
+                select(VersionDatos.clave, VersionDatos.version).where(
+                    VersionDatos.clave.in_(claves),
+                ),
+            )
+            .tuples()
+            .all(),
+        )
+    return versiones
+
+
+def cambia_versiones(
+    db_session: Session | scoped_session,
+    claves: Iterable[str],
+) -> None:
+    """Da una versión nueva a las claves, sin hacer commit.
+
+    La versión se escribe en la transacción en curso, de forma que solo
+    cambia si se confirman los datos que la motivan.
+    """
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    version = nueva_version()
+    filas = [
+        {"clave": clave, "version": version, "actualizado": ahora}
+        for clave in sorted(set(claves))
+    ]
+    bulk_upsert(
+        db_session,
+        VersionDatos.__table__,  # type: ignore[arg-type]
+        filas,
+        index_elements=("clave",),
+        update_columns=("version", "actualizado"),
+    )
+
+
+class CacheVersionada(Generic[T]):
+    """Datos derivados guardados en memoria con su versión, con descarte LRU.
+
+    Un dato guardado solo se devuelve si se pide con la misma versión con
+    la que se guardó, normalmente la leída de versiones_datos antes de
+    calcularlo. La versión puede ser un entero o una tupla de enteros si
+    el dato depende de varias claves. Los datos guardados se comparten
+    entre peticiones y no deben modificarse.
+    """
+
+    def __init__(self, max_entradas: int = 2048) -> None:
+        """Crea la caché vacía. Con max_entradas = 0 no guarda nada."""
+        self.max_entradas = max_entradas
+        self._datos: OrderedDict[str, tuple[object, T]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtiene(self, clave: str, version: object) -> T | None:
+        """Devuelve el dato guardado si tiene la versión indicada."""
+        with self._lock:
+            guardado = self._datos.get(clave)
+            if guardado is None or guardado[0] != version:
+                return None
+            self._datos.move_to_end(clave)
+            return guardado[1]
+
+    def guarda(self, clave: str, version: object, dato: T) -> None:
+        """Guarda un dato y descarta los usados hace más tiempo."""
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (version, dato)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def vacia(self) -> None:
+        """Descarta todos los datos."""
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self) -> int:
+        """Número de datos guardados."""
+        return len(self._datos)
@@ -4,5 +4,10 @@ Pensado para que gunicorn tenga la aplicación
 """
 
 from atcapp.app import create_app
+from atcapp.trabajos import cola
 
 app = create_app()
+
+# Solo el servidor web reanuda los trabajos; los comandos de flask no
+if app.config["UPLOAD_ASYNC"]:
+    cola.reanuda_pendientes()
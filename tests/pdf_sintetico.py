@@ -0,0 +1,487 @@
+"""Generador de turneros y estadillos sintéticos en pdf.
+
+Produce archivos con la misma disposición de tablas que los pdf reales, de
+forma que extract_schedule_data, extraer_datos_estadillo y extraer_periodos
+los procesan igual. Sirve para medir cómo escala la carga con N
+controladores, M días y K sectores sin depender de archivos reales.
+
+El pdf se escribe a mano, con líneas y texto en Helvetica, para no añadir
+dependencias. Los nombres y turnos se generan de forma determinista a partir
+de una semilla.
+"""
+
+from __future__ import annotations
+
+import random
+from calendar import monthrange
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from itertools import cycle, product
+
+from atcapp.carga_turnero import MESES
+
+TAMAÑO_FUENTE = 6
+"""Tamaño de letra en puntos."""
+ALTO_FILA = 10
+MARGEN = 20
+
+APELLIDOS = [
+    "GARCIA",
+    "MARTINEZ",
+    "LOPEZ",
+    "SANCHEZ",
+    "PEREZ",
+    "GOMEZ",
+    "MARTIN",
+    "JIMENEZ",
+    "RUIZ",
+    "HERNANDEZ",
+    "DIAZ",
+    "MORENO",
+    "MUÑOZ",
+    "ALVAREZ",
+    "ROMERO",
+    "ALONSO",
+    "GUTIERREZ",
+    "NAVARRO",
+    "TORRES",
+    "DOMINGUEZ",
+    "VAZQUEZ",
+    "RAMOS",
+    "GIL",
+    "RAMIREZ",
+    "SERRANO",
+    "BLANCO",
+    "MOLINA",
+    "MORALES",
+    "SUAREZ",
+    "ORTEGA",
+    "DELGADO",
+    "CASTRO",
+    "ORTIZ",
+    "RUBIO",
+    "MARIN",
+    "NUÑEZ",
+    "IBAÑEZ",
+    "DE LA FUENTE",
+    "DEL RIO",
+    "CABRERA",
+]
+NOMBRES = [
+    "ANTONIO",
+    "MANUEL",
+    "JOSE",
+    "FRANCISCO",
+    "DAVID",
+    "JUAN",
+    "JAVIER",
+    "DANIEL",
+    "CARLOS",
+    "JESUS",
+    "ALEJANDRO",
+    "MIGUEL",
+    "RAFAEL",
+    "PABLO",
+    "PEDRO",
+    "ANGEL",
+    "SERGIO",
+    "FERNANDO",
+    "JORGE",
+    "LUIS",
+    "MARIA",
+    "CARMEN",
+    "ANA",
+    "ISABEL",
+    "LAURA",
+    "CRISTINA",
+    "MARTA",
+    "LUCIA",
+    "ELENA",
+    "PILAR",
+    "SARA",
+    "PAULA",
+    "RAQUEL",
+    "ROSA",
+    "SILVIA",
+    "BEATRIZ",
+    "NURIA",
+    "IRENE",
+    "JOSE LUIS",
+    "MARIA JESUS",
+]
+CATEGORIAS = ["CON", "CON", "CON", "PTD", "IS", "TS", "INS", "TI"]
+SECTORES = ["ASN", "ASV", "CEN", "MAR", "NO1", "SEV", "SUR", "TPR1", "ALM", "GRX"]
+EQUIPOS = "ABCDEFGH"
+LETRAS_DIA = "LMXJVSD"
+
+ROTACION = ["M", "M", "T", "T", "N", "", "", ""]
+"""Ciclo básico de turnos: dos mañanas, dos tardes, una noche y libres."""
+VARIANTES = {
+    "M": ["MB09", "MSup", "MA2", "im", "MC05"],
+    "T": ["TB09", "TSup", "TA2", "it"],
+    "N": ["NB09", "NSup", "in"],
+    "": ["V", "B01"],
+}
+
+DURACION_PERIODO = timedelta(minutes=50)
+INICIO_TURNO = {"M": "07:30", "T": "15:00"}
+FIN_TURNO = {"M": "15:00", "T": "22:30"}
+
+
+def nombres_sinteticos(n: int, semilla: int = 0) -> list[str]:
+    """Genera n nombres distintos en el formato "APELLIDO1 APELLIDO2 NOMBRE"."""
+    combinaciones = list(product(APELLIDOS, APELLIDOS, NOMBRES))
+    if n > len(combinaciones):
+        msg = f"No se pueden generar más de {len(combinaciones)} nombres"
+        raise ValueError(msg)
+    elegidas = random.Random(semilla).sample(combinaciones, n)
+    return [" ".join(partes) for partes in elegidas]
+
+
+@dataclass
+class Celda:
+    """Celda de una fila de tabla, que puede ocupar varias columnas."""
+
+    texto: str = ""
+    columnas: int = 1
+
+
+@dataclass
+class Fila:
+    """Fila de una tabla.
+
+    En las columnas de continua no se dibuja el borde superior, de forma
+    que la celda se une a la de la fila anterior.
+    """
+
+    celdas: list[Celda]
+    continua: set[int] = field(default_factory=set)
+
+
+def _escapa(texto: str) -> bytes:
+    """Cadena literal pdf en WinAnsiEncoding."""
+    crudo = texto.encode("cp1252")
+    return crudo.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class Lienzo:
+    """Contenido de una página. Las coordenadas y crecen hacia abajo."""
+
+    def __init__(self, ancho: float, alto: float) -> None:
+        """Crea una página vacía del tamaño dado en puntos."""
+        self.ancho = ancho
+        self.alto = alto
+        self.operaciones: list[bytes] = [b"0.5 w"]
+
+    def linea(self, x0: float, y0: float, x1: float, y1: float) -> None:
+        """Dibuja una línea recta."""
+        self.operaciones.append(
+            f"{x0:.2f} {self.alto - y0:.2f} m "
+            f"{x1:.2f} {self.alto - y1:.2f} l S".encode(),
+        )
+
+    def texto(self, x: float, y: float, texto: str) -> None:
+        """Escribe texto con la línea base en y."""
+        if not texto:
+            return
+        self.operaciones.append(
+            f"BT /F1 {TAMAÑO_FUENTE} Tf {x:.2f} {self.alto - y:.2f} Td (".encode()
+            + _escapa(texto)
+            + b") Tj ET",
+        )
+
+    def contenido(self) -> bytes:
+        """Flujo de contenido de la página.
+
+        Termina en salto de línea para que el último operador se reconozca.
+        """
+        return b"\n".join(self.operaciones) + b"\n"
+
+
+def dibuja_tabla(
+    lienzo: Lienzo,
+    x: float,
+    y: float,
+    anchos: list[float],
+    filas: list[Fila],
+) -> float:
+    """Dibuja una tabla con bordes en todas las celdas.
+
+    Devuelve la coordenada y del borde inferior de la tabla.
+    """
+    bordes = [x]
+    for ancho in anchos:
+        bordes.append(bordes[-1] + ancho)
+
+    for fila in filas:
+        for col in range(len(anchos)):
+            if col not in fila.continua:
+                lienzo.linea(bordes[col], y, bordes[col + 1], y)
+        col = 0
+        for celda in fila.celdas:
+            lienzo.linea(bordes[col], y, bordes[col], y + ALTO_FILA)
+            lienzo.texto(bordes[col] + 1.5, y + ALTO_FILA - 2.5, celda.texto)
+            col += celda.columnas
+        lienzo.linea(bordes[col], y, bordes[col], y + ALTO_FILA)
+        y += ALTO_FILA
+
+    lienzo.linea(bordes[0], y, bordes[-1], y)
+    return y
+
+
+def escribe_pdf(paginas: list[Lienzo]) -> bytes:
+    """Serializa las páginas en un archivo pdf."""
+    objetos: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, cuando se conozcan los ids de las páginas
+        (
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+            b"/Encoding /WinAnsiEncoding >>"
+        ),
+    ]
+    ids_paginas = []
+    for pagina in paginas:
+        contenido = pagina.contenido()
+        objetos.append(
+            b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"endstream",
+        )
+        objetos.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R "
+                f"/MediaBox [0 0 {pagina.ancho:.2f} {pagina.alto:.2f}] "
+                f"/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {len(objetos)} 0 R >>"
+            ).encode(),
+        )
+        ids_paginas.append(len(objetos))
+    kids = " ".join(f"{i} 0 R" for i in ids_paginas)
+    objetos[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(paginas)} >>".encode()
+
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for i, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n" % i + objeto + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for posicion in posiciones:
+        salida += b"%010d 00000 n \n" % posicion
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objetos) + 1)
+    salida += b"startxref\n%d\n%%%%EOF\n" % inicio_xref
+    return bytes(salida)
+
+
+def _turnos_de_controlador(
+    indice: int,
+    n_dias: int,
+    rng: random.Random,
+) -> list[str]:
+    """Códigos de turno de un controlador para cada día del mes."""
+    turnos = []
+    for dia in range(n_dias):
+        codigo = ROTACION[(dia + indice) % len(ROTACION)]
+        if rng.random() < 0.3:
+            codigo = rng.choice(VARIANTES[codigo])
+        turnos.append(codigo)
+    # Siempre al menos un turno válido para que la fila se reconozca
+    turnos[0] = turnos[0] or "M"
+    return turnos
+
+
+def genera_turnero(  # noqa: PLR0913
+    n_controladores: int,
+    *,
+    año: int = 2024,
+    mes: int = 6,
+    n_dias: int | None = None,
+    dependencia: str = "LECS",
+    filas_por_pagina: int = 50,
+    semilla: int = 0,
+) -> bytes:
+    """Genera un turnero mensual con n_controladores.
+
+    Cada página corresponde a un equipo. Solo los n_dias primeros días
+    del mes tienen turnos; por defecto todos.
+    """
+    rng = random.Random(semilla)
+    dias_mes = monthrange(año, mes)[1]
+    n_dias = dias_mes if n_dias is None else min(n_dias, dias_mes)
+    nombre_mes = next(nombre for nombre, num in MESES.items() if num == mes)
+    nombres = nombres_sinteticos(n_controladores, semilla)
+
+    anchos = [170.0, 28.0] + [22.0] * dias_mes + [40.0]
+    ancho_pagina = sum(anchos) + 2 * MARGEN
+    alto_pagina = MARGEN * 2 + 30 + (filas_por_pagina + 3) * ALTO_FILA
+
+    paginas = []
+    for n_pagina, inicio in enumerate(range(0, n_controladores, filas_por_pagina)):
+        equipo = EQUIPOS[n_pagina % len(EQUIPOS)]
+        lienzo = Lienzo(ancho_pagina, alto_pagina)
+        lienzo.texto(MARGEN, MARGEN + 8, f"{dependencia} - CONTROLADORES")
+        lienzo.texto(MARGEN, MARGEN + 18, "PROGRAMACIÓN MENSUAL DE TURNOS")
+
+        primer_dia = date(año, mes, 1).weekday()
+        filas = [
+            Fila(
+                [
+                    Celda(
+                        f"EQUIPO: {equipo} Mes: {nombre_mes} Año: {año}",
+                        len(anchos),
+                    ),
+                ],
+            ),
+            Fila(
+                [Celda(), Celda()]
+                + [Celda(LETRAS_DIA[(primer_dia + d) % 7]) for d in range(dias_mes)]
+                + [Celda("HORAS")],
+            ),
+            Fila(
+                [Celda(), Celda("Categ.")]
+                + [Celda(str(d)) for d in range(1, dias_mes + 1)]
+                + [Celda()],
+            ),
+        ]
+        for i, nombre in enumerate(
+            nombres[inicio : inicio + filas_por_pagina],
+            start=inicio,
+        ):
+            turnos = _turnos_de_controlador(i, n_dias, rng)
+            turnos += [""] * (dias_mes - n_dias)
+            filas.append(
+                Fila(
+                    [Celda(nombre), Celda(rng.choice(CATEGORIAS))]
+                    + [Celda(turno) for turno in turnos]
+                    + [Celda("00:00:00")],
+                ),
+            )
+        dibuja_tabla(lienzo, MARGEN, MARGEN + 30, anchos, filas)
+        paginas.append(lienzo)
+
+    return escribe_pdf(paginas)
+
+
+def _reparte_sectores(n_sectores: int) -> list[list[str]]:
+    """Agrupa los sectores de dos en dos, como las configuraciones reales."""
+    nombres = SECTORES[:n_sectores] + [
+        f"X{k:02d}" for k in range(n_sectores - len(SECTORES))
+    ]
+    return [nombres[i : i + 2] for i in range(0, len(nombres), 2)]
+
+
+def _horas_de_turno(turno: str) -> list[str]:
+    """Horas de inicio de los periodos de un turno."""
+    hora = datetime.strptime(INICIO_TURNO[turno], "%H:%M")  # noqa: DTZ007
+    fin = datetime.strptime(FIN_TURNO[turno], "%H:%M")  # noqa: DTZ007
+    horas = []
+    while hora < fin:
+        horas.append(hora.strftime("%H:%M"))
+        hora += DURACION_PERIODO
+    return horas
+
+
+def genera_estadillo(  # noqa: PLR0913
+    n_controladores: int,
+    n_sectores: int,
+    *,
+    fecha: date = date(2024, 5, 27),
+    turno: str = "M",
+    dependencia: str = "LECS",
+    semilla: int = 0,
+) -> bytes:
+    """Genera un estadillo diario con n_controladores en n_sectores.
+
+    La primera página lista el personal y los sectores de cada controlador.
+    La segunda tiene una tabla de periodos por cada grupo de sectores.
+    """
+    nombres = nombres_sinteticos(n_controladores + 5, semilla)
+    jefes, tca, supervisores = nombres[:2], nombres[2], nombres[3:5]
+    controladores = nombres[5:]
+    rng = random.Random(semilla)
+    grupos = _reparte_sectores(n_sectores)
+    por_grupo = -(-n_controladores // len(grupos))
+
+    # Primera página
+    anchos = [70.0, 30.0, 170.0, 28.0, 20.0, 35.0, 35.0, 35.0, 170.0]
+    filas = [
+        Fila([Celda(f"{dependencia} {fecha:%d.%m.%Y} {turno}", 9)]),
+        Fila([Celda("JEFES DE SALA", 2), Celda(jefes[0], 3), Celda(jefes[1], 4)]),
+        Fila([Celda("TCA", 2), Celda(tca, 3), Celda("", 4)]),
+        Fila([Celda("ANOTACIONES", 2), Celda("", 7)]),
+        Fila(
+            [
+                Celda("SUPERVISORES", 2),
+                Celda(supervisores[0], 3),
+                Celda(supervisores[1], 4),
+            ],
+        ),
+        Fila(
+            [
+                Celda("ESTADILLO"),
+                Celda("LÍNEA"),
+                Celda("CONTROLADOR"),
+                Celda("HAB"),
+                Celda("IP"),
+                Celda("Sectores", 2),
+                Celda(),
+                Celda("Comentarios"),
+            ],
+        ),
+    ]
+    asignacion: list[tuple[str, list[str]]] = []
+    for n_grupo, sectores in enumerate(grupos):
+        miembros = controladores[n_grupo * por_grupo : (n_grupo + 1) * por_grupo]
+        for i, nombre in enumerate(miembros):
+            propios = [sectores[i % len(sectores)], sectores[(i + 1) % len(sectores)]]
+            asignacion.append((nombre, sectores))
+            filas.append(
+                Fila(
+                    [
+                        Celda(f"{len(sectores)}x{len(miembros)}" if i == 0 else ""),
+                        Celda(f"C{i + 1}"),
+                        Celda(nombre),
+                        Celda(rng.choice(CATEGORIAS)),
+                        Celda(),
+                        Celda(propios[0]),
+                        Celda(propios[1] if propios[1] != propios[0] else ""),
+                        Celda(),
+                        Celda(),
+                    ],
+                    continua={0} if i else set(),
+                ),
+            )
+    alto = 2 * MARGEN + len(filas) * ALTO_FILA
+    pagina1 = Lienzo(sum(anchos) + 2 * MARGEN, alto)
+    dibuja_tabla(pagina1, MARGEN, MARGEN, anchos, filas)
+
+    # Segunda página: dos filas por controlador, funciones y horas de inicio
+    horas = _horas_de_turno(turno)
+    anchos = [170.0] + [36.0] * len(horas)
+    tablas: list[list[Fila]] = []
+    for n_grupo, sectores in enumerate(grupos):
+        tabla = []
+        miembros = asignacion[n_grupo * por_grupo : (n_grupo + 1) * por_grupo]
+        for i, (nombre, _) in enumerate(miembros):
+            funciones = cycle(["E", "P", ""])
+            sector = cycle(sectores)
+            for _ in range(i % 3):
+                next(funciones)
+            fila_funciones = [Celda(nombre)]
+            for _ in horas:
+                funcion = next(funciones)
+                texto = f"{funcion}-{next(sector)}" if funcion else ""
+                fila_funciones.append(Celda(texto))
+            tabla.append(Fila(fila_funciones))
+            tabla.append(
+                Fila([Celda()] + [Celda(hora) for hora in horas], continua={0}),
+            )
+        if tabla:
+            tablas.append(tabla)
+
+    separacion = 15
+    alto = 2 * MARGEN + sum(len(t) * ALTO_FILA + separacion for t in tablas)
+    pagina2 = Lienzo(sum(anchos) + 2 * MARGEN, alto)
+    y = float(MARGEN)
+    for tabla in tablas:
+        y = dibuja_tabla(pagina2, MARGEN, y, anchos, tabla) + separacion
+
+    return escribe_pdf([pagina1, pagina2])
@@ -0,0 +1,139 @@
+"""Verifica la caché en disco de los datos extraídos de los pdf."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from atcapp.cache_analisis import CacheAnalisis, cache_de_config
+from atcapp.carga_estadillo import (
+    estadillo_a_cache,
+    estadillo_de_cache,
+    extraer_datos_estadillo,
+    extraer_periodos,
+    incorporar_periodos,
+)
+from atcapp.carga_historica import analiza_archivo
+from atcapp.carga_turnero import extrae_turnero, procesa_turnero
+from atcapp.cargas import TIPO_ESTADILLO, TIPO_TURNERO, hash_contenido
+from atcapp.metricas import MetricasCarga
+
+if TYPE_CHECKING:
+    from contextlib import AbstractContextManager
+
+    import pytest
+    from pdfplumber import PDF
+    from sqlalchemy.orm import scoped_session
+
+TURNERO = Path(__file__).parent / "resources" / "test_turnero.pdf"
+ESTADILLO = Path(__file__).parent / "resources" / "test_estadillo.pdf"
+
+
+def _sin_pdfplumber(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Hace fallar cualquier intento de abrir un pdf."""
+
+    def falla(*_: object) -> None:
+        raise AssertionError
+
+    monkeypatch.setattr("pdfplumber.open", falla)
+
+
+def test_turnero_desde_cache(
+    session: scoped_session,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """La segunda carga de un turnero no abre el pdf."""
+    cache = CacheAnalisis(tmp_path)
+    with TURNERO.open("rb") as file:
+        res = procesa_turnero(file, session, cache=cache)
+    assert len(list(tmp_path.glob("turnero-*.json"))) == 1
+
+    _sin_pdfplumber(monkeypatch)
+    with TURNERO.open("rb") as file:
+        recarga = procesa_turnero(file, session, cache=cache)
+
+    assert recarga.n_total_users == res.n_total_users
+    assert recarga.n_existing_shifts == res.n_created_shifts
+    assert recarga.metricas is not None
+    assert recarga.metricas.paginas == 0
+
+
+def test_turnero_sin_cache_mide_la_extraccion_una_vez(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Si el turnero no está en la caché, la etapa de extracción se abre una vez."""
+    metricas = MetricasCarga(tipo=TIPO_TURNERO)
+    etapa = metricas.etapa
+    etapas: list[str] = []
+
+    def cuenta(nombre: str) -> AbstractContextManager[None]:
+        etapas.append(nombre)
+        return etapa(nombre)
+
+    monkeypatch.setattr(metricas, "etapa", cuenta)
+    cache = CacheAnalisis(tmp_path)
+    extrae_turnero(TURNERO.read_bytes(), metricas=metricas, cache=cache)
+
+    assert etapas == ["extraccion"]
+    assert metricas.paginas > 0
+
+
+def test_estadillo_ida_y_vuelta(pdf_estadillo: PDF) -> None:
+    """Los datos del estadillo se reconstruyen igual desde el JSON."""
+    data = extraer_datos_estadillo(pdf_estadillo.pages[0])
+    incorporar_periodos(data, extraer_periodos(pdf_estadillo.pages[1]))
+
+    guardados = json.loads(json.dumps(estadillo_a_cache(data)))
+
+    assert estadillo_de_cache(guardados) == data
+
+
+def test_analiza_archivo_con_cache(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """La carga histórica reutiliza la caché sin abrir el pdf."""
+    cache = CacheAnalisis(tmp_path)
+    sha256 = hash_contenido(ESTADILLO.read_bytes())
+    analizado = analiza_archivo(ESTADILLO, sha256, cache)
+
+    _sin_pdfplumber(monkeypatch)
+    recargado = analiza_archivo(ESTADILLO, sha256, cache)
+
+    assert recargado.error == ""
+    assert recargado.tipo == TIPO_ESTADILLO
+    assert recargado.fecha == analizado.fecha
+    assert recargado.datos == analizado.datos
+
+
+def test_recorta_por_tamaño(tmp_path: Path) -> None:
+    """Al superar el tamaño se borran los archivos usados hace más tiempo."""
+    datos = {"x": "a" * 100}
+    cache = CacheAnalisis(tmp_path, max_bytes=250)
+    for i, sha256 in enumerate(("a", "b")):
+        cache.guarda("turnero", 1, sha256, datos)
+        os.utime(cache.ruta("turnero", 1, sha256), (i, i))
+
+    # Leer "a" la marca como usada, así que se descarta "b"
+    assert cache.lee("turnero", 1, "a") == datos
+    cache.guarda("turnero", 1, "c", datos)
+
+    assert cache.lee("turnero", 1, "b") is None
+    assert cache.lee("turnero", 1, "a") == datos
+    assert cache.lee("turnero", 1, "c") == datos
+    assert cache.tamaño() <= 250
+
+
+def test_archivo_dañado_y_config(tmp_path: Path) -> None:
+    """Un archivo dañado se descarta y la caché vacía se desactiva."""
+    cache = cache_de_config({"CACHE_ANALISIS_DIR": str(tmp_path)})
+    assert cache is not None
+    cache.ruta("estadillo", 1, "x").write_text("{roto")
+
+    assert cache.lee("estadillo", 1, "x") is None
+    assert not cache.ruta("estadillo", 1, "x").exists()
+    assert cache_de_config({"CACHE_ANALISIS_DIR": ""}) is None
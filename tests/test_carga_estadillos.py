@@ -3,19 +3,29 @@
 from __future__ import annotations
 
 from datetime import date, datetime, timezone
+from io import BytesIO
 from typing import TYPE_CHECKING
+from unittest.mock import MagicMock
 
+import pdfplumber
 import pytest
 import pytz
 from atcapp import get_timezone
 from atcapp.carga_estadillo import (
+    PAGINA_PERIODOS,
+    PAGINA_PERSONAL,
     EstadilloTexto,
+    PlantillaEstadillo,
     extraer_datos_estadillo,
     extraer_periodos,
     guardar_datos_estadillo,
+    incorporar_periodos,
     procesa_estadillo,
     string_to_utc_datetime,
+    tablas_de_pagina,
+    vacia_plantillas,
 )
+from atcapp.estadillos import estadillos_fijos, genera_datos_estadillo
 from atcapp.models import (
     ATC,
     Estadillo,
@@ -24,6 +34,9 @@ from atcapp.models import (
     Servicio,
 )
 from atcapp.user_utils import find_user
+from sqlalchemy import event
+
+from .pdf_sintetico import genera_estadillo
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -349,3 +362,148 @@ def test_horas_guardadas_en_utc(
         assert (
             hora_fin_local.time() == periodo.hora_fin_utc.astimezone(tz).time()
         ), f"hora_fin {hora_fin_local} difere de la esperada {hora_fin_local}"
+
+
+def test_reconciliacion_solo_cambia_lo_modificado(
+    pdf_estadillo: PDF,
+    session: scoped_session,
+    estadillo_path: Path,
+) -> None:
+    """Comprobar que reemplazar un estadillo conserva las filas que no cambian."""
+    session = session()
+    with estadillo_path.open("rb") as file:
+        estadillo = procesa_estadillo(file, session)
+    ids_periodos = {p.id for p in estadillo.periodos}
+    n_servicios = len(estadillo.servicios)
+
+    data = extraer_datos_estadillo(pdf_estadillo.pages[0])
+    incorporar_periodos(data, extraer_periodos(pdf_estadillo.pages[1]))
+    eliminado = data.controladores.pop("ASENSIO GONZALEZ JUAN CARLOS")
+    modificado = next(
+        c
+        for c in data.controladores.values()
+        if c.periodos and c.periodos[0].funcion != "DESCANSO"
+    )
+    modificado.periodos[0].funcion = "DESCANSO"
+
+    estadillo2 = guardar_datos_estadillo(data, session, get_timezone("LECS"))
+
+    assert estadillo2.id == estadillo.id
+    assert len(estadillo2.servicios) == n_servicios - 1
+    ids_periodos2 = {p.id for p in estadillo2.periodos}
+    assert ids_periodos2 <= ids_periodos
+    assert len(ids_periodos - ids_periodos2) == len(eliminado.periodos)
+
+    user = find_user(modificado.nombre, session)
+    assert user
+    primer_periodo = min(
+        (p for p in estadillo2.periodos if p.id_controlador == user.id),
+        key=lambda p: p.hora_inicio,
+    )
+    assert primer_periodo.actividad == "D"
+    assert primer_periodo.id_sector is None
+
+
+def test_reconciliacion_con_hora_de_inicio_cambiada(
+    pdf_estadillo: PDF,
+    session: scoped_session,
+    estadillo_path: Path,
+) -> None:
+    """Un periodo cuya hora de inicio cambia se muestra en su sitio.
+
+    El periodo cambiado se inserta como fila nueva, con un id mayor que los
+    periodos posteriores del mismo controlador.
+    """
+    session = session()
+    with estadillo_path.open("rb") as file:
+        procesa_estadillo(file, session)
+
+    data = extraer_datos_estadillo(pdf_estadillo.pages[0])
+    incorporar_periodos(data, extraer_periodos(pdf_estadillo.pages[1]))
+    controlador = data.controladores["DOFORNO CASTILLO M PILAR"]
+    assert controlador.periodos[0].hora_inicio == "07:30"
+    controlador.periodos[0].hora_inicio = "07:35"
+    estadillo = guardar_datos_estadillo(data, session, get_timezone("LECS"))
+
+    estadillos_fijos.vacia()
+    grupos = genera_datos_estadillo(estadillo, session)
+    atc = next(
+        atc
+        for grupo in grupos
+        for atc in grupo.atcs
+        if atc.nombre.upper().startswith("M PILAR")
+    )
+    horas = [periodo.hora_inicio for periodo in atc.periodos]
+    assert horas == sorted(horas)
+    assert horas[0] == "07:35"
+
+
+def test_sustitucion_en_una_transaccion(
+    session: scoped_session,
+    estadillo_path: Path,
+) -> None:
+    """Comprobar que sin reconciliar se reinserta todo con un solo commit."""
+    session = session()
+    with estadillo_path.open("rb") as file:
+        estadillo = procesa_estadillo(file, session)
+    n_periodos = len(estadillo.periodos)
+    n_servicios = len(estadillo.servicios)
+    n_sectores = session.query(Sector).count()
+
+    commits: list[None] = []
+    sentencias: list[str] = []
+    event.listen(session, "after_commit", lambda _s: commits.append(None))
+    event.listen(
+        session.connection(),
+        "before_cursor_execute",
+        lambda _c, _cur, sql, *_a: sentencias.append(sql),
+    )
+    with estadillo_path.open("rb") as file:
+        estadillo2 = procesa_estadillo(file, session, reconciliar=False)
+
+    assert len(commits) == 1
+    assert sum(sql.startswith("INSERT INTO periodos") for sql in sentencias) == 1
+    assert len(estadillo2.periodos) == n_periodos
+    assert len(estadillo2.servicios) == n_servicios
+    assert session.query(Sector).count() == n_sectores
+    assert session.query(Estadillo).count() == 1
+
+
+def test_plantilla_igual_que_find_tables(pdf_estadillo: PDF) -> None:
+    """La plantilla de cada página extrae las mismas tablas que extract_table."""
+    with pdfplumber.open(BytesIO(genera_estadillo(12, 5))) as pdf_sintetico:
+        for pdf in (pdf_estadillo, pdf_sintetico):
+            page1, page2 = pdf.pages[0], pdf.pages[1]
+            esperada = [page1.extract_table()]
+            esperadas = page2.extract_tables()
+            vacia_plantillas()
+            tablas_de_pagina(page1, PAGINA_PERSONAL)
+            tablas_de_pagina(page2, PAGINA_PERIODOS)
+
+            # Con la plantilla guardada ya no se buscan las tablas
+            page1.find_tables = MagicMock(side_effect=AssertionError)  # type: ignore[method-assign]
+            page2.find_tables = MagicMock(side_effect=AssertionError)  # type: ignore[method-assign]
+            try:
+                assert tablas_de_pagina(page1, PAGINA_PERSONAL) == esperada
+                assert tablas_de_pagina(page2, PAGINA_PERIODOS) == esperadas
+            finally:
+                del page1.find_tables, page2.find_tables
+
+
+def test_plantilla_no_valida(
+    pdf_estadillo: PDF,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Si la plantilla no valida se buscan las tablas y se sustituye."""
+    page = pdf_estadillo.pages[0]
+    vacia_plantillas()
+    vacia = PlantillaEstadillo(tablas=((((0.0, 0.0, 1.0, 1.0),),),))
+    with monkeypatch.context() as m:
+        m.setattr(PlantillaEstadillo, "de_tablas", classmethod(lambda _c, _t: vacia))
+        tablas_de_pagina(page, PAGINA_PERSONAL)
+
+    find_tables = MagicMock(wraps=page.find_tables)
+    monkeypatch.setattr(page, "find_tables", find_tables)
+    assert tablas_de_pagina(page, PAGINA_PERSONAL) == [page.extract_table()]
+    assert tablas_de_pagina(page, PAGINA_PERSONAL) == [page.extract_table()]
+    assert find_tables.call_count == 1
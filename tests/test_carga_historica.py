@@ -0,0 +1,97 @@
+"""Verifica la carga masiva de archivos históricos."""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+from atcapp.carga_historica import analiza_archivo, busca_pdfs, carga_directorio
+from atcapp.carga_turnero import EXTRACTOR_POSICIONES
+from atcapp.cargas import TIPO_ESTADILLO, TIPO_TURNERO
+from atcapp.commands import backfill
+from atcapp.models import Base, Carga, Estadillo, Turno
+from click.testing import CliRunner
+from sqlalchemy import create_engine, func, select
+
+# Los fixtures turnero_path y estadillo_path sustituyen pdfplumber.open,
+# así que aquí se usan los archivos directamente
+TURNERO = Path(__file__).parent / "resources" / "test_turnero.pdf"
+ESTADILLO = Path(__file__).parent / "resources" / "test_estadillo.pdf"
+
+
+def _archivo(tmp_path: Path) -> Path:
+    """Directorio con un turnero, un estadillo, un duplicado y un pdf roto."""
+    archivo = tmp_path / "archivo"
+    (archivo / "2024").mkdir(parents=True)
+    shutil.copy(TURNERO, archivo / "2024" / "turnero.pdf")
+    shutil.copy(TURNERO, archivo / "2024" / "turnero_copia.PDF")
+    shutil.copy(ESTADILLO, archivo / "estadillo.pdf")
+    (archivo / "roto.pdf").write_bytes(b"esto no es un pdf")
+    (archivo / "notas.txt").write_text("no es un pdf")
+    return archivo
+
+
+def test_analiza_archivo() -> None:
+    """Comprueba que cada pdf se clasifica por su primera página."""
+    turnero = analiza_archivo(TURNERO, "x")
+    estadillo = analiza_archivo(ESTADILLO, "y")
+
+    assert turnero.tipo == TIPO_TURNERO
+    assert turnero.fecha.day == 1
+    assert estadillo.tipo == TIPO_ESTADILLO
+    assert estadillo.fecha.isoformat() == "2024-05-27"
+    assert estadillo.orden < turnero.orden
+
+
+def test_analiza_archivo_con_extractor() -> None:
+    """Los turneros se extraen con el extractor indicado, como al subirlos."""
+    tabla = analiza_archivo(TURNERO, "x")
+    posiciones = analiza_archivo(TURNERO, "x", extractor=EXTRACTOR_POSICIONES)
+    otro = analiza_archivo(TURNERO, "x", extractor="otro")
+
+    assert posiciones.datos == tabla.datos
+    assert "desconocido" in otro.error
+
+
+def test_carga_directorio(tmp_path: Path) -> None:
+    """Comprueba la carga, los errores y que una segunda pasada no repite nada."""
+    archivo = _archivo(tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'historico.db'}")
+    Base.metadata.create_all(engine)
+
+    assert len(busca_pdfs(archivo)) == 4
+
+    resumen = carga_directorio(archivo, engine, lote=1)
+
+    assert resumen.n_encontrados == 4
+    assert resumen.n_ya_cargados == 1  # La copia del turnero
+    assert resumen.n_cargados == 2
+    assert resumen.n_errores == 1
+    assert "roto.pdf" in resumen.errores[0]
+    assert resumen.n_filas > 0
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(Carga)) == 2
+        assert connection.scalar(select(func.count()).select_from(Estadillo)) == 1
+        n_turnos = connection.scalar(select(func.count()).select_from(Turno))
+    assert n_turnos
+
+    resumen = carga_directorio(archivo, engine)
+
+    assert resumen.n_ya_cargados == 3
+    assert resumen.n_cargados == 0
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(Turno)) == n_turnos
+
+
+def test_backfill(tmp_path: Path) -> None:
+    """Comprueba el comando backfill y su informe de rendimiento."""
+    archivo = _archivo(tmp_path)
+    db_uri = f"sqlite:///{tmp_path / 'historico.db'}"
+    Base.metadata.create_all(create_engine(db_uri))
+
+    result = CliRunner().invoke(backfill, [str(archivo), db_uri, "-w", "1"])
+
+    assert result.exit_code == 0
+    assert "Cargados: 2" in result.output
+    assert "archivos/s" in result.output
+    assert "filas/s" in result.output
@@ -3,15 +3,47 @@
 from __future__ import annotations
 
 import re
+from datetime import date
+from io import BytesIO
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+import pdfplumber
 import pytest
-from atcapp.models import ATC, Turno
+from atcapp.carga_turnero import (
+    EXTRACTOR_POSICIONES,
+    EXTRACTOR_TABLA,
+    ArchivoTurnero,
+    CambiosTurnero,
+    DatosTurnero,
+    ResultadoProcesadoTurnero,
+    ScheduleEntry,
+    aplica_cambios_turnero,
+    calcula_cambios_turnero,
+    cambios_vigentes,
+    extract_schedule_data,
+    extrae_pagina,
+    extraer_en_paralelo,
+    fechas_de_turnos,
+    insert_shift_data,
+    plantilla_del_extractor,
+    procesa_turnero,
+    procesa_turneros,
+    reparte_paginas,
+    resuelve_mes,
+)
+from atcapp.models import ATC, Carga, PrevisualizacionTurnero, Turno
+from atcapp.versiones import clave_atcs, lee_version
+from sqlalchemy import event
+
+from .pdf_sintetico import genera_turnero
 
 if TYPE_CHECKING:
     from atcapp.database import DB
     from flask.testing import FlaskClient
+    from pdfplumber import PDF
+    from pytest_mock import MockerFixture
+    from sqlalchemy.orm import scoped_session
 
 # Assuming your fixtures are in conftest.py as shown before
 
@@ -77,7 +109,7 @@ def test_upload_admin_post(
     with turnero_path.open("rb") as file:
         response = client.post(
             "/upload",
-            data={"files": (file, "turnero.pdf")},
+            data={"files": (file, "turnero.pdf"), "force": "1"},
             content_type="multipart/form-data",
             follow_redirects=True,
         )
@@ -87,6 +119,38 @@ def test_upload_admin_post(
     assert user.categoria == "TS"
 
 
+@pytest.mark.usefixtures("_verify_admin_id_token_mock")
+def test_upload_mismo_archivo_no_se_reprocesa(
+    client: FlaskClient,
+    admin_user: ATC,
+    turnero_path: Path,
+    mocker: MockerFixture,
+) -> None:
+    """Comprobar que un archivo ya cargado se resuelve con el resumen guardado."""
+    client.post("/login", data={"idToken": "test_token"})
+
+    with turnero_path.open("rb") as file:
+        client.post(
+            "/upload",
+            data={"files": (file, "turnero.pdf")},
+            content_type="multipart/form-data",
+        )
+
+    procesa_turneros = mocker.patch("atcapp.routes.procesa_turneros")
+    with turnero_path.open("rb") as file:
+        response = client.post(
+            "/upload",
+            data={"files": (file, "turnero.pdf")},
+            content_type="multipart/form-data",
+            follow_redirects=True,
+        )
+
+    procesa_turneros.assert_not_called()
+    assert "ya se cargó".encode() in response.data
+    users, _ = extract_users_and_shifts_inserted(response.data)
+    assert users == 20
+
+
 @pytest.mark.usefixtures("_verify_admin_id_token_mock")
 def test_upload_post_invalid_file(
     client: FlaskClient,
@@ -109,3 +173,369 @@ def test_upload_post_invalid_file(
 
     assert response.status_code == 200
     assert "Formato de archivo no válido".encode() in response.data
+
+
+@pytest.mark.usefixtures("_verify_admin_id_token_mock")
+def test_upload_previsualizar_y_confirmar(
+    client: FlaskClient,
+    admin_user: ATC,
+    session: scoped_session,
+    turnero_path: Path,
+    mocker: MockerFixture,
+) -> None:
+    """Comprobar que la previsualización no escribe y la confirmación no reprocesa."""
+    client.post("/login", data={"idToken": "test_token"})
+
+    with turnero_path.open("rb") as file:
+        response = client.post(
+            "/upload",
+            data={"files": (file, "turnero.pdf"), "preview": "1"},
+            content_type="multipart/form-data",
+        )
+
+    assert response.status_code == 200
+    assert "Previsualización de la carga".encode() in response.data
+    assert b"Turnos nuevos: <strong>445</strong>" in response.data
+    assert session.query(Turno).count() == 0
+    previsualizacion = session.query(PrevisualizacionTurnero).one()
+
+    extrae_turnero = mocker.patch("atcapp.carga_turnero.extrae_turnero")
+    response = client.post(
+        "/upload/confirm",
+        data={"ids": previsualizacion.id},
+        follow_redirects=True,
+    )
+
+    extrae_turnero.assert_not_called()
+    assert b"Cambios aplicados" in response.data
+    users, shifts = extract_users_and_shifts_inserted(response.data)
+    assert (users, shifts) == (20, 445)
+    assert session.query(Turno).count() == 445
+    assert session.query(PrevisualizacionTurnero).count() == 0
+
+    # La misma previsualización no se puede aplicar dos veces
+    response = client.post(
+        "/upload/confirm",
+        data={"ids": previsualizacion.id},
+        follow_redirects=True,
+    )
+    assert "ya se aplicó".encode() in response.data
+
+
+@pytest.mark.usefixtures("_verify_admin_id_token_mock")
+def test_upload_confirmar_previsualizacion_caducada(
+    client: FlaskClient,
+    admin_user: ATC,
+    session: scoped_session,
+    turnero_path: Path,
+) -> None:
+    """Si los turnos del mes cambian tras previsualizar, no se aplican los cambios."""
+    client.post("/login", data={"idToken": "test_token"})
+    with turnero_path.open("rb") as file:
+        client.post(
+            "/upload",
+            data={"files": (file, "turnero.pdf"), "preview": "1"},
+            content_type="multipart/form-data",
+        )
+    previsualizacion = session.query(PrevisualizacionTurnero).one()
+    cambios = CambiosTurnero.de_json(previsualizacion.cambios)
+    year, month = resuelve_mes(cambios.datos_turnero.mes, cambios.datos_turnero.año)
+    insert_shift_data([(admin_user, ["V"])], year, month, session)
+    session.commit()
+
+    response = client.post(
+        "/upload/confirm",
+        data={"ids": previsualizacion.id},
+        follow_redirects=True,
+    )
+
+    assert b"Los turnos han cambiado" in response.data
+    assert session.query(Turno).count() == 1
+    assert session.query(PrevisualizacionTurnero).count() == 0
+
+
+def test_cambios_turnero(session: scoped_session) -> None:
+    """Comprobar el cálculo de cambios con una sola lectura y su aplicación."""
+    user = ATC(
+        email="cambios@example.com",
+        apellidos_nombre="CAMBIOS PRUEBA ANA",
+        nombre="Ana",
+        apellidos="Cambios Prueba",
+        dependencia="LECS",
+    )
+    session.add(user)
+    session.flush()
+    insert_shift_data([(user, ["M", "T", "", "", "N"])], 2024, 7, session)
+    datos = DatosTurnero(mes="JULIO", año="2024", dependencia="LECS")
+    entradas = [
+        ScheduleEntry(name="CAMBIOS PRUEBA ANA", role="CON", shifts=["M", "N", "T"]),
+        ScheduleEntry(name="NUEVO PRUEBA LUIS", role="PTD", equipo="B", shifts=["N"]),
+    ]
+
+    consultas: list[str] = []
+    event.listen(
+        session.connection(),
+        "before_cursor_execute",
+        lambda *args: consultas.append(args[2]),
+    )
+    cambios = calcula_cambios_turnero(entradas, datos, session)
+    cambios = CambiosTurnero.de_json(cambios.a_json())
+
+    assert len([c for c in consultas if "FROM turnos" in c]) == 1
+    assert not [c for c in consultas if not c.lstrip().startswith("SELECT")]
+    existente, nuevo = cambios.controladores
+    assert existente.id_atc == user.id
+    assert existente.creados == {date(2024, 7, 3): "T"}
+    assert existente.modificados == {date(2024, 7, 2): ("T", "N")}
+    assert existente.sin_cambios == [date(2024, 7, 1)]
+    assert nuevo.id_atc is None
+    assert (cambios.n_creados, cambios.n_sin_cambios) == (2, 1)
+    assert cambios.n_usuarios_nuevos == 1
+    assert cambios_vigentes(cambios, session)
+
+    res = aplica_cambios_turnero(cambios, session)
+
+    assert res.n_created_users == 1
+    assert (res.n_created_shifts, res.n_updated_shifts) == (2, 1)
+    assert res.existing_shifts == {(user.id, date(2024, 7, 1))}
+    # Como al cargar el turnero, el turno del día que queda libre se conserva
+    turnos = {(t.id_atc, t.fecha.day): t.turno for t in session.query(Turno)}
+    nuevo_atc = session.query(ATC).filter_by(apellidos_nombre="NUEVO PRUEBA LUIS")
+    assert turnos == {
+        (user.id, 1): "M",
+        (user.id, 2): "N",
+        (user.id, 3): "T",
+        (user.id, 5): "N",
+        (nuevo_atc.one().id, 1): "N",
+    }
+
+
+def test_cambios_turnero_caducados(session: scoped_session) -> None:
+    """Los cambios dejan de estar vigentes si cambian los turnos del mes."""
+    user = ATC(
+        email="caducados@example.com",
+        apellidos_nombre="CADUCADOS PRUEBA ANA",
+        nombre="Ana",
+        apellidos="Caducados Prueba",
+        dependencia="LECS",
+    )
+    session.add(user)
+    session.flush()
+    datos = DatosTurnero(mes="JULIO", año="2024", dependencia="LECS")
+    entradas = [ScheduleEntry(name="CADUCADOS PRUEBA ANA", role="CON", shifts=["M"])]
+    cambios = calcula_cambios_turnero(entradas, datos, session)
+    assert cambios_vigentes(cambios, session)
+
+    insert_shift_data([(user, ["T"])], 2024, 7, session)
+    assert not cambios_vigentes(cambios, session)
+    # Los turnos de otro mes no la afectan
+    vigentes = calcula_cambios_turnero(entradas, datos, session)
+    insert_shift_data([(user, ["T"])], 2024, 8, session)
+    assert cambios_vigentes(vigentes, session)
+
+
+def test_insert_shift_data_clasifica_turnos(session: scoped_session) -> None:
+    """Comprobar que los turnos se clasifican en creados, modificados y existentes."""
+    user = ATC(
+        email="turnos@example.com",
+        apellidos_nombre="TURNOS PRUEBA ANA",
+        nombre="Ana",
+        apellidos="Turnos Prueba",
+        dependencia="LECS",
+    )
+    session.add(user)
+    session.flush()
+    shifts = ["M", "", "T", "N"]
+    res = insert_shift_data([(user, shifts)], 2024, 7, session)
+    assert res.n_created_shifts == 3
+    assert res.n_updated_shifts == 0
+    assert res.n_existing_shifts == 0
+
+    shifts = ["M", "", "M", "N"]
+    res = insert_shift_data([(user, shifts)], 2024, 7, session)
+    assert res.n_created_shifts == 0
+    assert res.n_updated_shifts == 1
+    assert res.n_existing_shifts == 2
+    assert res.updated_shifts == {(user.id, date(2024, 7, 3))}
+
+    turno = session.query(Turno).filter_by(id_atc=user.id, fecha=date(2024, 7, 3))
+    assert turno.one().turno == "M"
+    assert session.query(Turno).filter_by(id_atc=user.id).count() == 3
+
+
+def test_resultado_incluye() -> None:
+    """Comprobar que al combinar resultados los creados salen de los existentes."""
+    total = ResultadoProcesadoTurnero(
+        existing_users={1, 2},
+        existing_shifts={(1, date(2024, 7, 1))},
+    )
+    otro = ResultadoProcesadoTurnero(
+        created_users={3},
+        updated_users={2},
+        updated_shifts={(1, date(2024, 7, 1))},
+    )
+
+    assert total.incluye(otro) is total
+    assert total.existing_users == {1}
+    assert total.updated_users == {2}
+    assert total.created_users == {3}
+    assert total.n_existing_shifts == 0
+    assert total.n_updated_shifts == 1
+
+
+def test_resuelve_mes() -> None:
+    """Comprobar que el mes se resuelve sin depender del locale."""
+    assert resuelve_mes("Julio", "2024") == (2024, 7)
+    assert resuelve_mes(" SEPTIEMBRE ", "2023") == (2023, 9)
+    with pytest.raises(ValueError, match="Mes o año no válido"):
+        resuelve_mes("July", "2024")
+    with pytest.raises(ValueError, match="Mes o año no válido"):
+        resuelve_mes("Julio", "")
+
+
+def test_fechas_de_turnos_descarta_dias_inexistentes() -> None:
+    """Comprobar que los días que no existen en el mes se descartan."""
+    shifts = ["M"] * 31
+    assert len(fechas_de_turnos(shifts, 2024, 6)) == 30
+    assert len(fechas_de_turnos(shifts, 2024, 2)) == 29
+    assert len(fechas_de_turnos(shifts, 2023, 2)) == 28
+    assert fechas_de_turnos(["", "T"], 2024, 7) == [(date(2024, 7, 2), "T")]
+
+
+def test_extraccion_en_paralelo_igual_que_secuencial(
+    pdf_turnero: PDF,
+    turnero_path: Path,
+) -> None:
+    """Comprobar que la extracción en paralelo da el mismo resultado."""
+    secuencial = [
+        entry for page in pdf_turnero.pages for entry in extract_schedule_data(page)
+    ]
+    paralelo = extraer_en_paralelo(turnero_path.read_bytes(), len(pdf_turnero.pages), 2)
+    assert secuencial
+    assert paralelo == secuencial
+
+
+@pytest.mark.parametrize(
+    ("n_controladores", "mes", "filas_por_pagina"),
+    [(60, 2, 25), (20, 7, 50)],
+)
+def test_extractor_posiciones_igual_que_tabla(
+    pdf_turnero: PDF,
+    n_controladores: int,
+    mes: int,
+    filas_por_pagina: int,
+) -> None:
+    """Comprobar que el extractor por posiciones da las mismas entradas."""
+    contenido = genera_turnero(
+        n_controladores,
+        mes=mes,
+        filas_por_pagina=filas_por_pagina,
+    )
+    with pdfplumber.open(BytesIO(contenido)) as pdf_sintetico:
+        for pdf in (pdf_turnero, pdf_sintetico):
+            plantilla = plantilla_del_extractor(
+                pdf.pages[0],
+                EXTRACTOR_POSICIONES,
+            )
+            assert plantilla is not None
+            tabla = [e for page in pdf.pages for e in extract_schedule_data(page)]
+            posiciones = [
+                e for page in pdf.pages for e in extrae_pagina(page, plantilla)
+            ]
+            assert tabla
+            assert posiciones == tabla
+
+
+def test_extractor_posiciones_sin_plantilla(pdf_estadillo: PDF) -> None:
+    """Comprobar que sin la disposición esperada se usa la detección de tablas."""
+    pagina = pdf_estadillo.pages[0]
+    assert plantilla_del_extractor(pagina, EXTRACTOR_POSICIONES) is None
+    assert plantilla_del_extractor(pagina, EXTRACTOR_TABLA) is None
+    with pytest.raises(ValueError, match="desconocido"):
+        plantilla_del_extractor(pagina, "otro")
+
+
+def test_reparte_paginas() -> None:
+    """Comprobar que las páginas se reparten en tramos consecutivos y completos."""
+    assert reparte_paginas(5, 2) == [[0, 1, 2], [3, 4]]
+    assert reparte_paginas(2, 4) == [[0], [1]]
+    assert reparte_paginas(1, 1) == [[0]]
+
+
+def test_procesa_turneros_en_una_transaccion(session: scoped_session) -> None:
+    """Varios turneros se escriben con un único commit y se registran todos."""
+    archivos = [
+        ArchivoTurnero(nombre="junio.pdf", contenido=genera_turnero(6, mes=6)),
+        ArchivoTurnero(nombre="julio.pdf", contenido=genera_turnero(6, mes=7)),
+    ]
+    commits: list[None] = []
+    event.listen(session(), "after_commit", lambda _s: commits.append(None))
+
+    res = procesa_turneros(archivos, session)
+
+    assert len(commits) == 1
+    assert all(not archivo.error for archivo in archivos)
+    junio, julio = (archivo.resultado for archivo in archivos)
+    assert junio is not None
+    assert julio is not None
+    assert junio.n_created_users == 6
+    # Los usuarios creados por el primer archivo ya existen en el segundo
+    assert julio.n_created_users == 0
+    assert julio.n_total_users == 6
+    assert res.n_created_shifts == junio.n_created_shifts + julio.n_created_shifts
+    assert session.query(Turno).count() == res.n_created_shifts
+    assert {c.nombre_archivo for c in session.query(Carga)} == {
+        "junio.pdf",
+        "julio.pdf",
+    }
+
+
+def test_procesa_turneros_con_un_archivo_no_valido(session: scoped_session) -> None:
+    """Si un archivo no es válido no se escribe ninguno."""
+    archivos = [
+        ArchivoTurnero(nombre="junio.pdf", contenido=genera_turnero(6, mes=6)),
+        ArchivoTurnero(nombre="roto.pdf", contenido=b"esto no es un pdf"),
+    ]
+
+    res = procesa_turneros(archivos, session)
+
+    assert not archivos[0].error
+    assert archivos[0].segundos_extraccion > 0
+    assert archivos[1].error
+    assert res.n_total_users == 0
+    assert session.query(Turno).count() == 0
+    assert session.query(Carga).count() == 0
+
+
+def test_procesa_turneros_con_turnos_repetidos(session: scoped_session) -> None:
+    """Un turno que está en dos archivos solo se cuenta en el último."""
+    archivos = [
+        ArchivoTurnero(
+            nombre="quincena.pdf",
+            contenido=genera_turnero(6, mes=6, n_dias=15),
+        ),
+        ArchivoTurnero(nombre="junio.pdf", contenido=genera_turnero(6, mes=6)),
+    ]
+
+    res = procesa_turneros(archivos, session, procesos_archivos=1)
+
+    quincena, junio = (archivo.resultado for archivo in archivos)
+    assert quincena is not None
+    assert junio is not None
+    # Los turnos de la primera quincena están en los dos archivos
+    assert quincena.n_created_shifts < junio.n_created_shifts
+    assert (
+        quincena.n_created_shifts + junio.n_created_shifts
+        == res.n_created_shifts
+        == session.query(Turno).count()
+    )
+
+
+def test_carga_cambia_version_de_atcs_de_su_dependencia(
+    session: scoped_session,
+) -> None:
+    """Los controladores creados solo invalidan los datos de su dependencia."""
+    procesa_turnero(BytesIO(genera_turnero(6, dependencia="LECS")), session)
+
+    assert lee_version(session, clave_atcs("LECS"))
+    assert lee_version(session, clave_atcs("LECM")) == 0
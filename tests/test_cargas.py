@@ -0,0 +1,37 @@
+"""Verifica el registro de archivos cargados."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from atcapp.cargas import (
+    TIPO_ESTADILLO,
+    TIPO_TURNERO,
+    busca_carga,
+    hash_contenido,
+    registra_carga,
+    resumen_carga,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import scoped_session
+
+
+def test_registro_de_cargas(session: scoped_session) -> None:
+    """Comprobar que una carga registrada se encuentra por su hash y tipo."""
+    sha256 = hash_contenido(b"contenido del pdf")
+    assert len(sha256) == 64
+    assert busca_carga(sha256, TIPO_TURNERO, session) is None
+
+    registra_carga(sha256, TIPO_TURNERO, "turnero.pdf", {"n_total_users": 3}, session)
+    carga = busca_carga(sha256, TIPO_TURNERO, session)
+    assert carga
+    assert resumen_carga(carga) == {"n_total_users": 3}
+    assert busca_carga(sha256, TIPO_ESTADILLO, session) is None
+
+    # Reprocesar el mismo archivo actualiza el registro existente
+    registra_carga(sha256, TIPO_TURNERO, "otro.pdf", {"n_total_users": 4}, session)
+    carga = busca_carga(sha256, TIPO_TURNERO, session)
+    assert carga
+    assert carga.nombre_archivo == "otro.pdf"
+    assert resumen_carga(carga) == {"n_total_users": 4}
@@ -115,18 +115,16 @@ def test_export_atcs(
     assert exported_atcs == atcs
 
 
-def mock_filter_by(*args, **kwargs) -> mock.Mock:  # noqa:ANN002, ANN003
-    """Return an ATC object based on the filter_by parameters.
+def atcs_existentes() -> list[ATC]:
+    """Return the ATC objects already in the database.
 
     Para probar las funcionalidaddes de añadir y editar
     retiramos el primer ATC, y al resto le ponemos otro email.
     """
-    apellidos_nombre = kwargs.get("apellidos_nombre")
-    for atc in ATCS[1:]:
-        if atc[ATTR_APELLIDOS_NOMBRE] == apellidos_nombre:
-            atc[ATTR_EMAIL] = "modified_by_mock_filter@example.com"
-            return mock.Mock(first=mock.Mock(return_value=ATC(**atc)))
-    return mock.Mock(first=mock.Mock(return_value=None))
+    return [
+        ATC(**{**atc, ATTR_EMAIL: "modified_by_mock_query@example.com"})
+        for atc in ATCS[1:]
+    ]
 
 
 def test_import_atcs(
@@ -138,12 +136,13 @@ def test_import_atcs(
     input_file = tmp_path / "input.json"
     input_file.write_text(json.dumps(atcs))
 
-    session_mock.query.return_value.filter_by.side_effect = mock_filter_by
+    session_mock.query.return_value = atcs_existentes()
 
     runner = CliRunner()
     with mock.patch("atcapp.commands.get_session", return_value=session_mock):
         runner.invoke(import_atcs, [str(input_file), "sqlite:///test.db"])
 
-    assert session_mock.query.return_value.filter_by.call_count == len(atcs)
+    # Una única consulta para todos los ATCs del archivo
+    assert session_mock.query.call_count == 1
     assert session_mock.add.call_count == 1
     assert session_mock.commit.call_count == 1
@@ -5,17 +5,25 @@ from __future__ import annotations
 from datetime import date
 from typing import TYPE_CHECKING
 
+from atcapp.carga_turnero import escribe_turnos
 from atcapp.core import (
     Dia,
     GenCalMensual,
     TipoTurno,
     Turno,
+    calendario_de_atc,
+    calendarios,
+    clave_calendario,
+    claves_calendario_de_turnos,
+    cuadrante_de_equipo,
+    genera_cuadrante_equipo,
     description_from_code,
     period_from_code,
 )
+from atcapp.models import ATC
+from atcapp.versiones import cambia_versiones, clave_atcs
 
 if TYPE_CHECKING:
-    from atcapp.models import ATC
     from sqlalchemy.orm import Session
 
 
@@ -63,11 +71,11 @@ def test_day() -> None:
     day = Dia(
         fecha=date(2024, 5, 1),
         dia_de_la_semana="Miércoles",
-        es_festivo_nacional=False,
+        es_festivo=False,
     )
     assert day.fecha == date(2024, 5, 1)
     assert day.dia_de_la_semana == "Miércoles"
-    assert not day.es_festivo_nacional
+    assert not day.es_festivo
     assert day.turno is None
 
 
@@ -88,21 +96,20 @@ def test_month_calendar_days() -> None:
     # Check specific day details
     assert days[0].fecha == date(2024, 5, 1)
     assert days[0].dia_de_la_semana == "miércoles"
-    assert days[0].es_festivo_nacional
+    assert days[0].es_festivo
 
     assert days[30].fecha == date(2024, 5, 31)
     assert days[30].dia_de_la_semana == "viernes"
-    assert not days[30].es_festivo_nacional
+    assert not days[30].es_festivo
 
 
 def test_month_calendar_holidays() -> None:
     """Test the identification of national holidays in MonthCalendar."""
     calendar = GenCalMensual.generate(2024, 1)
-    holidays = [day for day in calendar.dias if day.es_festivo_nacional]
+    holidays = [day for day in calendar.dias if day.es_festivo]
 
     # Check if the holidays are correctly identified
-    assert len(holidays) == 1
-    assert holidays[0].fecha == date(2024, 1, 1)
+    assert [day.fecha for day in holidays] == [date(2024, 1, 1), date(2024, 1, 6)]
 
 
 def test_month_calendar_weeks() -> None:
@@ -137,3 +144,108 @@ def test_load_weeks_from_user(atc: ATC, preloaded_session: Session) -> None:
     # Count shifts for the month
     shifts = [day for day in days if day.turno is not None]
     assert len(shifts) == 22
+
+
+def test_claves_calendario_de_turnos() -> None:
+    """Un día de la primera semana invalida también el mes anterior."""
+    claves = claves_calendario_de_turnos([(7, date(2024, 6, 1))])
+
+    assert claves == {
+        clave_calendario(7, 2024, 5),
+        clave_calendario(7, 2024, 6),
+    }
+    assert claves_calendario_de_turnos([(7, date(2024, 6, 12))]) == {
+        clave_calendario(7, 2024, 6),
+    }
+
+
+def test_calendario_cacheado(regular_user: ATC, session: Session) -> None:
+    """El calendario se reutiliza hasta que una carga cambia sus turnos."""
+    calendarios.vacia()
+    primero = calendario_de_atc(2024, 6, regular_user, session)
+    assert calendario_de_atc(2024, 6, regular_user, session) is primero
+
+    escribe_turnos({(regular_user.id, date(2024, 6, 1)): "M"}, session)
+    session.commit()
+    segundo = calendario_de_atc(2024, 6, regular_user, session)
+
+    assert segundo is not primero
+    assert segundo.dias[0].turno is not None
+    assert segundo.dias[0].turno.codigo == "M"
+
+    cambia_versiones(session, [clave_calendario(regular_user.id, 2024, 6)])
+    session.commit()
+    tercero = calendario_de_atc(2024, 6, regular_user, session)
+    assert tercero is not segundo
+
+    # Los cambios de controladores de otra dependencia no lo afectan
+    cambia_versiones(session, [clave_atcs("LECM")])
+    session.commit()
+    assert calendario_de_atc(2024, 6, regular_user, session) is tercero
+
+    # Los festivos dependen de la dependencia del ATC
+    cambia_versiones(session, [clave_atcs(regular_user.dependencia)])
+    session.commit()
+    assert calendario_de_atc(2024, 6, regular_user, session) is not tercero
+
+
+def test_cuadrante_equipo(regular_user: ATC, session: Session) -> None:
+    """El cuadrante tiene una fila por controlador del equipo y una columna por día."""
+    regular_user.equipo = "A"
+    sin_turnos = ATC(
+        email="otro@example.com",
+        apellidos_nombre="Another User",
+        nombre="Another",
+        apellidos="User",
+        dependencia="LECS",
+        equipo="A",
+    )
+    session.add(sin_turnos)
+    session.commit()
+    escribe_turnos(
+        {
+            (regular_user.id, date(2024, 2, 1)): "MB09",
+            (regular_user.id, date(2024, 2, 29)): "N",
+            (regular_user.id, date(2024, 3, 1)): "T",
+        },
+        session,
+    )
+    session.commit()
+
+    cuadrante = genera_cuadrante_equipo("LECS", "A", 2024, 2, session)
+
+    assert len(cuadrante.dias) == 29
+    assert [fila.nombre for fila in cuadrante.filas] == [
+        "Another User",
+        "User Regular",
+    ]
+    assert cuadrante.filas[0].turnos == [None] * 29
+    turnos = cuadrante.filas[1].turnos
+    assert turnos[0] is not None
+    assert turnos[0].codigo == "MB09"
+    assert turnos[0].period == TipoTurno.M
+    assert turnos[28] is not None
+    assert turnos[28].codigo == "N"
+    assert sum(turno is not None for turno in turnos) == 2
+
+
+def test_cuadrante_equipo_cacheado(regular_user: ATC, session: Session) -> None:
+    """El cuadrante se regenera al cargar turnos del mes o cambiar controladores."""
+    regular_user.equipo = "B"
+    session.commit()
+    primero = cuadrante_de_equipo("LECS", "B", 2024, 2, session)
+    assert cuadrante_de_equipo("LECS", "B", 2024, 2, session) is primero
+
+    escribe_turnos({(regular_user.id, date(2024, 2, 10)): "M"}, session)
+    session.commit()
+    segundo = cuadrante_de_equipo("LECS", "B", 2024, 2, session)
+    assert segundo is not primero
+    assert segundo.filas[0].turnos[9] is not None
+
+    cambia_versiones(session, [clave_atcs("LECM")])
+    session.commit()
+    assert cuadrante_de_equipo("LECS", "B", 2024, 2, session) is segundo
+
+    cambia_versiones(session, [clave_atcs("LECS")])
+    session.commit()
+    assert cuadrante_de_equipo("LECS", "B", 2024, 2, session) is not segundo
@@ -2,15 +2,32 @@
 
 from __future__ import annotations
 
+from datetime import timedelta
 from typing import TYPE_CHECKING
 
 import pytest
 import pytz
-from atcapp.estadillos import ColorManager, genera_datos_grupo, identifica_grupos
+from atcapp.carga_estadillo import procesa_estadillo
+from atcapp.estadillos import (
+    ColorManager,
+    aplica_estado,
+    busca_anchor,
+    clave_estadillo,
+    estadillos_fijos,
+    genera_datos_estadillo,
+    genera_datos_grupo,
+    genera_grupo_fijo,
+    grupos_fijos,
+    identifica_grupos,
+)
+from atcapp.models import Estadillo
+from atcapp.versiones import cambia_versiones
+from sqlalchemy import event
 
 if TYPE_CHECKING:
-    from atcapp.models import Estadillo
-    from sqlalchemy.orm import Session
+    from pathlib import Path
+
+    from sqlalchemy.orm import Session, scoped_session
 
 
 @pytest.fixture()
@@ -102,3 +119,93 @@ def test_mismas_duraciones(estadillo: Estadillo, preloaded_session: Session) ->
         for periodos in grupo.controladores.values():
             duracion_controlador = sum(periodo.duracion for periodo in periodos)
             assert duracion_total == duracion_controlador
+
+
+def test_estado_sobre_grupos_fijos(
+    estadillo: Estadillo,
+    preloaded_session: Session,
+) -> None:
+    """El estado de cada petición no modifica los grupos guardados."""
+    estadillos_fijos.vacia()
+    grupos = grupos_fijos(estadillo, preloaded_session)
+    assert grupos_fijos(estadillo, preloaded_session) is grupos
+
+    controlador = grupos[2].controladores[0]
+    primero = controlador.periodos[0]
+    now = primero.inicio + timedelta(minutes=1)
+    anchor = busca_anchor(grupos, controlador.id_atc, now)
+    assert anchor is primero
+
+    datos = aplica_estado(grupos[2], anchor, controlador.id_atc, now)
+    assert datos.atcs[0].usuario_actual
+    assert datos.atcs[0].periodos[0].activo == "ACT"
+    assert datos.atcs[0].periodos[0].scroll_anchor
+    assert datos.atcs[0].periodos[-1].activo == "FUT"
+    assert 0 < datos.marcador < 100
+
+    # Los datos guardados siguen sin estado
+    assert primero.datos.activo == "FUT"
+    assert not primero.datos.scroll_anchor
+
+    # Sin usuario, el anchor es del primer grupo con más controladores
+    anchor = busca_anchor(grupos, None, now)
+    assert any(anchor in c.periodos for c in grupos[2].controladores)
+
+
+def test_grupos_fijos_invalidados(
+    estadillo: Estadillo,
+    preloaded_session: Session,
+) -> None:
+    """Al cambiar la versión del estadillo se vuelven a calcular los grupos."""
+    grupos = grupos_fijos(estadillo, preloaded_session)
+
+    cambia_versiones(preloaded_session, [clave_estadillo(estadillo.id)])
+    preloaded_session.commit()
+
+    nuevos = grupos_fijos(estadillo, preloaded_session)
+    assert nuevos is not grupos
+    assert nuevos == grupos
+
+
+def test_consultas_por_estadillo(
+    session: scoped_session,
+    estadillo_path: Path,
+) -> None:
+    """Preparar un estadillo lee sus periodos, controladores y sectores de una vez.
+
+    Con la caché vacía son dos consultas, la versión y los periodos, sin
+    importar cuántos controladores y sectores tenga. Con la caché, una.
+    """
+    with estadillo_path.open("rb") as file:
+        id_estadillo = procesa_estadillo(file, session).id
+    # Como en una petición nueva, sin objetos cargados en la sesión
+    session.expunge_all()
+    estadillo = session.get(Estadillo, id_estadillo)
+    assert estadillo is not None
+
+    sentencias: list[str] = []
+    event.listen(
+        session.connection(),
+        "before_cursor_execute",
+        lambda _c, _cur, sql, *_a: sentencias.append(sql),
+    )
+    estadillos_fijos.vacia()
+    grupos = genera_datos_estadillo(estadillo, session)
+    assert len(grupos) == 4
+    assert len(sentencias) == 2
+
+    sentencias.clear()
+    genera_datos_estadillo(estadillo, session)
+    assert len(sentencias) == 1
+
+
+def test_grupo_sin_duracion(estadillo: Estadillo, preloaded_session: Session) -> None:
+    """Un grupo de duración 0 no provoca una división por cero."""
+    grupo = identifica_grupos(estadillo, preloaded_session)[2]
+    grupo.duracion = 0
+    fijo = genera_grupo_fijo(grupo, ColorManager(), pytz.timezone("Europe/Madrid"))
+    assert all(
+        periodo.datos.porcentaje == 0
+        for controlador in fijo.controladores
+        for periodo in controlador.periodos
+    )
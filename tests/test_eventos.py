@@ -0,0 +1,114 @@
+"""Verifica los avisos de estadillos nuevos con Server-Sent Events."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from atcapp.carga_estadillo import procesa_estadillo
+from atcapp.estadillos import clave_estadillos_de_dependencia
+from atcapp.eventos import Vigilante, flujo_estadillo, vigilante
+from atcapp.versiones import cambia_versiones, lee_version
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+    from atcapp.models import ATC
+    from flask.testing import FlaskClient
+    from sqlalchemy.orm import scoped_session
+
+
+def _nuevo_estadillo(session: scoped_session, dependencia: str) -> None:
+    cambia_versiones(session, [clave_estadillos_de_dependencia(dependencia)])
+    session.commit()
+
+
+def test_carga_cambia_version_de_la_dependencia(
+    session: scoped_session,
+    estadillo_path: Path,
+) -> None:
+    """Cargar o sustituir un estadillo cambia la versión de su dependencia."""
+    with estadillo_path.open("rb") as file:
+        estadillo = procesa_estadillo(file, session)
+    clave = clave_estadillos_de_dependencia(estadillo.dependencia)
+    version = lee_version(session, clave)
+    assert version
+
+    with estadillo_path.open("rb") as file:
+        procesa_estadillo(file, session, reconciliar=False)
+    assert lee_version(session, clave) != version
+
+
+def test_vigilante(session: scoped_session) -> None:
+    """El vigilante avisa a las conexiones de la dependencia que cambia."""
+    vigia = Vigilante()
+    version = vigia.suscribe("LECS", session)
+    otra = vigia.suscribe("LECM", session)
+    assert version is not None
+    assert otra is not None
+    assert vigia.espera("LECS", version, 0) == version
+
+    _nuevo_estadillo(session, "LECS")
+    # Hasta la siguiente comprobación no se ve el cambio
+    assert vigia.espera("LECS", version, 0) == version
+    vigia.comprueba(session)
+    assert vigia.espera("LECS", version, 0) != version
+    assert vigia.espera("LECM", otra, 0) == otra
+
+    vigia.baja("LECS")
+    vigia.baja("LECM")
+    assert vigia.conexiones == 0
+
+
+def test_vigilante_limita_conexiones(session: scoped_session) -> None:
+    """Con max_conexiones abiertas se rechazan las siguientes."""
+    vigia = Vigilante()
+    vigia.max_conexiones = 1
+    assert vigia.suscribe("LECS", session) is not None
+    assert vigia.suscribe("LECS", session) is None
+    vigia.baja("LECS")
+    assert vigia.suscribe("LECS", session) is not None
+
+
+def test_flujo_estadillo(session: scoped_session) -> None:
+    """El flujo envía un evento con la nueva versión en cuanto cambia."""
+    vigia = Vigilante()
+    version = vigia.suscribe("LECS", session)
+    assert version is not None
+    flujo = flujo_estadillo(vigia, "LECS", version)
+    assert next(flujo).startswith("retry: ")
+
+    _nuevo_estadillo(session, "LECS")
+    vigia.comprueba(session)
+    evento = next(flujo)
+    nueva = vigia.espera("LECS", version, 0)
+    assert evento.startswith(f"id: {nueva}\nevent: estadillo\n")
+
+    # Al reconectar con un id anterior se avisa enseguida
+    flujo = flujo_estadillo(vigia, "LECS", nueva, str(version))
+    next(flujo)
+    assert next(flujo).startswith(f"id: {nueva}\n")
+
+
+def test_eventos_estadillo(
+    preloaded_client: FlaskClient,
+    atc: ATC,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """La ruta abre el flujo y libera la suscripción al cerrarse."""
+    # Sin hilo: las pruebas usan una base de datos en memoria de su sesión
+    monkeypatch.setattr(vigilante, "session_factory", None)
+    assert preloaded_client.get("/events/estadillo").status_code == 401
+
+    preloaded_client.post("/login", data={"idToken": "test_token"})
+    response = preloaded_client.get("/events/estadillo")
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["X-Accel-Buffering"] == "no"
+    assert next(response.iter_encoded()).startswith(b"retry: ")
+    assert vigilante.conexiones == 1
+    response.close()
+    assert vigilante.conexiones == 0
+
+    pagina = preloaded_client.get("/estadillo").data.decode()
+    assert 'data-eventos="/events/estadillo"' in pagina
@@ -0,0 +1,80 @@
+"""Verifica el cálculo de los festivos nacionales y autonómicos."""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import pytest
+from atcapp.core import GenCalMensual
+from atcapp.festivos import (
+    NACIONAL,
+    domingo_de_pascua,
+    es_festivo,
+    festivos,
+    region_de_dependencia,
+)
+from atcapp.models import ATC
+
+
+@pytest.mark.parametrize(
+    ("año", "pascua"),
+    [
+        (2000, date(2000, 4, 23)),
+        (2019, date(2019, 4, 21)),
+        (2024, date(2024, 3, 31)),
+        (2025, date(2025, 4, 20)),
+        (2026, date(2026, 4, 5)),
+        (2038, date(2038, 4, 25)),
+    ],
+)
+def test_domingo_de_pascua(año: int, pascua: date) -> None:
+    """El domingo de Pascua coincide con el de los calendarios publicados."""
+    assert domingo_de_pascua(año) == pascua
+
+
+@pytest.mark.parametrize("año", [2023, 2024, 2025])
+def test_festivos_por_region(año: int) -> None:
+    """Cada región añade sus fiestas a las nacionales."""
+    pascua = domingo_de_pascua(año)
+    jueves_santo = pascua - timedelta(days=3)
+    nacionales = festivos(NACIONAL, año)
+
+    assert len(nacionales) == 10
+    assert pascua - timedelta(days=2) in nacionales
+    assert jueves_santo not in nacionales
+
+    cataluña = festivos("CT", año)
+    assert cataluña - nacionales == {
+        pascua + timedelta(days=1),
+        date(año, 6, 24),
+        date(año, 9, 11),
+        date(año, 12, 26),
+    }
+    assert festivos("MD", año) - nacionales == {jueves_santo, date(año, 5, 2)}
+    assert festivos("AN", año) - nacionales == {jueves_santo, date(año, 2, 28)}
+    assert festivos("CN", año) - nacionales == {jueves_santo, date(año, 5, 30)}
+
+
+def test_festivos_calculados_una_vez() -> None:
+    """La tabla de un año se calcula una vez y se reutiliza."""
+    assert festivos("CT", 2031) is festivos("CT", 2031)
+    assert es_festivo(date(2031, 12, 26), "CT")
+    assert not es_festivo(date(2031, 12, 26))
+
+
+def test_region_de_dependencia() -> None:
+    """Las dependencias desconocidas solo tienen los festivos nacionales."""
+    assert region_de_dependencia("lecb") == "CT"
+    assert region_de_dependencia("GCCC") == "CN"
+    assert region_de_dependencia("LEZZ") == NACIONAL
+    assert region_de_dependencia(None) == NACIONAL
+
+
+def test_calendario_con_festivos_de_la_dependencia() -> None:
+    """El calendario de un ATC marca los festivos de su comunidad."""
+    atc = ATC(dependencia="LECB")
+
+    calendario = GenCalMensual.generate(2025, 12, atc)
+    festivos_del_mes = [dia.fecha.day for dia in calendario.dias if dia.es_festivo]
+
+    assert festivos_del_mes == [6, 8, 25, 26]
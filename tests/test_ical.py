@@ -0,0 +1,95 @@
+"""Verifica el calendario iCalendar de los turnos de cada ATC."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, Any
+
+from atcapp import get_timezone
+from atcapp.carga_turnero import escribe_turnos
+from atcapp.ical import crea_token, genera_ical, horario_de_turno
+from sqlalchemy import event
+
+if TYPE_CHECKING:
+    from atcapp.models import ATC
+    from flask.testing import FlaskClient
+    from sqlalchemy.orm import scoped_session
+
+MADRID = get_timezone("LECM")
+
+
+def test_horario_de_turno() -> None:
+    """Los turnos de trabajo tienen horario y la noche acaba al día siguiente."""
+    assert horario_de_turno("MB09", date(2024, 6, 3), MADRID) == (
+        datetime(2024, 6, 3, 5, 0, tzinfo=timezone.utc),
+        datetime(2024, 6, 3, 13, 0, tzinfo=timezone.utc),
+    )
+    assert horario_de_turno("N", date(2024, 1, 31), MADRID) == (
+        datetime(2024, 1, 31, 21, 30, tzinfo=timezone.utc),
+        datetime(2024, 2, 1, 6, 0, tzinfo=timezone.utc),
+    )
+    assert horario_de_turno("V", date(2024, 6, 3), MADRID) is None
+
+
+def test_genera_ical() -> None:
+    """Cada turno es un evento y las líneas largas se pliegan."""
+    contenido = genera_ical(
+        7,
+        "Pérez López, Ana",
+        [(date(2024, 6, 3), "T"), (date(2024, 6, 4), "B13")],
+        tz=MADRID,
+        actualizado=datetime(2024, 5, 20, 10, 0, tzinfo=timezone.utc),
+    )
+    lineas = contenido.split("\r\n")
+
+    assert lineas[0] == "BEGIN:VCALENDAR"
+    assert lineas[-2:] == ["END:VCALENDAR", ""]
+    assert "X-WR-CALNAME:Turnos Pérez López\\, Ana" in lineas
+    assert "UID:7-20240603@atcapp" in lineas
+    assert "DTSTART:20240603T130000Z" in lineas
+    assert "DTEND:20240603T203000Z" in lineas
+    assert "DTSTART;VALUE=DATE:20240604" in lineas
+    assert "DTEND;VALUE=DATE:20240605" in lineas
+    assert all(len(linea.encode()) <= 75 for linea in lineas)
+    assert any(linea.startswith(" ") for linea in lineas)
+
+
+def test_ical_condicional(
+    client: FlaskClient,
+    regular_user: ATC,
+    session: scoped_session,
+) -> None:
+    """Sin cambios en los turnos se responde 304 sin leer la tabla de turnos."""
+    token = crea_token(session, regular_user.id)
+    hoy = datetime.now(timezone.utc).date()
+    escribe_turnos({(regular_user.id, hoy): "M"}, session)
+    session.commit()
+
+    response = client.get(f"/ical/{token}.ics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/calendar"
+    assert "SUMMARY:M" in response.data.decode()
+    etag = response.headers["ETag"]
+
+    consultas: list[str] = []
+
+    def registra(*args: Any) -> None:  # noqa: ANN401
+        consultas.append(args[2])
+
+    event.listen(session.get_bind(), "before_cursor_execute", registra)
+    try:
+        response = client.get(f"/ical/{token}.ics", headers={"If-None-Match": etag})
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", registra)
+    assert response.status_code == 304
+    assert consultas
+    assert not any("FROM turnos" in consulta for consulta in consultas)
+
+    escribe_turnos({(regular_user.id, hoy): "T"}, session)
+    session.commit()
+    response = client.get(f"/ical/{token}.ics", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "SUMMARY:T" in response.data.decode()
+
+    assert client.get("/ical/desconocido.ics").status_code == 404
@@ -0,0 +1,77 @@
+"""Verifica las métricas de la carga de turneros y estadillos."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from atcapp.carga_estadillo import procesa_estadillo
+from atcapp.carga_turnero import procesa_turnero
+from atcapp.metricas import MetricasCarga, cancela_suscripcion, publica, suscribe
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import scoped_session
+
+TURNERO = Path(__file__).parent / "resources" / "test_turnero.pdf"
+ESTADILLO = Path(__file__).parent / "resources" / "test_estadillo.pdf"
+
+
+def test_metricas_turnero(session: scoped_session) -> None:
+    """Comprueba las etapas y contadores de un turnero y la suscripción."""
+    recibidas: list[MetricasCarga] = []
+    suscriptor = suscribe(recibidas.append)
+    try:
+        with TURNERO.open("rb") as file:
+            res = procesa_turnero(file, session)
+    finally:
+        cancela_suscripcion(suscriptor)
+
+    metricas = res.metricas
+    assert metricas is not None
+    assert recibidas == [metricas]
+    assert set(metricas.segundos) == {"lectura", "extraccion", "usuarios", "escritura"}
+    assert metricas.bytes_leidos == TURNERO.stat().st_size
+    assert metricas.paginas > 0
+    assert metricas.filas >= res.n_total_users
+    assert metricas.consultas > 0
+    assert metricas.filas_escritas >= res.n_created_users + res.n_created_shifts
+    assert metricas.a_dict()["tipo"] == "turnero"
+
+
+def test_metricas_estadillo(session: scoped_session) -> None:
+    """Comprueba las métricas de un estadillo y de su recarga."""
+    metricas = MetricasCarga(tipo="estadillo")
+    with ESTADILLO.open("rb") as file:
+        procesa_estadillo(file, session, metricas=metricas)
+
+    assert metricas.paginas > 1
+    assert metricas.tablas > 1
+    assert metricas.filas > 0
+    assert metricas.filas_escritas > 0
+
+    recarga = MetricasCarga(tipo="estadillo")
+    with ESTADILLO.open("rb") as file:
+        procesa_estadillo(file, session, metricas=recarga)
+
+    # El mismo estadillo se reconcilia sin escribir nada
+    assert recarga.filas_escritas == 0
+    assert recarga.consultas < metricas.consultas
+    assert metricas.incluye(recarga).paginas == 2 * recarga.paginas
+
+
+def test_publica_ignora_errores_de_suscriptores() -> None:
+    """Un suscriptor que falla no impide entregar las métricas a los demás."""
+    recibidas: list[MetricasCarga] = []
+
+    def falla(_: MetricasCarga) -> None:
+        raise RuntimeError
+
+    suscribe(falla)
+    suscribe(recibidas.append)
+    try:
+        publica(MetricasCarga(tipo="turnero"))
+    finally:
+        cancela_suscripcion(falla)
+        cancela_suscripcion(recibidas.append)
+
+    assert len(recibidas) == 1
@@ -0,0 +1,69 @@
+"""Verifica que los pdf sintéticos se procesan como los reales."""
+
+from __future__ import annotations
+
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+import pdfplumber
+import pytest
+from atcapp.carga_estadillo import procesa_estadillo
+from atcapp.carga_turnero import procesa_turnero
+from atcapp.models import ATC, Turno
+
+from .pdf_sintetico import genera_estadillo, genera_turnero, nombres_sinteticos
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import scoped_session
+
+
+def test_turnero_sintetico(session: scoped_session) -> None:
+    """Comprueba que se cargan todos los controladores y sus turnos."""
+    contenido = genera_turnero(60, año=2024, mes=2, n_dias=10, filas_por_pagina=25)
+
+    with pdfplumber.open(BytesIO(contenido)) as pdf:
+        assert len(pdf.pages) == 3
+        assert "LECS - CONTROLADORES" in pdf.pages[0].extract_text()
+
+    res = procesa_turnero(BytesIO(contenido), session)
+
+    assert res.n_total_users == 60
+    creados = session.query(ATC).filter(ATC.id.in_(res.created_users)).all()
+    assert {atc.apellidos_nombre for atc in creados} == set(nombres_sinteticos(60))
+    assert {atc.equipo for atc in creados} == {"A", "B", "C"}
+    fechas = {t.fecha for t in session.query(Turno)}
+    assert min(fechas).isoformat() == "2024-02-01"
+    assert max(fechas).isoformat() <= "2024-02-10"
+
+
+def test_estadillo_sintetico(session: scoped_session) -> None:
+    """Comprueba que se cargan los controladores, sectores y periodos."""
+    contenido = genera_estadillo(12, 5, turno="T")
+
+    estadillo = procesa_estadillo(BytesIO(contenido), session)
+
+    assert estadillo.turno == "T"
+    # Controladores más dos jefes de sala, un TCA y dos supervisores
+    assert len(estadillo.servicios) == 12 + 5
+    assert {s.nombre for s in estadillo.sectores} == {
+        "ASN",
+        "ASV",
+        "CEN",
+        "MAR",
+        "NO1",
+    }
+    # Nueve periodos de 50 minutos de 15:00 a 22:30 por controlador
+    assert sum(len(atc.periodos) for atc in estadillo.atcs) == 12 * 9
+
+
+def test_regresiones() -> None:
+    """Comprueba que solo se avisa de etapas claramente más lentas."""
+    # benchmarks no se instala con el paquete; solo existe en el repositorio
+    ingesta = pytest.importorskip("benchmarks.ingesta")
+    referencia = {"sqlite:x": {"extraccion": 1.0, "escritura": 0.001}}
+    actual = {"sqlite:x": {"extraccion": 1.5, "escritura": 0.004}, "otro": {}}
+
+    avisos = ingesta.regresiones(actual, referencia, 1.25)
+
+    assert len(avisos) == 1
+    assert avisos[0].startswith("sqlite:x extraccion")
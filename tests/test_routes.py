@@ -9,9 +9,10 @@ import pytest
 if TYPE_CHECKING:
     from pathlib import Path
 
-    from atcapp.models import ATC
+    from atcapp.models import ATC, Estadillo
     from flask.testing import FlaskClient
     from pytest_mock import MockerFixture
+    from sqlalchemy.orm import Session
 
 
 def test_index_redirect(client: FlaskClient) -> None:
@@ -181,3 +182,68 @@ def test_plantilla_estadillo(preloaded_client: FlaskClient, atc: ATC) -> None:
     response = preloaded_client.get("/estadillo")
     assert response.status_code == 200
     assert 'class="periodos"' in response.data.decode()
+
+
+@pytest.mark.usefixtures("_verify_id_token_mock")
+def test_equipo(preloaded_client: FlaskClient, atc: ATC) -> None:
+    """El cuadrante muestra el equipo del usuario y no deja ver otros."""
+    preloaded_client.post("/login", data={"idToken": "test_token"})
+    response = preloaded_client.get("/equipo?year=2024&month=6")
+    assert response.status_code == 200
+    html = response.data.decode()
+    assert f"Equipo {atc.equipo}" in html
+    assert atc.apellidos_nombre in html
+
+    response = preloaded_client.get("/equipo?equipo=H")
+    assert response.status_code == 302
+    assert response.location == "/equipo"
+
+
+@pytest.mark.usefixtures("_verify_id_token_mock")
+def test_api_estadillo(
+    preloaded_client: FlaskClient,
+    atc: ATC,
+    estadillo: Estadillo,
+) -> None:
+    """El JSON del estadillo se sirve con ETag y se revalida con un 304."""
+    url = f"/api/estadillo/{estadillo.id}"
+    assert preloaded_client.get(url).status_code == 401
+
+    preloaded_client.post("/login", data={"idToken": "test_token"})
+    response = preloaded_client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    datos = response.get_json()
+    assert datos["id"] == estadillo.id
+    assert len(datos["grupos"]) == 4
+    periodo = datos["grupos"][2]["controladores"][0]["periodos"][0]
+    assert periodo["hora_inicio"] == "07:30"
+    assert periodo["inicio"].endswith("+00:00")
+
+    response = preloaded_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # La página lleva el mismo ETag para su primera consulta
+    pagina = preloaded_client.get("/estadillo").data.decode()
+    assert f'data-etag="{etag.replace(chr(34), "&quot;")}"' in pagina
+
+    assert preloaded_client.get("/api/estadillo/0").status_code == 404
+
+
+@pytest.mark.usefixtures("_verify_id_token_mock")
+def test_api_estadillo_de_otra_dependencia(
+    preloaded_client: FlaskClient,
+    preloaded_session: Session,
+    atc: ATC,
+    estadillo: Estadillo,
+) -> None:
+    """El JSON de un estadillo de otra dependencia no se sirve."""
+    assert atc.dependencia == estadillo.dependencia
+    atc.dependencia = "LECM"
+    preloaded_session.commit()
+
+    preloaded_client.post("/login", data={"idToken": "test_token"})
+    url = f"/api/estadillo/{estadillo.id}"
+    assert preloaded_client.get(url).status_code == 404
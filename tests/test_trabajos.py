@@ -0,0 +1,153 @@
+"""Verifica la cola de trabajos de carga en segundo plano."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from atcapp.cargas import hash_contenido
+from atcapp.trabajos import (
+    ERROR,
+    MENSAJE_INTERRUMPIDO,
+    PENDIENTE,
+    PROCESANDO,
+    TERMINADO,
+    cola,
+    crea_trabajo,
+    ejecuta_trabajo,
+    interrumpido,
+    marca_interrumpidos,
+)
+from sqlalchemy.orm import sessionmaker
+
+if TYPE_CHECKING:
+    from atcapp.models import ATC
+    from flask.testing import FlaskClient
+    from pytest_mock import MockerFixture
+    from sqlalchemy.orm import scoped_session
+
+
+@pytest.mark.usefixtures("_verify_admin_id_token_mock", "admin_user")
+def test_upload_en_segundo_plano(
+    client: FlaskClient,
+    session: scoped_session,
+    turnero_path: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+) -> None:
+    """Comprobar que la carga se encola y el estado refleja el progreso."""
+    mocker.patch.dict(
+        client.application.config,
+        {"UPLOAD_ASYNC": True, "UPLOAD_SPOOL_DIR": str(tmp_path)},
+    )
+    encolados: list[int] = []
+    mocker.patch.object(cola, "encola", side_effect=encolados.append)
+    client.post("/login", data={"idToken": "test_token"})
+
+    with turnero_path.open("rb") as file:
+        response = client.post(
+            "/upload",
+            data={"files": (file, "turnero.pdf")},
+            content_type="multipart/form-data",
+        )
+
+    assert len(encolados) == 1
+    id_trabajo = encolados[0]
+    assert response.status_code == 302
+    assert response.location.endswith(f"/upload/status/{id_trabajo}")
+    assert len(list(tmp_path.iterdir())) == 1
+
+    estado = client.get(f"/upload/status/{id_trabajo}?format=json").get_json()
+    assert estado["estado"] == PENDIENTE
+    assert not estado["terminado"]
+    assert estado["resultado"] is None
+
+    ejecuta_trabajo(id_trabajo, session)
+
+    estado = client.get(f"/upload/status/{id_trabajo}?format=json").get_json()
+    assert estado["estado"] == TERMINADO
+    assert estado["paginas_total"] > 0
+    assert estado["paginas_procesadas"] == estado["paginas_total"]
+    assert estado["resultado"]["n_total_users"] == 20
+    assert estado["resultado"]["n_created_shifts"] == 445
+    assert not list(tmp_path.iterdir())
+
+    response = client.get(f"/upload/status/{id_trabajo}")
+    assert response.status_code == 200
+    assert b"turnero.pdf" in response.data
+
+
+def test_trabajo_con_error(session: scoped_session, tmp_path: Path) -> None:
+    """Comprobar que un archivo no válido deja el trabajo en estado error."""
+    contenido = b"esto no es un pdf"
+    trabajo = crea_trabajo(
+        contenido,
+        "roto.pdf",
+        hash_contenido(contenido),
+        tmp_path,
+        session,
+    )
+    # El rollback del trabajo no debe deshacer la transacción del test
+    sesion_trabajo = sessionmaker(
+        bind=session.connection(),
+        join_transaction_mode="create_savepoint",
+    )()
+    ejecuta_trabajo(trabajo.id, sesion_trabajo)
+
+    session.refresh(trabajo)
+    assert trabajo.estado == ERROR
+    assert trabajo.error
+    # El archivo se conserva para poder revisarlo
+    assert Path(trabajo.ruta).exists()
+
+    # Un trabajo ya reclamado no se vuelve a ejecutar
+    trabajo.error = None
+    session.commit()
+    ejecuta_trabajo(trabajo.id, sesion_trabajo)
+    session.refresh(trabajo)
+    assert trabajo.error is None
+
+
+@pytest.mark.usefixtures("_verify_admin_id_token_mock", "admin_user")
+def test_estado_de_trabajo_inexistente(client: FlaskClient) -> None:
+    """Comprobar que un trabajo que no existe devuelve la página de error."""
+    client.post("/login", data={"idToken": "test_token"})
+    response = client.get("/upload/status/999999")
+    assert "Página no encontrada".encode() in response.data
+
+
+def test_no_admin_no_ve_el_estado(client: FlaskClient, regular_user: ATC) -> None:
+    """Comprobar que el estado de las cargas es solo para administradores."""
+    response = client.get("/upload/status/1?format=json")
+    assert response.status_code == 302
+
+
+def test_trabajos_interrumpidos(session: scoped_session, tmp_path: Path) -> None:
+    """Un trabajo en proceso sin progreso pasa a error; uno activo no."""
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    trabajos = []
+    for minutos in (60, 1):
+        contenido = f"trabajo {minutos}".encode()
+        trabajo = crea_trabajo(
+            contenido,
+            "turnero.pdf",
+            hash_contenido(contenido),
+            tmp_path,
+            session,
+        )
+        trabajo.estado = PROCESANDO
+        trabajo.actualizado = ahora - timedelta(minutes=minutos)
+        trabajos.append(trabajo)
+    session.commit()
+    parado, activo = trabajos
+    timeout = timedelta(minutes=15)
+    assert interrumpido(parado, timeout)
+    assert not interrumpido(activo, timeout)
+
+    assert marca_interrumpidos(session, timeout) == 1
+    session.refresh(parado)
+    session.refresh(activo)
+    assert (parado.estado, parado.error) == (ERROR, MENSAJE_INTERRUMPIDO)
+    assert activo.estado == PROCESANDO
@@ -4,7 +4,9 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from atcapp.user_utils import AtcTexto, create_user, find_user
+from atcapp.models import ATC
+from atcapp.user_utils import AtcIndex, AtcTexto, create_user, find_user
+from sqlalchemy import event
 
 if TYPE_CHECKING:
     from sqlalchemy.orm import scoped_session
@@ -60,3 +62,28 @@ def test_no_carriage_return(session: scoped_session) -> None:
     atc_texto.apellidos_nombre = "PEPA \nNUÑEZ"
     user2 = create_user(atc_texto, session)
     assert user == user2
+
+
+def test_indice_de_atcs(session: scoped_session) -> None:
+    """Comprobar que el índice resuelve nombres sin consultar la base de datos."""
+    indice = AtcIndex.carga(session)
+    assert len(indice) == session.query(ATC).count()
+
+    consultas: list[str] = []
+    event.listen(
+        session.connection(),
+        "before_cursor_execute",
+        lambda _c, _cur, sql, *_a: consultas.append(sql),
+    )
+
+    atc_texto = AtcTexto(
+        apellidos_nombre="PEPA  NUÃ‘EZ",  # noqa: RUF001
+        dependencia="LECS",
+        categoria="PTD",
+    )
+    assert indice.busca(atc_texto.apellidos_nombre) is None
+    user = create_user(atc_texto, session, indice)
+    assert indice.busca("PEPA NUÑEZ") is user
+    assert indice.busca("PEPA \nNUÑEZ") is user
+    assert create_user(atc_texto, session, indice) is user
+    assert not consultas